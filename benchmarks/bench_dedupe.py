@@ -0,0 +1,81 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+benchmark of the staged duplicate search of *dedupe* targets (see :class:`cleanmymac.scan.DuplicateFinder`)
+on files of the same size: hashing every file fully versus the staged search, where the hash of both ends
+tells most files apart before they are fully read.
+
+.. code-block:: bash
+
+    $ python benchmarks/bench_dedupe.py
+"""
+import os
+import sys
+import shutil
+import logging
+import tempfile
+from timeit import timeit
+
+# run from a checkout, without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cleanmymac.log import LOGGER_NAME
+from cleanmymac.scan import DuplicateFinder, FileScanner, file_rule, full_hash
+
+FILES = 200
+
+FILE_SIZE = 1024 * 1024
+
+DUPLICATES = 10
+
+NUMBER = 3
+
+
+def _fixture():
+    root = tempfile.mkdtemp(prefix='bench_dedupe')
+    for i in range(FILES):
+        with open(os.path.join(root, 'file_{0}.bin'.format(i)), 'wb') as a_file:
+            a_file.write(os.urandom(FILE_SIZE) if i >= DUPLICATES else b'\0' * FILE_SIZE)
+    return root
+
+
+def bench_dedupe():
+    root = _fixture()
+    try:
+        def hash_all():
+            digests = {}
+            for match in FileScanner([file_rule('*')]).scan([root]):
+                digests.setdefault(full_hash(match.path), []).append(match.path)
+            return [paths for paths in digests.values() if len(paths) > 1]
+
+        def staged():
+            return DuplicateFinder().find([root])
+
+        assert len(hash_all()) == len(staged()) == 1
+        label = '{0} x {1} MB'.format(FILES, FILE_SIZE // (1024 * 1024))
+        return [(label + ', full hash', timeit(hash_all, number=NUMBER) / NUMBER),
+                (label + ', staged', timeit(staged, number=NUMBER) / NUMBER)]
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    logging.getLogger(LOGGER_NAME).setLevel(logging.INFO)
+    print('{0: <40} {1: >12}'.format('benchmark', 'seconds'))
+    for name, seconds in bench_dedupe():
+        print('{0: <40} {1: >12.4f}'.format(name, seconds))
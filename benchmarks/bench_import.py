@@ -0,0 +1,91 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+import time regression benchmark: the cold start of the **cleanmymac** command (*--help*, *--version* or
+forwarding to a server) must not import the heavy dependencies and must stay within a time budget.
+With python 3.7+ the slowest imports are listed (from *python -X importtime*).
+Exits with a non zero code if the budget is exceeded.
+
+.. code-block:: bash
+
+    $ python benchmarks/bench_import.py [budget in milliseconds]
+"""
+import os
+import re
+import subprocess
+import sys
+from time import time
+
+#: the cold start budget (in milliseconds), the median of the runs is checked
+BUDGET_MS = 150.0
+
+RUNS = 7
+
+#: the interpreters run from the checkout (*-c* puts it on the path), no need to install the package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: what the command line entry point imports
+STATEMENT = 'import cleanmymac.client, cleanmymac.cli'
+
+#: modules only the code paths using them may import
+HEAVY_MODULES = ['sarge', 'natsort', 'tabulate', 'voluptuous', 'yaml', 'pkg_resources', 'ctypes']
+
+_IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def bench_cold_start():
+    timings = []
+    for _ in range(RUNS):
+        start = time()
+        subprocess.check_call([sys.executable, '-c', STATEMENT], cwd=ROOT)
+        timings.append((time() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def loaded_heavy_modules():
+    check = '{0}; import sys; print(",".join(m for m in {1!r} if m in sys.modules))'.format(STATEMENT, HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, '-c', check], cwd=ROOT).decode('utf-8').strip()
+    return [module for module in output.split(',') if module]
+
+
+def slowest_imports(count=10):
+    if sys.version_info < (3, 7):
+        return []
+    output = subprocess.check_output([sys.executable, '-X', 'importtime', '-c', STATEMENT],
+                                     stderr=subprocess.STDOUT, cwd=ROOT).decode('utf-8')
+    imports = []
+    for line in output.splitlines():
+        match = _IMPORT_TIME_RE.match(line)
+        if match:
+            imports.append((int(match.group(2)), match.group(4)))
+    return sorted(imports, reverse=True)[:count]
+
+
+if __name__ == '__main__':
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS
+    cold_start = bench_cold_start()
+    heavy = loaded_heavy_modules()
+
+    print('{0: <40} {1: >12}'.format('import', 'cumulative ms'))
+    for microseconds, module in slowest_imports():
+        print('{0: <40} {1: >12.1f}'.format(module, microseconds / 1000.0))
+    print('')
+    print('cold start (median of {0} runs): {1:.1f} ms, budget: {2:.1f} ms'.format(RUNS, cold_start, budget))
+    if heavy:
+        print('heavy modules imported at start up: {0}'.format(', '.join(heavy)))
+    sys.exit(1 if cold_start > budget or heavy else 0)
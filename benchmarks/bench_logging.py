@@ -0,0 +1,84 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+micro benchmark of the debug logging fast path: at INFO level hot loops should pay nothing
+for debug messages (no formatting, no :func:`pprint.pformat`, no styling).
+
+.. code-block:: bash
+
+    $ python benchmarks/bench_logging.py
+"""
+import logging
+import tempfile
+import os
+import sys
+from pprint import pformat
+from timeit import timeit
+
+# run from a checkout, without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cleanmymac.log import debug, lazy, LOGGER_NAME
+from cleanmymac.target import Target, YamlDirTarget
+
+NUMBER = 100000
+
+SPEC = {'entries': [{'dir': '/tmp/{0}'.format(i), 'pattern': '\\d+'} for i in range(50)]}
+
+
+def _no_debug(self, msg, *args):
+    pass
+
+
+def bench_debug():
+    eager = timeit(lambda: debug('spec: {0}'.format(pformat(SPEC))), number=NUMBER // 100) * 100
+    return [
+        ('eager debug(pformat) (extrapolated)', eager),
+        ('lazy debug(pformat)', timeit(lambda: debug('spec: %s', lazy(pformat, SPEC)), number=NUMBER)),
+        ('no debug call', timeit(lambda: None, number=NUMBER)),
+    ]
+
+
+def bench_to_remove():
+    tmp_dir = tempfile.mkdtemp()
+    for i in range(20):
+        os.mkdir(os.path.join(tmp_dir, str(i)))
+    target = YamlDirTarget({'spec': {'entries': [{'dir': tmp_dir, 'pattern': '\\d+'}] * 50}})
+
+    def scan():
+        for _ in target._to_remove():
+            pass
+
+    with_debug = timeit(scan, number=NUMBER // 1000)
+    original_debug = Target._debug
+    Target._debug = _no_debug
+    try:
+        without_debug = timeit(scan, number=NUMBER // 1000)
+    finally:
+        Target._debug = original_debug
+    return [
+        ('DirTarget._to_remove', with_debug),
+        ('DirTarget._to_remove (debug stubbed)', without_debug),
+    ]
+
+
+if __name__ == '__main__':
+    logging.getLogger(LOGGER_NAME).setLevel(logging.INFO)
+    print('{0: <40} {1: >12}'.format('benchmark (INFO level)', 'seconds'))
+    for name, seconds in bench_debug() + bench_to_remove():
+        print('{0: <40} {1: >12.4f}'.format(name, seconds))
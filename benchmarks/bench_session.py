@@ -0,0 +1,56 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+benchmark of *cmd* targets running many small commands: a process per command (through :func:`sarge.run`)
+versus a single shell session per target (*session: true*, see :class:`cleanmymac.session.ShellSession`).
+
+.. code-block:: bash
+
+    $ python benchmarks/bench_session.py
+"""
+import logging
+import os
+import sys
+from timeit import timeit
+
+# run from a checkout, without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cleanmymac.log import LOGGER_NAME
+from cleanmymac.target import YamlShellCommandTarget
+
+COMMANDS = 50
+
+NUMBER = 5
+
+
+def bench_session():
+    commands = ['test -d /tmp && true'] * COMMANDS
+    results = []
+    for session in [False, True]:
+        target = YamlShellCommandTarget({'spec': {'clean_commands': commands, 'session': session}})
+        results.append(('{0} commands, session: {1}'.format(COMMANDS, session),
+                        timeit(target, number=NUMBER) / NUMBER))
+    return results
+
+
+if __name__ == '__main__':
+    logging.getLogger(LOGGER_NAME).setLevel(logging.INFO)
+    print('{0: <40} {1: >12}'.format('benchmark (per target)', 'seconds'))
+    for name, seconds in bench_session():
+        print('{0: <40} {1: >12.4f}'.format(name, seconds))
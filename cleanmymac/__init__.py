@@ -15,34 +15,158 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import sys as _sys
+from types import ModuleType as _ModuleType
+from importlib import import_module as _import_module
+
 from .__version__ import str_version, version
 from .constants import *
-from .log import (
-    debug, debug_param, is_debug,
-    is_level,
-    echo, echo_info, echo_warn, echo_error, echo_success, echo_target,
-    error, info, warn,
-    LOGGER_NAME
-)
-from .registry import (
-    get_target,
-    get_targets_as_table,
-    iter_targets,
-    load_target,
-    register_target,
-    register_yaml_targets
-)
-from .schema import IsDirUserExpand, validate_yaml_config
-from .target import DirTarget, ShellCommandTarget, Target, YamlShellCommandTarget, YamlDirTarget
-from .util import (
-    delete_dir_content,
-    delete_dirs,
-    get_disk_usage,
-    progressbar,
-    yaml_files,
-    Dir,
-    DirList,
-    DiskUsage
-)
+from . import constants as _constants
 
 __author__ = 'cosmin'
+
+#: the public api by module, imported on first access (i.e., *cleanmymac --version* never loads the targets)
+_API = {
+    'archive': ['archive_path', 'archive_tree', 'verify_archive', 'Archive'],
+    'capture': ['BoundedCapture', 'OutputLines', 'has_output_log', 'read_lines', 'set_output_log', 'write_output_log'],
+    'client': ['connect', 'forward', 'get_socket_path', 'is_forwardable'],
+    'log': [
+        'debug', 'debug_param', 'is_debug',
+        'is_enabled_for', 'is_level', 'lazy',
+        'echo', 'echo_info', 'echo_warn', 'echo_error', 'echo_success', 'echo_target',
+        'error', 'info', 'warn',
+        'LOGGER_NAME'
+    ],
+    'fleet': [
+        'get_transport',
+        'load_inventory',
+        'run_fleet',
+        'run_host',
+        'summarize',
+        'FleetSummary',
+        'HostResult',
+        'LocalTransport',
+        'SshTransport',
+        'Transport'
+    ],
+    'gentle': [
+        'get_throttle',
+        'lower_cpu_priority',
+        'lower_io_priority',
+        'set_throttle',
+        'Throttle',
+        'TokenBucket'
+    ],
+    'history': [
+        'estimate_reclaim',
+        'fastest_reclaim_first',
+        'get_history',
+        'get_history_path',
+        'longest_first',
+        'next_run',
+        'percentile',
+        'set_history',
+        'CommandTrend',
+        'Due',
+        'History',
+        'TargetTrend'
+    ],
+    'journal': ['claim_journal', 'get_journal', 'get_journal_path', 'read_journal', 'set_journal', 'Journal', 'Removal',
+                'Unfinished'],
+    'plan': ['is_unchanged', 'plan_target', 'read_plan', 'write_plan', 'PlannedTarget', 'TargetPlan', 'Victim'],
+    'outcome': ['format_report', 'parse_report', 'Outcome'],
+    'progress': ['get_progress', 'set_progress', 'track_progress', 'Progress', 'Snapshot', 'UNITS'],
+    'server': ['Server'],
+    'session': ['ShellSession'],
+    'registry': [
+        'get_target',
+        'get_targets_as_table',
+        'iter_targets',
+        'load_target',
+        'register_target',
+        'register_yaml_targets',
+        'refresh_yaml_targets',
+        'scoped_registry'
+    ],
+    'schedule': ['is_parallel_safe', 'physical_device', 'target_resources', 'Scheduler', 'RESOURCE_COMMANDS'],
+    'scan': ['compile_globs', 'file_rule', 'FileMatch', 'FileRule', 'FileScanner', 'ScanRequest', 'walk',
+             'scan_coalesced', 'unique_roots', 'Artifact', 'ArtifactFinder', 'CacheIndex', 'DuplicateFinder',
+             'FileRecord', 'edge_hash', 'full_hash'],
+    'schema': ['Duration', 'IsDirUserExpand', 'Size', 'validate_yaml_config'],
+    'state': [
+        'get_state_path',
+        'set_state_path',
+        'is_incremental',
+        'set_incremental',
+        'load_state',
+        'save_state',
+        'update_state'
+    ],
+    'target': [
+        'ArtifactsTarget',
+        'CapTarget',
+        'DedupeTarget',
+        'DirTarget',
+        'FilesTarget',
+        'ShellCommandTarget',
+        'Target',
+        'YamlShellCommandTarget',
+        'YamlDirTarget',
+        'YamlFilesTarget',
+        'YamlArtifactsTarget',
+        'YamlCapTarget',
+        'YamlDedupeTarget'
+    ],
+    'util': [
+        'delete_dir_content',
+        'delete_dirs',
+        'disk_size',
+        'format_size',
+        'get_disk_usage',
+        'get_signature',
+        'is_on_device',
+        'parse_duration',
+        'parse_size',
+        'plan_removal',
+        'probe_size',
+        'progressbar',
+        'remove_path',
+        'remove_tree',
+        'scandir',
+        'yaml_files',
+        'Dir',
+        'DirList',
+        'DiskUsage',
+        'Signature',
+        'SizeProbe'
+    ],
+    'watch': ['get_watcher', 'watch', 'InotifyWatcher', 'PollingWatcher'],
+}
+
+_API_MODULES = dict((name, module) for module, names in _API.items() for name in names)
+
+#: *from cleanmymac import \** imports the whole public api
+__all__ = ['str_version', 'version'] + sorted(name for name in vars(_constants) if not name.startswith('_')) + \
+    sorted(_API_MODULES)
+
+
+class _LazyPackage(_ModuleType):
+    """
+    the **cleanmymac** package, the public api is imported from its module on first access
+    """
+    def __getattr__(self, name):
+        if name not in _API_MODULES:
+            raise AttributeError("module '{0}' has no attribute '{1}'".format(self.__name__, name))
+        value = getattr(_import_module('{0}.{1}'.format(self.__name__, _API_MODULES[name])), name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_API_MODULES))
+
+
+_package = _LazyPackage(__name__, __doc__)
+_package.__dict__.update(dict((key, value) for key, value in globals().items() if key != '__dict__'))
+# keep the original module alive (python 2 clears the globals of collected modules)
+_package._module = _sys.modules[__name__]
+_sys.modules[__name__] = _package
@@ -0,0 +1,199 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import stat
+import tarfile
+from subprocess import Popen, PIPE
+from tempfile import TemporaryFile
+from collections import namedtuple
+
+from cleanmymac.log import debug
+from cleanmymac.util import scandir, is_on_device
+from cleanmymac.constants import ARCHIVE_COMPRESSORS, ARCHIVE_COMPRESSION
+
+#: a :func:`collections.namedtuple` holding a verified archive: its path, the number of members (files, folders and
+#: links) and the number of bytes of the archived files (uncompressed)
+Archive = namedtuple('Archive', ['path', 'members', 'size'])
+
+_DRAIN_SIZE = 64 * 1024
+
+
+def archive_path(archive_dir, source, compression=ARCHIVE_COMPRESSION):
+    """
+    the archive file of a folder, named after the folder. Existing archives are never overwritten,
+    a counter is added to the name instead
+
+    :param str archive_dir: the folder holding the archives
+    :param str source: the archived folder
+    :param str compression: the compressor (see :data:`cleanmymac.constants.ARCHIVE_COMPRESSORS`)
+    :return: the path
+    :rtype: str
+    """
+    _, _, extension = ARCHIVE_COMPRESSORS[compression]
+    name = os.path.basename(os.path.normpath(source))
+    path = os.path.join(archive_dir, name + extension)
+    counter = 1
+    while os.path.lexists(path) or os.path.lexists(path + '.part'):
+        path = os.path.join(archive_dir, '{0}.{1}{2}'.format(name, counter, extension))
+        counter += 1
+    return path
+
+
+def _walk(path, one_file_system):
+    # folders before their content, mount points are skipped (these are not removed either, see remove_tree)
+    device = os.lstat(path).st_dev if one_file_system else None
+    stack = [path]
+    while stack:
+        folder = stack.pop()
+        yield folder
+        for entry in scandir(folder):
+            if not entry.is_dir(follow_symlinks=False):
+                yield entry.path
+            elif is_on_device(entry, device):
+                stack.append(entry.path)
+            else:
+                debug('not archiving "%s", on another device (mount point)', entry.path)
+
+
+def _write_tar(stream, source, one_file_system):
+    members, size = 0, 0
+    root = os.path.dirname(os.path.normpath(source))
+    tar = tarfile.open(fileobj=stream, mode='w|')
+    try:
+        for path in _walk(source, one_file_system):
+            info = tar.gettarinfo(path, os.path.relpath(path, root))
+            if info is None:
+                debug('not archiving "%s", unsupported file type', path)
+                continue
+            if info.isreg():
+                with open(path, 'rb') as a_file:
+                    tar.addfile(info, a_file)
+                    if os.fstat(a_file.fileno()).st_size != info.size:
+                        raise IOError('"{0}" changed while archived'.format(path))
+                size += info.size
+            else:
+                tar.addfile(info)
+            members += 1
+    finally:
+        tar.close()
+    return members, size
+
+
+def _read_tar(stream):
+    members, size = 0, 0
+    tar = tarfile.open(fileobj=stream, mode='r|')
+    try:
+        # in stream mode moving to the next member reads (and decompresses) the data of the current one
+        for info in tar:
+            members += 1
+            if info.isreg():
+                size += info.size
+    finally:
+        tar.close()
+    while stream.read(_DRAIN_SIZE):
+        pass
+    return members, size
+
+
+def _failed(command, process, errors):
+    errors.seek(0)
+    return IOError('{0} failed with exit code {1}: {2}'.format(command[0], process.returncode,
+                                                              errors.read().strip()))
+
+
+def verify_archive(path, members, size, compression=ARCHIVE_COMPRESSION):
+    """
+    verify an archive: it is decompressed (checking the checksums of the compressor) and its members are listed
+    and compared against what was archived. The archive is streamed, memory use does not depend on its size
+
+    :param str path: the archive file
+    :param int members: the number of members archived
+    :param int size: the number of bytes of the archived files
+    :param str compression: the compressor (see :data:`cleanmymac.constants.ARCHIVE_COMPRESSORS`)
+    :raise: :class:`IOError` if the archive is not complete
+    """
+    _, decompress, _ = ARCHIVE_COMPRESSORS[compression]
+    with open(path, 'rb') as archive, TemporaryFile() as errors:
+        process = Popen(decompress, stdin=archive, stdout=PIPE, stderr=errors, close_fds=True)
+        try:
+            listed = _read_tar(process.stdout)
+        except tarfile.TarError as e:
+            raise IOError('"{0}" is not a valid archive: {1}'.format(path, e))
+        finally:
+            process.stdout.close()
+            process.wait()
+        if process.returncode:
+            raise _failed(decompress, process, errors)
+    if listed != (members, size):
+        raise IOError('"{0}" holds {1} members ({2} bytes), expected {3} ({4} bytes)'.format(
+            path, listed[0], listed[1], members, size))
+
+
+def archive_tree(source, archive_dir, compression=ARCHIVE_COMPRESSION, one_file_system=True):
+    """
+    archive a folder into a compressed tarball in `archive_dir`. The tarball is streamed into the compressor
+    (running multi-threaded, in its own process) through a pipe, memory use does not depend on the size of the
+    tree. The archive is written to a *.part* file and renamed once verified (see :func:`verify_archive`),
+    the folder itself is left in place, removing it is up to the caller.
+
+    :param str source: the folder to archive
+    :param str archive_dir: the folder holding the archives, created if missing
+    :param str compression: the compressor (see :data:`cleanmymac.constants.ARCHIVE_COMPRESSORS`)
+    :param bool one_file_system: if True mount points (on another device than `source`) are not archived
+    :return: the verified archive
+    :rtype: :class:`Archive`
+    :raise: :class:`IOError` or :class:`OSError` if the folder could not be archived
+    """
+    source = os.path.abspath(os.path.expanduser(source))
+    archive_dir = os.path.abspath(os.path.expanduser(archive_dir))
+    if not stat.S_ISDIR(os.lstat(source).st_mode):
+        raise IOError('"{0}" is not a folder'.format(source))
+    if os.path.realpath(archive_dir).startswith(os.path.join(os.path.realpath(source), '')):
+        raise IOError('the archive folder "{0}" is inside "{1}"'.format(archive_dir, source))
+    if not os.path.isdir(archive_dir):
+        os.makedirs(archive_dir)
+    path = archive_path(archive_dir, source, compression)
+    partial = path + '.part'
+    compress, _, _ = ARCHIVE_COMPRESSORS[compression]
+    debug('archiving "%s" to "%s"', source, path)
+    try:
+        with open(partial, 'wb') as archive, TemporaryFile() as errors:
+            process = Popen(compress, stdin=PIPE, stdout=archive, stderr=errors, close_fds=True)
+            try:
+                members, size = _write_tar(process.stdin, source, one_file_system)
+            except IOError:
+                # a broken pipe, report why the compressor stopped
+                process.stdin.close()
+                if process.wait():
+                    raise _failed(compress, process, errors)
+                raise
+            finally:
+                process.stdin.close()
+                process.wait()
+            if process.returncode:
+                raise _failed(compress, process, errors)
+            archive.flush()
+            os.fsync(archive.fileno())
+        verify_archive(partial, members, size, compression=compression)
+        os.rename(partial, path)
+    except BaseException:
+        if os.path.lexists(partial):
+            os.remove(partial)
+        raise
+    debug('archived "%s": %s members, %s bytes', source, members, size)
+    return Archive(path, members, size)
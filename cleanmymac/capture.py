@@ -0,0 +1,196 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+from time import strftime
+from threading import Thread, Lock
+from collections import deque
+
+from cleanmymac.log import debug, error
+from cleanmymac.constants import OUTPUT_TAIL_LINES, OUTPUT_MAX_LINE_LENGTH, OUTPUT_READ_SIZE
+
+_output_log = None
+
+_output_log_lock = Lock()
+
+
+def set_output_log(path):
+    """
+    stream the output of all shell commands to a log file (appended to). If `path` is a directory a
+    new log file is created in it for every run (i.e., *cleanmymac-20160101-120000.log*)
+
+    :param str path: the log file or folder path, None disables the output log
+    :return: the log file path (or None)
+    :rtype: str
+    """
+    global _output_log
+    with _output_log_lock:
+        if _output_log is not None:
+            _output_log.close()
+        _output_log = None
+        if not path:
+            return None
+        path = os.path.abspath(os.path.expanduser(path))
+        if os.path.isdir(path):
+            path = os.path.join(path, strftime('cleanmymac-%Y%m%d-%H%M%S.log'))
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        _output_log = open(path, 'ab')
+        return path
+
+
+def write_output_log(data):
+    """
+    write to the output log (if set, see :func:`set_output_log`)
+
+    :param bytes data: the data to write
+    """
+    with _output_log_lock:
+        if _output_log is not None:
+            _output_log.write(data)
+            _output_log.flush()
+
+
+def has_output_log():
+    """
+    :return: True if the output log is set
+    :rtype: bool
+    """
+    return _output_log is not None
+
+
+def read_lines(fd, callback):
+    """
+    read a stream line by line until its end, very long lines are split (see
+    :attr:`cleanmymac.constants.OUTPUT_MAX_LINE_LENGTH`) instead of buffered
+
+    :param int fd: the file descriptor to read from
+    :param callable callback: called with every line (as bytes, without the line separator)
+    """
+    pending = b''
+    while True:
+        chunk = os.read(fd, OUTPUT_READ_SIZE)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            callback(line)
+        if len(pending) > OUTPUT_MAX_LINE_LENGTH:
+            # a very long line, do not buffer it all
+            callback(pending)
+            pending = b''
+    if pending:
+        callback(pending)
+
+
+class OutputLines(object):
+    """
+    the lines of an output stream in constant memory: only the last `max_lines` lines are kept (i.e., for
+    error reports). Every line is also passed to `callback` and written to the output log
+    (see :func:`set_output_log`) if set.
+
+    :param int max_lines: the number of lines to keep
+    :param callable callback: called with every line (as text)
+    :param str name: the stream name used in the output log
+    """
+    def __init__(self, max_lines=OUTPUT_TAIL_LINES, callback=None, name='out'):
+        self._tail = deque(maxlen=max_lines)
+        self._callback = callback
+        self._prefix = '[{0}] '.format(name).encode('utf-8')
+
+    def __call__(self, line):
+        """
+        add a line
+
+        :param bytes line: the line
+        """
+        write_output_log(self._prefix + line + b'\n')
+        text = line[:OUTPUT_MAX_LINE_LENGTH].decode('utf-8', 'replace').rstrip()
+        if self._tail.maxlen:
+            self._tail.append(text)
+        if self._callback:
+            self._callback(text)
+
+    @property
+    def tail(self):
+        """
+        the last lines
+
+        :return: the lines
+        :rtype: list
+        """
+        return list(self._tail)
+
+
+class BoundedCapture(object):
+    """
+    captures the output stream of a sub-process in constant memory: only the last `max_lines` lines are kept
+    (i.e., for error reports). Every line is also passed to `callback` and written to the output log
+    (see :func:`set_output_log`) if set. Pass :attr:`stream` as the `stdout` or `stderr` of the sub-process,
+    and :meth:`close` the capture once the sub-process is done.
+
+    :param int max_lines: the number of lines to keep
+    :param callable callback: called with every line (as text)
+    :param str name: the stream name used in the output log
+    """
+    def __init__(self, max_lines=OUTPUT_TAIL_LINES, callback=None, name='out'):
+        read_fd, write_fd = os.pipe()
+        self._reader = os.fdopen(read_fd, 'rb')
+        self.stream = os.fdopen(write_fd, 'wb')
+        self._lines = OutputLines(max_lines=max_lines, callback=callback, name=name)
+        self._thread = Thread(target=self._read)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _read(self):
+        try:
+            read_lines(self._reader.fileno(), self._lines)
+        except Exception as e:
+            error('output capture failed. Reason: {0}'.format(e))
+        finally:
+            self._reader.close()
+
+    @property
+    def tail(self):
+        """
+        the last lines of output
+
+        :return: the lines
+        :rtype: list
+        """
+        return self._lines.tail
+
+    def close(self, timeout=5.0):
+        """
+        close the write end of the stream and wait for all output to be processed. Call after the
+        sub-process exits.
+
+        :param float timeout: wait at most this many seconds (i.e., background processes still holding the stream)
+        """
+        if not self.stream.closed:
+            self.stream.close()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            debug('output capture still running after %s seconds', timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
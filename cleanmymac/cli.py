@@ -19,22 +19,38 @@
 import click
 import click_log
 import os
-from yaml import load
-from time import sleep
+import sys
+import signal
+from time import time
+from datetime import datetime
+from copy import deepcopy
 from pprint import pformat
+from six import string_types
 
 from cleanmymac.__version__ import str_version
 from cleanmymac.log import info, warn, error, debug, echo_warn, echo_info, echo_target, is_debug, echo, echo_success, \
-    debug_param, disable_logger
-from cleanmymac.registry import iter_targets, register_yaml_targets, get_targets_as_table
-from cleanmymac.schema import validate_yaml_config
-from cleanmymac.target import Target
-from cleanmymac.util import get_disk_usage, progressbar
-from cleanmymac.constants import UNIT_MB, PROGRESSBAR_ADVANCE_DELAY, GLOBAL_CONFIG_FILE
+    echo_error, debug_param, disable_logger, lazy
+from cleanmymac.util import get_disk_usage, format_size, parse_size, get_signature, remove_tree, delete_dir_content, \
+    Dir
+from cleanmymac.constants import UNIT_MB, GLOBAL_CONFIG_FILE, WATCH_DEBOUNCE, \
+    WATCH_SPACE_INTERVAL, GENTLE_NICE, GENTLE_IO_CLASS, GENTLE_FILES_PER_SECOND, GENTLE_BYTES_PER_SECOND, \
+    FLEET_CONCURRENCY, FLEET_MAX_FAILURE_RATE, FLEET_MIN_SAMPLE, FLEET_TIMEOUT, DESCRIBE_CLEAN, SCHEDULE_PER_DEVICE, \
+    SCHEDULE_COMMANDS, SCHEDULE_CPU, HISTORY_WINDOW, DUE_MAX_SIZE, DUE_MAX_INTERVAL, DUE_MARGIN, DURATION_UNITS
 from cleanmymac.colors import set_pretty_print
+from cleanmymac.state import set_state_path, set_incremental
+from cleanmymac.capture import set_output_log
+from cleanmymac.outcome import Outcome, format_report
+from cleanmymac.journal import Journal, get_journal, set_journal, get_journal_path, claim_journal
+from cleanmymac.progress import track_progress, get_progress, set_progress
+from cleanmymac.history import History, get_history, set_history, get_history_path
 
 __author__ = 'cosmin'
 
+# heavy modules (the registry, targets, schema, yaml, tabulate, ...) are imported by the commands using them,
+# keeping *cleanmymac --help* and *--version* fast
+
+_CONFIGS = {}
+
 
 def get_options(path=None):
     """
@@ -48,6 +64,8 @@ def get_options(path=None):
     :return: a python object containing the actual configuration
     :rtype: dict
     """
+    from yaml import load
+    from cleanmymac.schema import validate_yaml_config
     cfg = {}
     if not path:
         path = os.path.join(os.path.expanduser('~'), GLOBAL_CONFIG_FILE)
@@ -56,8 +74,13 @@ def get_options(path=None):
     if not os.path.exists(path):
         warn('global configuration file not found, proceeding without.')
     else:
-        with open(path, 'r+') as cfg:
-            cfg = load(cfg)
+        # kept until the file changes (a server process answers many requests)
+        signature = get_signature(path)
+        cached = _CONFIGS.get(path)
+        if cached is None or cached[0] != signature:
+            with open(path, 'r+') as cfg:
+                cached = _CONFIGS[path] = (signature, load(cfg))
+        cfg = deepcopy(cached[1])
     return validate_yaml_config(cfg)
 
 
@@ -68,43 +91,426 @@ def _config_targets_path(config):
     return []
 
 
-_HORIZONTAL_RULE = '\n{0}'.format(''.join(['-' for i in range(80)]))
+def _config_state_path(config):
+    if 'cleanmymac' in config:
+        return config['cleanmymac'].get('state_path', None)
+    return None
+
+
+def _load_target(name, target_initializer, config, update=False, verbose=False, strict=True):
+    from cleanmymac.target import Target
+    target_cfg = config[name] if name in config else None
+    debug("got target configuration: %s", lazy(pformat, target_cfg))
+    target = target_initializer(target_cfg, update=update, verbose=verbose, strict=strict)
+    if not isinstance(target, Target):
+        error('expected an instance of Target, instead got: {0}'.format(target))
+        return None
+    return target
+
+
+def _load_targets(names, all_targets, config, update=False, verbose=False, strict=True):
+    targets = {}
+    for name in names:
+        if name not in all_targets:
+            continue
+        try:
+            targets[name] = _load_target(name, all_targets[name], config, update=update, verbose=verbose,
+                                         strict=strict)
+        except Exception, ex:
+            targets[name] = ex
+    return targets
+
+
+def _coalesce_scans(targets):
+    from cleanmymac.scan import scan_coalesced
+    requests = []
+    for target in targets:
+        if hasattr(target, 'scan_requests'):
+            try:
+                requests.extend(target.scan_requests())
+            except Exception, ex:
+                debug('could not prepare scan for %s. Reason: %s', target, ex)
+    if requests:
+        debug('coalesced scan of %s roots', len(requests))
+        scan_coalesced(requests)
+
+
+def _accepts_full(describe):
+    try:
+        from inspect import getfullargspec as getargspec
+    except ImportError:
+        from inspect import getargspec
+    try:
+        spec = getargspec(describe)
+    except TypeError:
+        return True
+    return 'full' in spec[0] or spec[2] is not None
+
+
+def _describe(target, full=False):
+    # targets written against older versions take no arguments
+    description = target.describe(full=full) if _accepts_full(target.describe) else target.describe()
+    # targets written against older versions describe themselves in a single string
+    if isinstance(description, string_types):
+        description = [description]
+    for line in description:
+        echo_warn(line)
+    # walks every tree to remove, only when asked
+    estimate = target.estimate_size() if full and hasattr(target, 'estimate_size') else None
+    if estimate is not None and estimate.size:
+        echo_warn(target.__describe__(DESCRIBE_CLEAN, 'estimated size: {0}{1}'.format(
+            '' if estimate.exact else '>= ', format_size(estimate.size)), fg='white'))
+
+
+def _plan_target(name, target, plans, verbose=False):
+    from cleanmymac.plan import plan_target, PlannedTarget
+    if target is None or isinstance(target, Exception):
+        return target
+    try:
+        plan = plan_target(name, target)
+    except Exception, ex:
+        return ex
+    plans.append(plan)
+    return PlannedTarget(plan, verbose=verbose)
+
+
+def _runs_commands(target):
+    return hasattr(target, 'commands') and not isinstance(target, Exception) and bool(target.commands())
+
+
+def _run_target(name, target, dry_run=False, full=False, concurrent=False):
+    """
+    run (or describe) a target. The space freed by the target is the change in free disk space while it ran,
+    which also covers shell commands. Targets running concurrently would count the deletions of each other,
+    these are credited with the bytes they deleted themselves (see :meth:`cleanmymac.progress.Progress.thread_done`).
+    What shell commands delete is not tracked: the space freed by concurrent targets running commands is unknown
+    (None)
+    """
+    start = time()
+    free_space_before = get_disk_usage('/', unit=1).free
+    success, reason = True, None
+    journal, history, progress = get_journal(), get_history(), get_progress()
+    if history:
+        history.begin(name)
+    if progress:
+        progress.thread_done(reset=True)
+    try:
+        if isinstance(target, Exception):
+            raise target
+        if target is not None:
+            if dry_run:
+                _describe(target, full=full)
+            else:
+                if journal:
+                    journal.begin(name)
+                try:
+                    target()
+                finally:
+                    if journal:
+                        journal.end()
+    except Exception, ex:
+        error('could not cleanup target "{0}". Reason:\n{1}'.format(name, ex))
+        success, reason = False, str(ex)
+    done = progress.thread_done() if progress else {'files': 0, 'size': 0}
+    if dry_run:
+        freed = 0
+    elif concurrent and progress:
+        freed = None if _runs_commands(target) else done['size']
+    else:
+        freed = max(0, int(get_disk_usage('/', unit=1).free - free_space_before))
+    outcome = Outcome(name, success, freed, time() - start, reason)
+    if history:
+        history.record_target(outcome, files=done['files'], deleted=done['size'],
+                              skipped=success and getattr(target, 'skipped', False))
+    return outcome
+
+
+def _resume(dry_run=False, verbose=False):
+    """
+    complete the removals of an interrupted run (see :mod:`cleanmymac.journal`)
+
+    :param bool dry_run: only describe the pending removals
+    :param bool verbose: verbose output
+    :return: the names of the targets completed (these need no new scan)
+    :rtype: set
+    """
+    from cleanmymac.target import Target
+    path = get_journal_path()
+    completed = set()
+    with claim_journal(path) as interrupted:
+        if interrupted is None:
+            echo_info('\nanother run is in progress, its journal is left alone', verbose=verbose)
+            return completed
+        for unfinished in interrupted:
+            echo_target('\nresuming: {0} ({1} pending removals)'.format(unfinished.target.upper(),
+                                                                         len(unfinished.pending)), verbose=verbose)
+            for removal in unfinished.pending:
+                if dry_run:
+                    echo_warn(Target.__describe__(DESCRIBE_CLEAN, 'delete {0}: {1}'.format(
+                        'folder contents' if removal.content else 'path', removal.path), fg='white'))
+                    continue
+                if verbose:
+                    echo_warn('delete {0}: {1}'.format('folder contents' if removal.content else 'path',
+                                                       removal.path))
+                try:
+                    if removal.content and os.path.isdir(removal.path):
+                        delete_dir_content(Dir(removal.path))
+                    elif not removal.content and os.path.lexists(removal.path):
+                        remove_tree(removal.path)
+                except OSError, ex:
+                    error('could not delete "{0}". Reason: {1}'.format(removal.path, ex))
+            if unfinished.planned and not dry_run:
+                completed.add(unfinished.target)
+        if not dry_run and os.path.exists(path):
+            os.remove(path)
+    return completed
 
 
-@click.command(name='cleanmymac', context_settings={
+def _watch_config(config):
+    if 'cleanmymac' in config:
+        return config['cleanmymac'].get('watch', {})
+    return {}
+
+
+def _scheduler(config, jobs):
+    from cleanmymac.schedule import Scheduler
+    schedule_cfg = config['cleanmymac'].get('schedule', {}) if 'cleanmymac' in config else {}
+    debug_param('schedule', schedule_cfg)
+    return Scheduler(jobs, per_device=schedule_cfg.get('per_device', SCHEDULE_PER_DEVICE),
+                     commands=schedule_cfg.get('commands', SCHEDULE_COMMANDS),
+                     cpu=schedule_cfg.get('cpu', SCHEDULE_CPU))
+
+
+def _runnable(selected, loaded, target_names, resumed, verbose=False):
+    runnable = []
+    for name, _ in selected:
+        if name not in target_names:
+            debug('skipping target "%s"', name)
+        elif name in resumed:
+            echo_info('\n{0}: completed from the journal of an interrupted run'.format(name.upper()), verbose=verbose)
+        else:
+            runnable.append((name, loaded[name]))
+    return runnable
+
+
+def _order(runnable, history, jobs=1, until_free=None, verbose=False):
+    """
+    order the targets from the run history (see :mod:`cleanmymac.history`): the targets known to free space
+    fastest first when running until enough space is free, else the longest first when running concurrently
+    """
+    from cleanmymac.history import longest_first, fastest_reclaim_first, estimate_reclaim
+    if until_free:
+        durations, rates = history.durations(), history.reclaim_rates()
+        runnable = fastest_reclaim_first(runnable, rates)
+        needed = until_free - get_disk_usage('/', unit=1).free
+        if needed > 0:
+            eta = estimate_reclaim(needed, [name for name, _ in runnable], durations, rates)
+            if eta is None:
+                echo_info('{0} to free, more than the run history accounts for'.format(format_size(needed)),
+                          verbose=verbose)
+            else:
+                echo_info('{0} to free, estimated at {1:.1f}s ({2}/s) from the run history'.format(
+                    format_size(needed), eta, format_size(int(needed / eta) if eta else 0)), verbose=verbose)
+    elif jobs > 1:
+        runnable = longest_first(runnable, history.durations())
+    debug('target order: %s', lazy(lambda: [name for name, _ in runnable]))
+    return runnable
+
+
+def _seconds(value):
+    return '-' if value is None else '{0:.2f}s'.format(value)
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M')
+
+
+def _due_schedule(names, config, history, targets):
+    """
+    when the next runs of the targets are due, from their growth in the run history (see
+    :meth:`cleanmymac.history.History.due`). The size a target should not grow beyond is its *min_size* if set
+    (smaller *dir* targets skip themselves), else its *max_size* in the global configuration
+    (i.e., `ci_cache: {max_size: '5 GB'}`), the *due* section sets the defaults. `targets` are the loaded targets
+    """
+    from cleanmymac.target import DirTarget
+    due_cfg = config['cleanmymac'].get('due', {}) if 'cleanmymac' in config else {}
+    debug_param('due', due_cfg)
+    thresholds = {}
+    for name in names:
+        threshold = due_cfg.get('max_size', DUE_MAX_SIZE)
+        target = targets.get(name)
+        if isinstance(target, DirTarget) and target.min_size is not None:
+            threshold = target.min_size
+        elif name in config and isinstance(config[name], dict) and 'max_size' in config[name]:
+            try:
+                threshold = parse_size(config[name]['max_size'])
+            except ValueError, ex:
+                error('invalid max_size for target "{0}". Reason: {1}'.format(name, ex))
+        thresholds[name] = threshold
+    return history.due(thresholds, max_interval=due_cfg.get('max_interval', DUE_MAX_INTERVAL),
+                       margin=due_cfg.get('margin', DUE_MARGIN))
+
+
+def _due_only(names, config, history, targets, verbose=False):
+    now = time()
+    schedule = _due_schedule(names, config, history, targets)
+    due = set()
+    for name in sorted(names):
+        if name not in schedule:
+            debug('target "%s" is due (not enough history)', name)
+            due.add(name)
+        elif schedule[name].next <= now:
+            due.add(name)
+        else:
+            echo_info('{0}: not due until {1} (growing {2}/day)'.format(
+                name.upper(), _timestamp(schedule[name].next),
+                format_size(int(schedule[name].growth * DURATION_UNITS['d']))), verbose=verbose)
+    return due
+
+
+def _gentle(config):
+    from cleanmymac.gentle import lower_cpu_priority, lower_io_priority, set_throttle, Throttle
+    gentle_cfg = config['cleanmymac'].get('gentle', {}) if 'cleanmymac' in config else {}
+    lower_cpu_priority(gentle_cfg.get('nice', GENTLE_NICE))
+    lower_io_priority(gentle_cfg.get('io_class', GENTLE_IO_CLASS))
+    set_throttle(Throttle(files_per_second=gentle_cfg.get('files_per_second', GENTLE_FILES_PER_SECOND),
+                          bytes_per_second=gentle_cfg.get('bytes_per_second', GENTLE_BYTES_PER_SECOND)))
+    debug_param('gentle mode', gentle_cfg)
+
+
+def _watch(target_names, all_targets, config, update=False, dry_run=False, full=False, verbose=False, strict=True):
+    from cleanmymac.watch import watch
+    roots = {}
+    for name in target_names:
+        if name not in all_targets:
+            continue
+        target = _load_target(name, all_targets[name], config, update=update, verbose=False, strict=strict)
+        if target is None:
+            continue
+        roots[name] = target.scan_roots() if hasattr(target, 'scan_roots') else []
+        debug_param('watching {0}'.format(name), roots[name])
+
+    def run(names):
+        loaded = _load_targets(names, all_targets, config, update=update, verbose=verbose, strict=strict)
+        _coalesce_scans(loaded.values())
+        for name in sorted(loaded):
+            echo_target('\ncleaning: {0}'.format(name.upper()), verbose=verbose)
+            _run_target(name, loaded[name], dry_run=dry_run, full=full)
+
+    watch_cfg = _watch_config(config)
+    echo_info('watching {0} cleanup targets, press CTRL+C to stop'.format(len(roots)), verbose=verbose)
+    try:
+        watch(roots, run,
+              min_free=watch_cfg.get('min_free', None),
+              debounce=watch_cfg.get('debounce', WATCH_DEBOUNCE),
+              space_interval=watch_cfg.get('space_interval', WATCH_SPACE_INTERVAL))
+    except KeyboardInterrupt:
+        echo_info('\nwatch stopped', verbose=verbose)
+
+
+_HORIZONTAL_RULE = '\n{0}'.format(''.join(['-' for i in range(80)]))
+
+_CONTEXT_SETTINGS = {
     'help_option_names': ['-?', '-h', '--help']
-})
+}
+
+
+class DefaultGroup(click.Group):
+    """
+    a :class:`click.Group` running the `default` command unless a command is named explicitly, i.e.
+    *cleanmymac -d brew* is the same as *cleanmymac run -d brew*
+
+    :param str default: the default command name
+    """
+    def __init__(self, *args, **kwargs):
+        self.default_command = kwargs.pop('default', None)
+        super(DefaultGroup, self).__init__(*args, **kwargs)
+
+    def parse_args(self, ctx, args):
+        if self.default_command and (not args or args[0] not in self.commands):
+            args = [self.default_command] + list(args)
+        return super(DefaultGroup, self).parse_args(ctx, args)
+
+
+@click.group(name='cleanmymac', cls=DefaultGroup, default='run', context_settings=_CONTEXT_SETTINGS)
+def cli():
+    """
+    the **cleanmymac** command line entry point, runs the :func:`run` command unless another command
+    (i.e., :func:`fleet`) is named
+    """
+    pass
+
+
+@cli.command(name='run', context_settings=_CONTEXT_SETTINGS,
+             epilog='see also: "cleanmymac fleet -h" to run cleanup targets on many hosts')
 @click_log.init()
 @click_log.simple_verbosity_option('-L', '--log-level', default='INFO')
 @click.option('-u', '--update', is_flag=True, help='update the target if applicable')
 @click.option('-d', '--dry_run', is_flag=True, help='describe the actions to be performed, do not execute them')
+@click.option('--full', is_flag=True, help='dry run: list every item to remove and estimate their size (long '
+                                           'lists are summarized otherwise)')
 @click.option('-q', '--quiet', is_flag=True, help='run in quiet mode')
 @click.option('-p', '--pretty-print', is_flag=True, help='enable pretty printing with colors')
 @click.option('--strict/--no-strict', default=True,
               help='strict mode: enforce strict(er) rules when validating targets')
 @click.option('-l', '--list', 'list_targets', is_flag=True, help='list registered cleanup targets')
 @click.option('-s', '--stop_on_error', is_flag=True, help='stop execution when first error is detected')
+@click.option('-j', '--jobs', default=1, type=click.IntRange(min=1),
+              help='run up to this many targets concurrently, targets on the same disk are serialized')
+@click.option('-i', '--incremental', is_flag=True,
+              help='incremental mode: skip directory entries unchanged since the last clean')
+@click.option('-w', '--watch', 'watch_mode', is_flag=True,
+              help='watch mode: clean targets when their directories change or free space runs low')
+@click.option('-g', '--gentle', is_flag=True,
+              help='low impact mode: lower CPU and I/O priority, throttle deletions')
+@click.option('-o', '--output-log', default=None, envvar='CLEANMYMAC_OUTPUT_LOG', type=click.Path(),
+              help='stream the output of shell commands to this file (a new file per run if a folder)')
+@click.option('-r', '--report', is_flag=True,
+              help='print a machine readable report of the target outcomes (the last line of output)')
+@click.option('--plan-out', default=None, type=click.Path(dir_okay=False),
+              help='write the plan of the run (commands and paths to remove) to this file, implies a dry run')
+@click.option('--apply', 'apply_plan', default=None, type=click.Path(exists=True, dir_okay=False),
+              help='run a plan written by --plan-out exactly, paths changed since planned are skipped')
+@click.option('--due-only', is_flag=True,
+              help='run only the targets due now: expected to grow beyond their max_size before the next run')
+@click.option('--until-free', default=None,
+              help='stop starting targets once this much disk space is free (i.e., "20 GB"), the targets known '
+                   'to free space fastest run first')
 @click.option('-c', '--config', default=None, envvar='CLEANMYMAC_CONFIG', help='specify the configuration path')
 @click.option('-t', '--targets_path', default=None, type=click.Path(exists=True), multiple=True,
               help='specify extra yaml defined targets path')
 @click.version_option(str_version, '-v', '--version')
 @click.argument('targets', metavar='TARGETS', type=str, nargs=-1)
-def cli(update, dry_run, quiet, pretty_print, strict, list_targets, stop_on_error, config, targets_path, targets, **kwargs):
+def run(update, dry_run, full, quiet, pretty_print, strict, list_targets, stop_on_error, jobs, incremental,
+        watch_mode, gentle, output_log, report, plan_out, apply_plan, due_only, until_free, config, targets_path,
+        targets, **kwargs):
     """
     the main **run** method, responsible for creating the parser and executing the main logic in
     **cleanmymac**
 
     :param bool update: perform update of targets (if applicable)
     :param bool dry_run: do not execute the actions, but log the result
+    :param bool full: in dry run mode describe every item to remove, not a summary
     :param bool quiet: quiet mode (no output), show a progressbar instead
     :param bool pretty_print: enable pretty printing with colors
     :param bool strict: if set enforce strict(er) rules when validating targets
     :param bool list_targets: list the installed targets
     :param bool stop_on_error: abort the execution on first error
+    :param int jobs: the maximum number of targets running concurrently (see :class:`cleanmymac.schedule.Scheduler`)
+    :param bool incremental: skip directory entries unchanged since the last clean
+    :param bool watch_mode: keep running, clean targets when their directories change or free space runs low
+    :param bool gentle: lower the CPU and I/O priority and throttle deletions
+    :param str output_log: the shell commands output log file or folder
+    :param bool report: print the target outcomes report (see :func:`cleanmymac.outcome.format_report`)
+    :param str plan_out: write the plan of the run to this file (see :func:`cleanmymac.plan.write_plan`)
+    :param str apply_plan: run the plan in this file instead of the targets (see :mod:`cleanmymac.plan`)
+    :param bool due_only: run only the targets due now (see :meth:`cleanmymac.history.History.due`)
+    :param str until_free: the free disk space (a size, i.e. '20 GB') after which no new targets are started
     :param str config: the configuration path
     :param str targets_path: extra targets paths
     :param list targets: the targets
     """
+    from cleanmymac.registry import iter_targets, register_yaml_targets, get_targets_as_table
     disable_logger('sarge')
     targets = tuple([target.lower() for target in targets])
 
@@ -112,16 +518,41 @@ def cli(update, dry_run, quiet, pretty_print, strict, list_targets, stop_on_erro
 
     debug_param('update', update)
     debug_param('dry run', dry_run)
+    debug_param('full', full)
     debug_param('quiet mode', quiet)
     debug_param('pretty print', pretty_print)
     debug_param('strict mode', strict)
     debug_param('list available targets', list_targets)
     debug_param('stop on error', stop_on_error)
+    debug_param('jobs', jobs)
+    debug_param('incremental', incremental)
+    debug_param('watch mode', watch_mode)
+    debug_param('gentle', gentle)
+    debug_param('output log', output_log)
+    debug_param('report', report)
+    debug_param('plan out', plan_out)
+    debug_param('apply plan', apply_plan)
+    debug_param('due only', due_only)
+    debug_param('until free', until_free)
     debug_param('global config path', config)
     debug_param('extra targets path', targets_path)
     debug_param('targets', targets)
     debug('')
 
+    if plan_out and apply_plan:
+        raise click.UsageError('--plan-out and --apply are mutually exclusive')
+    if watch_mode and (plan_out or apply_plan):
+        raise click.UsageError('--plan-out and --apply are not supported in watch mode')
+    if watch_mode and (until_free or due_only):
+        raise click.UsageError('--until-free and --due-only are not supported in watch mode')
+    if until_free:
+        try:
+            until_free = parse_size(until_free)
+        except ValueError, ex:
+            raise click.BadParameter(str(ex), param_hint='--until-free')
+    if plan_out:
+        dry_run = True
+
     all_targets = dict(iter_targets())
     if is_debug():
         debug("Detailed information about registered targets")
@@ -144,6 +575,12 @@ def cli(update, dry_run, quiet, pretty_print, strict, list_targets, stop_on_erro
     echo_info('found {0} registered cleanup targets'.format(len(all_targets)), verbose=verbose)
 
     config = get_options(path=config)
+    set_state_path(_config_state_path(config))
+    set_incremental(incremental)
+    if gentle:
+        _gentle(config)
+    if output_log and not dry_run:
+        echo_info('shell commands output log: {0}'.format(set_output_log(output_log)), verbose=verbose)
     # register extra targets if any
     for pth in _config_targets_path(config):
         register_yaml_targets(pth)
@@ -152,41 +589,286 @@ def cli(update, dry_run, quiet, pretty_print, strict, list_targets, stop_on_erro
 
     if list_targets:
         echo_warn(get_targets_as_table(simple=True, fancy=True))
+    elif watch_mode:
+        _watch(target_names, all_targets, config, update=update, dry_run=dry_run, full=full, verbose=verbose,
+               strict=strict)
     else:
-        with progressbar(verbose, all_targets.items(), label='Processing cleanup targets:',
-                         width=40) as all_targets_bar:
-            free_space_before = get_disk_usage('/', unit=UNIT_MB).free
-
-            for name, target_initializer in all_targets_bar:
-                echo_info(_HORIZONTAL_RULE, verbose=verbose)
-                if name not in target_names:
-                    debug('skipping target "{0}"'.format(name))
-                    continue
-                echo_target('\ncleaning: {0}'.format(name.upper()), verbose=verbose)
-                target_cfg = config[name] if name in config else None
-                debug("got target configuration: {0}".format(pformat(target_cfg)))
+        resumed = _resume(dry_run=dry_run, verbose=verbose)
+        run_history = History(get_history_path())
+        if apply_plan:
+            from cleanmymac.plan import read_plan, PlannedTarget
+            plans = [plan for plan in read_plan(apply_plan) if not targets or plan.target in target_names]
+            echo_info('applying the plan of {0} targets: {1}'.format(len(plans), apply_plan), verbose=verbose)
+            target_names = set(plan.target for plan in plans)
+            loaded = dict((plan.target, PlannedTarget(plan, verbose=verbose)) for plan in plans)
+            selected = [(plan.target, None) for plan in plans]
+        else:
+            loaded = _load_targets(target_names - resumed, all_targets, config, update=update, verbose=verbose,
+                                   strict=strict)
+            if due_only:
+                target_names = _due_only(target_names & set(all_targets), config, run_history, loaded,
+                                         verbose=verbose)
+                loaded = dict((name, target) for name, target in loaded.items() if name in target_names)
+            _coalesce_scans(loaded.values())
+            selected = all_targets.items()
+        set_journal(None if dry_run else Journal(get_journal_path()))
+        set_history(None if dry_run else run_history)
+        outcomes = []
+        plans = []
 
-                try:
-                    target = target_initializer(target_cfg, update=update, verbose=verbose, strict=strict)
-
-                    if not isinstance(target, Target):
-                        error('expected an instance of Target, instead got: {0}'.format(target))
-                        continue
-
-                    if dry_run:
-                        echo_warn(target.describe())
-                    else:
-                        target()
-                except Exception, ex:
-                    error('could not cleanup target "{0}". Reason:\n{1}'.format(name, ex))
-                    if stop_on_error:
+        def run_target(name, target):
+            echo_target('\ncleaning: {0}'.format(name.upper()), verbose=verbose)
+            if plan_out:
+                target = _plan_target(name, target, plans, verbose=verbose)
+            return _run_target(name, target, dry_run=dry_run, full=full, concurrent=jobs > 1)
+
+        def stop():
+            if stop_on_error and not all(outcome.success for outcome in outcomes):
+                return True
+            if until_free and get_disk_usage('/', unit=1).free >= until_free:
+                echo_info('\n{0} of disk space free, no more targets are started'.format(format_size(until_free)),
+                          verbose=verbose)
+                return True
+            return False
+
+        runnable = _runnable(selected, loaded, target_names, resumed, verbose=verbose)
+        runnable = _order(runnable, run_history, jobs=jobs, until_free=until_free, verbose=verbose)
+
+        free_space_before = get_disk_usage('/', unit=UNIT_MB).free
+        with track_progress(not verbose, label='Processing cleanup targets:', targets=len(runnable)) as progress:
+            if jobs > 1:
+                # targets complete on the scheduler
+                for _, outcome in _scheduler(config, jobs).run(run_target, runnable, stop=stop):
+                    outcomes.append(outcome)
+                    progress.advance(targets=1)
+            else:
+                for name, target in runnable:
+                    if stop():
                         break
+                    echo_info(_HORIZONTAL_RULE, verbose=verbose)
+                    outcomes.append(run_target(name, target))
+                    progress.advance(targets=1)
+
+        free_space_after = get_disk_usage('/', unit=UNIT_MB).free
+        journal = get_journal()
+        if journal:
+            journal.close()
+            set_journal(None)
+        set_history(None)
+        run_history.close()
+        if plan_out:
+            from cleanmymac.plan import write_plan
+            write_plan(plan_out, plans)
+            echo_info('\nplan of {0} targets written to: {1}'.format(len(plans), plan_out), verbose=verbose)
+        if not dry_run:
+            echo_info('\ncleanup complete', verbose=verbose)
+            # the report goes on a line of its own (see cleanmymac.outcome.parse_report)
+            echo_success('\nfreed {0:.3f} MB of disk space'.format(free_space_after - free_space_before),
+                         verbose=True, nl=verbose or report)
 
-                if not verbose:
-                    sleep(PROGRESSBAR_ADVANCE_DELAY)  # nicer progress bar display for fast executing targets
+        if report:
+            echo(format_report(outcomes))
 
-            free_space_after = get_disk_usage('/', unit=UNIT_MB).free
-            if not dry_run:
-                echo_info('\ncleanup complete', verbose=verbose)
-                echo_success('\nfreed {0:.3f} MB of disk space'.format(free_space_after - free_space_before),
-                             verbose=True, nl=verbose)
+
+def _host_line(result):
+    freed = sum(outcome.freed or 0 for outcome in result.outcomes)
+    line = '[{0: ^7}] {1} ({2} freed in {3:.1f}s)'.format(result.status, result.host, format_size(freed),
+                                                         result.duration)
+    if result.error:
+        line += '\n' + '\n'.join('\t' + error_line for error_line in result.error.splitlines())
+    return line
+
+
+@cli.command(name='fleet', context_settings=_CONTEXT_SETTINGS)
+@click_log.init()
+@click_log.simple_verbosity_option('-L', '--log-level', default='INFO')
+@click.option('-I', '--inventory', required=True, type=click.Path(exists=True, dir_okay=False),
+              help='the hosts: a yaml list or a file with one host per line')
+@click.option('-T', '--transport', default='ssh', help='how cleanmymac is run on the hosts: ssh, local or an '
+                                                       'installed transport')
+@click.option('-j', '--concurrency', default=FLEET_CONCURRENCY, type=click.IntRange(1, None),
+              help='the number of hosts cleaned at the same time')
+@click.option('-f', '--max-failure-rate', default=FLEET_MAX_FAILURE_RATE, type=float,
+              help='stop starting new hosts once the rate of failed hosts exceeds this value (0 to 1)')
+@click.option('--timeout', default=FLEET_TIMEOUT, type=float, help='the time (in seconds) each host is given')
+@click.option('-u', '--update', is_flag=True, help='update the target if applicable')
+@click.option('-d', '--dry_run', is_flag=True, help='describe the actions to be performed, do not execute them')
+@click.option('-p', '--pretty-print', is_flag=True, help='enable pretty printing with colors')
+@click.option('--strict/--no-strict', default=True,
+              help='strict mode: enforce strict(er) rules when validating targets')
+@click.option('-i', '--incremental', is_flag=True,
+              help='incremental mode: skip directory entries unchanged since the last clean')
+@click.option('-g', '--gentle', is_flag=True,
+              help='low impact mode: lower CPU and I/O priority, throttle deletions')
+@click.argument('targets', metavar='TARGETS', type=str, nargs=-1)
+def fleet(inventory, transport, concurrency, max_failure_rate, timeout, update, dry_run, pretty_print, strict,
+          incremental, gentle, targets, **kwargs):
+    """
+    run cleanup targets on many hosts concurrently and summarize the freed disk space
+
+    :param str inventory: the inventory file (see :func:`cleanmymac.fleet.load_inventory`)
+    :param str transport: the transport name (see :func:`cleanmymac.fleet.get_transport`)
+    :param int concurrency: the maximum number of hosts cleaned at the same time
+    :param float max_failure_rate: the failure rate above which no new hosts are started
+    :param float timeout: the per host timeout (in seconds)
+    :param bool update: perform update of targets (if applicable)
+    :param bool dry_run: do not execute the actions, but log the result
+    :param bool pretty_print: enable pretty printing with colors
+    :param bool strict: if set enforce strict(er) rules when validating targets
+    :param bool incremental: skip directory entries unchanged since the last clean
+    :param bool gentle: lower the CPU and I/O priority and throttle deletions
+    :param list targets: the targets
+    """
+    from tabulate import tabulate
+    from cleanmymac.fleet import HOST_OK, HOST_FAILED, get_transport, load_inventory, run_fleet, summarize
+    set_pretty_print(pretty_print)
+    hosts = load_inventory(inventory)
+    debug_param('hosts', len(hosts))
+    debug_param('transport', transport)
+    debug_param('concurrency', concurrency)
+    debug_param('max failure rate', max_failure_rate)
+
+    args = ['-q', '--report']
+    for flag, enabled in [('-u', update), ('-d', dry_run), ('-i', incremental), ('-g', gentle),
+                          ('--no-strict', not strict)]:
+        if enabled:
+            args.append(flag)
+    args.extend(targets)
+
+    echo_info('cleaning {0} hosts, {1} at a time'.format(len(hosts), concurrency))
+    results = []
+    for result in run_fleet(hosts, get_transport(transport), args, concurrency=concurrency,
+                            max_failure_rate=max_failure_rate, min_sample=FLEET_MIN_SAMPLE, timeout=timeout):
+        results.append(result)
+        if result.status == HOST_OK:
+            echo_success(_host_line(result))
+        elif result.status == HOST_FAILED:
+            echo_error(_host_line(result))
+        else:
+            echo_warn(_host_line(result))
+
+    summary = summarize(results)
+    echo_info(_HORIZONTAL_RULE)
+    echo(tabulate([[summary.hosts, summary.ok, summary.failed, summary.skipped, format_size(summary.freed)]],
+                  headers=['Hosts', 'Ok', 'Failed', 'Skipped', 'Freed'], tablefmt='orgtbl'))
+    if summary.failed or summary.skipped:
+        click.get_current_context().exit(1)
+
+
+@cli.command(name='history', context_settings=_CONTEXT_SETTINGS)
+@click_log.init()
+@click_log.simple_verbosity_option('-L', '--log-level', default='INFO')
+@click.option('-n', '--runs', default=HISTORY_WINDOW, type=click.IntRange(min=1),
+              help='the number of most recent runs per target')
+@click.option('-C', '--commands', is_flag=True, help='show the shell commands of the targets')
+@click.option('-c', '--config', default=None, envvar='CLEANMYMAC_CONFIG', help='specify the configuration path')
+@click.argument('targets', metavar='TARGETS', type=str, nargs=-1)
+def history(runs, commands, config, targets, **kwargs):
+    """
+    print the trends of the targets over their recent runs (see :mod:`cleanmymac.history`): the median (p50) and
+    95th percentile (p95) durations, the median of the last runs, the space freed per run and the reclaim rate
+
+    :param int runs: the number of most recent runs per target
+    :param bool commands: print the shell command trends instead
+    :param str config: the configuration path
+    :param list targets: the targets (all if none given)
+    """
+    from tabulate import tabulate
+    from cleanmymac.registry import iter_targets, register_yaml_targets
+    config = get_options(path=config)
+    set_state_path(_config_state_path(config))
+    targets = set(target.lower() for target in targets)
+    run_history = History(get_history_path())
+    try:
+        if commands:
+            trends = [trend for trend in run_history.command_trends(window=runs)
+                      if not targets or trend.target in targets]
+            rows = [[trend.target, trend.command, trend.runs, trend.failed, _seconds(trend.p50), _seconds(trend.p95)]
+                    for trend in trends]
+            headers = ['Target', 'Command', 'Runs', 'Failed', 'p50', 'p95']
+        else:
+            trends = [trend for trend in run_history.trends(window=runs) if not targets or trend.target in targets]
+            # loaded for their min_size
+            for pth in _config_targets_path(config):
+                register_yaml_targets(pth)
+            names = [trend.target for trend in trends]
+            due = _due_schedule(names, config, run_history,
+                                _load_targets(names, dict(iter_targets()), config, strict=False))
+            rows = [[trend.target, trend.runs, trend.failed, _seconds(trend.p50), _seconds(trend.p95),
+                     _seconds(trend.recent), '-' if trend.freed is None else format_size(trend.freed), trend.files,
+                     '{0}/s'.format(format_size(int(trend.rate))),
+                     '{0}/day'.format(format_size(int(due[trend.target].growth * DURATION_UNITS['d'])))
+                     if trend.target in due else '-',
+                     _timestamp(trend.last), _timestamp(due[trend.target].next) if trend.target in due else 'now']
+                    for trend in trends]
+            headers = ['Target', 'Runs', 'Failed', 'p50', 'p95', 'Recent p50', 'Freed', 'Files', 'Rate', 'Growth',
+                       'Last run', 'Next due']
+    finally:
+        run_history.close()
+    if not rows:
+        echo_info('no runs recorded yet: {0}'.format(run_history.path))
+        return
+    echo(tabulate(rows, headers=headers, tablefmt='orgtbl'))
+
+
+def _serve_request(argv):
+    """
+    run a command line forwarded by a client, see :func:`cleanmymac.client.forward`
+
+    :param list argv: the command line arguments
+    :return: the exit code
+    :rtype: int
+    """
+    from cleanmymac.registry import scoped_registry
+    try:
+        # through the group: any command runs, the run command is the default. Extra targets (-t or the
+        # targets_path of the configuration) are registered for this request only
+        with scoped_registry():
+            cli.main(args=list(argv), prog_name='cleanmymac', standalone_mode=False)
+        return 0
+    except SystemExit, ex:
+        return ex.code or 0
+    except click.ClickException, ex:
+        ex.show()
+        return ex.exit_code
+    except click.Abort:
+        echo_error('Aborted!')
+        return 1
+    finally:
+        # per run settings must not leak into the next request
+        set_output_log(None)
+        from cleanmymac.gentle import set_throttle
+        set_throttle(None)
+        set_progress(None)
+        set_history(None)
+        set_incremental(False)
+        set_journal(None)
+
+
+@cli.command(name='serve', context_settings=_CONTEXT_SETTINGS)
+@click_log.init()
+@click_log.simple_verbosity_option('-L', '--log-level', default='INFO')
+@click.option('-S', '--socket', 'socket_path', default=None, type=click.Path(),
+              help='the server socket (defaults to ~/.cleanmymac/cleanmymac.sock or $CLEANMYMAC_SOCKET)')
+def serve(socket_path, **kwargs):
+    """
+    keep **cleanmymac** resident: the cleanup targets and their descriptions stay loaded and the **cleanmymac**
+    command forwards its command line to this server while it runs. Target **YAML** files are reloaded
+    when they change.
+
+    :param str socket_path: the server socket
+    """
+    from cleanmymac.registry import refresh_yaml_targets
+    from cleanmymac.server import Server
+    disable_logger('sarge')
+    server = Server(_serve_request, socket_path=socket_path, refresh=refresh_yaml_targets)
+    try:
+        server.bind()
+    except RuntimeError, ex:
+        raise click.ClickException(str(ex))
+    echo_info('cleanmymac server listening on {0}, press CTRL+C to stop'.format(server.socket_path))
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        echo_info('\nserver stopped')
@@ -0,0 +1,128 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import sys
+import json
+import socket
+
+from cleanmymac.constants import DEFAULT_SERVER_SOCKET
+
+#: commands and options that are never forwarded to the server: they either keep running, change the
+#: priority of the process or do not run targets at all
+_LOCAL_COMMANDS = frozenset(['serve', 'fleet'])
+_LOCAL_OPTIONS = frozenset(['-w', '--watch', '-g', '--gentle'])
+_LOCAL_SHORT_FLAGS = frozenset('wg')
+
+
+def get_socket_path():
+    """
+    the Unix socket of the **cleanmymac** server, the *CLEANMYMAC_SOCKET* environment variable
+    overrides :attr:`cleanmymac.constants.DEFAULT_SERVER_SOCKET`
+
+    :return: the expanded socket path
+    :rtype: str
+    """
+    return os.path.abspath(os.path.expanduser(os.environ.get('CLEANMYMAC_SOCKET', DEFAULT_SERVER_SOCKET)))
+
+
+def is_forwardable(argv):
+    """
+    test if a command line can be run by the server
+
+    :param list argv: the command line arguments
+    :return: True if the command can be forwarded
+    :rtype: bool
+    """
+    if os.environ.get('CLEANMYMAC_NO_SERVER'):
+        return False
+    if argv and argv[0] in _LOCAL_COMMANDS:
+        return False
+    for arg in argv:
+        if arg in _LOCAL_OPTIONS:
+            return False
+        if arg.startswith('-') and not arg.startswith('--') and _LOCAL_SHORT_FLAGS.intersection(arg[1:]):
+            return False
+    return True
+
+
+def connect(socket_path=None):
+    """
+    connect to the **cleanmymac** server
+
+    :param str socket_path: the server socket (defaults to :func:`get_socket_path`)
+    :return: the connected socket or None if the server is not running
+    :rtype: :class:`socket.socket`
+    """
+    socket_path = socket_path or get_socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def forward(argv, socket_path=None):
+    """
+    run a command line on the **cleanmymac** server, the output of the command is written to the
+    standard output and error streams of this process
+
+    :param list argv: the command line arguments
+    :param str socket_path: the server socket (defaults to :func:`get_socket_path`)
+    :return: the exit code of the command or None if the server is not running
+    :rtype: int
+    """
+    sock = connect(socket_path)
+    if sock is None:
+        return None
+    try:
+        request = {
+            'argv': list(argv),
+            'cwd': os.getcwd(),
+            'env': dict((key, value) for key, value in os.environ.items() if key.startswith('CLEANMYMAC_')),
+        }
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        for line in sock.makefile('rb'):
+            message = json.loads(line.decode('utf-8'))
+            if 'exit' in message:
+                return message['exit']
+            stream = sys.stderr if 'err' in message else sys.stdout
+            getattr(stream, 'buffer', stream).write(message.get('err', message.get('out', '')).encode('utf-8'))
+            stream.flush()
+    finally:
+        sock.close()
+    sys.stderr.write('connection to the cleanmymac server lost\n')
+    return 1
+
+
+def main():
+    """
+    the **cleanmymac** console entry point: forwards the command line to the server if it is running
+    (see *cleanmymac serve*), runs it in process otherwise
+    """
+    argv = sys.argv[1:]
+    if is_forwardable(argv):
+        code = forward(argv)
+        if code is not None:
+            sys.exit(code)
+
+    from cleanmymac.cli import cli
+    cli(prog_name='cleanmymac')
@@ -22,16 +22,96 @@ TARGET_ENTRY_POINT = 'cleanmymac.target'
 #: the global config file name
 GLOBAL_CONFIG_FILE = '.cleanmymac.yaml'
 
+#: the default folder where **cleanmymac** keeps state between runs
+DEFAULT_STATE_PATH = '~/.cleanmymac'
+
+#: the default Unix socket of the **cleanmymac** server (see *cleanmymac serve*), overridden by the
+#: *CLEANMYMAC_SOCKET* environment variable
+DEFAULT_SERVER_SOCKET = '~/.cleanmymac/cleanmymac.sock'
+
+#: the state file holding the signatures of cleaned directories (see incremental mode)
+STATE_SIGNATURES = 'signatures'
+
+#: the journal of the deletions in progress, kept in the state folder (see :mod:`cleanmymac.journal`)
+JOURNAL_FILE = 'journal.jsonl'
+
+#: the journal is synced to disk at least every that many records
+JOURNAL_SYNC_EVERY = 1000
+
+#: the journal is synced to disk at least every that many seconds
+JOURNAL_SYNC_INTERVAL = 1.0
+
+#: the run history database, kept in the state folder (see :mod:`cleanmymac.history`)
+HISTORY_FILE = 'history.sqlite'
+
+#: the number of runs kept in the history
+HISTORY_MAX_RUNS = 1000
+
+#: the number of recent runs per target the durations and reclaim rates are estimated on
+HISTORY_WINDOW = 20
+
+#: the number of most recent runs compared against the window (see *cleanmymac history*)
+HISTORY_RECENT = 5
+
+#: the version of the plan files written by *--plan-out* (see :mod:`cleanmymac.plan`)
+PLAN_VERSION = 1
+
 #: the **YAML** constant used to identify targets of type: :class:`cleanmymac.target.ShellCommandTarget`
 TYPE_TARGET_CMD = 'cmd'
 
 #: the **YAML** constant used to identify targets of type: :class:`cleanmymac.target.DirTarget`
 TYPE_TARGET_DIR = 'dir'
 
+#: the **YAML** constant used to identify targets of type: :class:`cleanmymac.target.FilesTarget`
+TYPE_TARGET_FILES = 'files'
+
+#: the **YAML** constant used to identify targets of type: :class:`cleanmymac.target.ArtifactsTarget`
+TYPE_TARGET_ARTIFACTS = 'artifacts'
+
+#: the **YAML** constant used to identify targets of type: :class:`cleanmymac.target.CapTarget`
+TYPE_TARGET_CAP = 'cap'
+
+#: the **YAML** constant used to identify targets of type: :class:`cleanmymac.target.DedupeTarget`
+TYPE_TARGET_DEDUPE = 'dedupe'
+
 #: the **YAML** valid target types
 VALID_TARGET_TYPES = frozenset([
     TYPE_TARGET_DIR,
-    TYPE_TARGET_CMD
+    TYPE_TARGET_CMD,
+    TYPE_TARGET_FILES,
+    TYPE_TARGET_ARTIFACTS,
+    TYPE_TARGET_CAP,
+    TYPE_TARGET_DEDUPE
+])
+
+#: the default build artifact directory names looked for by *artifacts* targets
+ARTIFACT_NAMES = ['node_modules', 'target', '.tox', '__pycache__']
+
+#: the default number of threads searching for build artifacts
+ARTIFACTS_WORKERS = 8
+
+#: the file times *cap* targets can evict by: last access or last modification
+VALID_CAP_ORDERS = frozenset([
+    'atime',
+    'mtime'
+])
+
+#: what *dir* entries do with the folders they clean: delete them or archive them first (see *archive_dir*)
+VALID_DIR_ACTIONS = frozenset([
+    'delete',
+    'archive'
+])
+
+#: what *dedupe* targets do with duplicate files: delete them or replace them by hard links to the kept copy
+VALID_DEDUPE_ACTIONS = frozenset([
+    'delete',
+    'hardlink'
+])
+
+#: which copy of duplicate files *dedupe* targets keep: the oldest or the newest (by modification time)
+VALID_DEDUPE_KEEP = frozenset([
+    'oldest',
+    'newest'
 ])
 
 #: 1 kilobyte
@@ -43,8 +123,130 @@ UNIT_MB = UNIT_KB * 1024
 #: 1 gigabyte
 UNIT_GB = UNIT_MB * 1024
 
-#: the progress bar advance delay (when in quiet mode). Nicer progress experience for fast targets
-PROGRESSBAR_ADVANCE_DELAY = 0.25
+#: 1 terabyte
+UNIT_TB = UNIT_GB * 1024
+
+#: size units as accepted in **YAML** definitions (i.e., '500 MB')
+SIZE_UNITS = {
+    'b': 1,
+    'kb': UNIT_KB,
+    'mb': UNIT_MB,
+    'gb': UNIT_GB,
+    'tb': UNIT_TB,
+}
+
+#: duration units as accepted in **YAML** definitions (i.e., '7d')
+DURATION_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 60 * 60,
+    'd': 24 * 60 * 60,
+    'w': 7 * 24 * 60 * 60,
+}
+
+#: the default debounce delay (in seconds) in watch mode, bursts of changes trigger a single run
+WATCH_DEBOUNCE = 5.0
+
+#: the default interval (in seconds) between free disk space checks in watch mode
+WATCH_SPACE_INTERVAL = 30.0
+
+#: the number of output lines kept per shell command (reported on failure)
+OUTPUT_TAIL_LINES = 20
+
+#: lines of shell command output longer than this are truncated (in bytes)
+OUTPUT_MAX_LINE_LENGTH = 4096
+
+#: the read size used when capturing shell command output (in bytes)
+OUTPUT_READ_SIZE = 64 * 1024
+
+#: the shell running the commands of *cmd* targets in session mode (see :class:`cleanmymac.session.ShellSession`)
+SESSION_SHELL = '/bin/sh'
+
+#: the prefix of the report line holding the target outcomes (see :mod:`cleanmymac.outcome`)
+REPORT_PREFIX = 'cleanmymac-report: '
+
+#: the entry point for externally defined :class:`cleanmymac.fleet.Transport` extensions
+TRANSPORT_ENTRY_POINT = 'cleanmymac.transport'
+
+#: the default number of hosts cleaned concurrently in fleet mode
+FLEET_CONCURRENCY = 10
+
+#: the default host failure rate above which fleet mode stops starting new hosts
+FLEET_MAX_FAILURE_RATE = 0.25
+
+#: the number of hosts completed before the failure rate is checked in fleet mode
+FLEET_MIN_SAMPLE = 5
+
+#: the default time (in seconds) a host is given to complete in fleet mode
+FLEET_TIMEOUT = 60 * 60
+
+#: the default minimum size of the files *dedupe* targets consider
+DEDUPE_MIN_SIZE = 4 * UNIT_KB
+
+#: the number of bytes hashed at both ends of a file before hashing it fully (see *dedupe* targets)
+DEDUPE_EDGE_SIZE = 4 * UNIT_KB
+
+#: the read size used when fully hashing files (in bytes)
+DEDUPE_READ_SIZE = UNIT_MB
+
+#: the default number of processes (and threads) hashing files
+DEDUPE_WORKERS = 4
+
+#: the hash function duplicate files are identified by (see :mod:`hashlib`)
+DEDUPE_HASH = 'sha256'
+
+#: the compressors folders are archived with (see *action: archive* on *dir* entries): the compress and
+#: decompress commands (both run multi-threaded) and the archive file extension
+ARCHIVE_COMPRESSORS = {
+    'zstd': (['zstd', '-T0', '-q', '-c'], ['zstd', '-T0', '-q', '-d', '-c'], '.tar.zst'),
+    'xz': (['xz', '-T0', '-q', '-c'], ['xz', '-T0', '-q', '-d', '-c'], '.tar.xz'),
+}
+
+#: the default compressor of archived folders
+ARCHIVE_COMPRESSION = 'zstd'
+
+#: the resource class of targets mostly bound by disk I/O (see :attr:`cleanmymac.target.Target.resource_class`)
+RESOURCE_IO = 'io'
+
+#: the resource class of targets mostly bound by the network (i.e., *cmd* targets)
+RESOURCE_NETWORK = 'network'
+
+#: the resource class of targets mostly bound by the CPU (i.e., *dedupe* targets)
+RESOURCE_CPU = 'cpu'
+
+#: the valid resource classes of targets
+VALID_RESOURCE_CLASSES = frozenset([
+    RESOURCE_IO,
+    RESOURCE_NETWORK,
+    RESOURCE_CPU
+])
+
+#: the default number of targets running concurrently on the same (physical) device, see *-j / --jobs*
+SCHEDULE_PER_DEVICE = 1
+
+#: the default number of targets without directories (i.e., *cmd* targets, mostly network bound) running concurrently
+SCHEDULE_COMMANDS = 4
+
+#: the default number of CPU bound targets running concurrently, see *-j / --jobs*
+SCHEDULE_CPU = 1
+
+#: the default size (in bytes) targets should not grow beyond, runs are due before that (see *--due-only*)
+DUE_MAX_SIZE = UNIT_GB
+
+#: the default longest time (in seconds) between two runs of a target (see *--due-only*)
+DUE_MAX_INTERVAL = DURATION_UNITS['w']
+
+#: the next run of a target is due after this fraction of the time it is expected to take to reach its size
+DUE_MARGIN = 0.8
+
+#: the minimum interval (in seconds) between redraws of the progress bar (in quiet mode)
+PROGRESS_REFRESH_INTERVAL = 0.25
+
+#: the width of the progress bar (in characters)
+PROGRESS_BAR_WIDTH = 40
+
+#: the number of items described at both ends of long lists of items to remove (in dry run mode, see *--full*)
+DESCRIBE_SUMMARY_ITEMS = 5
 
 DESCRIBE_CLEAN = 'clean'
 DESCRIBE_UPDATE = 'update'
@@ -52,3 +254,15 @@ VALID_DESCRIBE_MESSAGES = frozenset([
     DESCRIBE_CLEAN,
     DESCRIBE_UPDATE
 ])
+
+#: the default niceness increment in gentle mode
+GENTLE_NICE = 10
+
+#: the default I/O scheduling class in gentle mode
+GENTLE_IO_CLASS = 'idle'
+
+#: the default maximum number of files deleted per second in gentle mode
+GENTLE_FILES_PER_SECOND = 1000
+
+#: the default maximum number of bytes freed per second in gentle mode
+GENTLE_BYTES_PER_SECOND = 256 * UNIT_MB
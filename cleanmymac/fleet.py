@@ -0,0 +1,289 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import sys
+import subprocess
+from time import time
+from threading import Event, Lock, Timer
+from collections import namedtuple
+from abc import ABCMeta, abstractmethod
+from six.moves import shlex_quote
+
+from cleanmymac.log import debug
+from cleanmymac.outcome import parse_report
+from cleanmymac.capture import BoundedCapture
+from cleanmymac.constants import TRANSPORT_ENTRY_POINT, FLEET_CONCURRENCY, FLEET_MAX_FAILURE_RATE, FLEET_MIN_SAMPLE, \
+    FLEET_TIMEOUT
+
+#: the host was cleaned, all targets succeeded
+HOST_OK = 'ok'
+
+#: the host could not be reached or at least one target failed
+HOST_FAILED = 'failed'
+
+#: the host was not started, the fleet failure rate was exceeded
+HOST_SKIPPED = 'skipped'
+
+#: a :func:`collections.namedtuple` holding the result of cleaning a host: the host, the status (one of
+#: :data:`HOST_OK`, :data:`HOST_FAILED` or :data:`HOST_SKIPPED`), the target outcomes
+#: (:class:`cleanmymac.outcome.Outcome`), the error message (if any) and the duration (in seconds)
+HostResult = namedtuple('HostResult', ['host', 'status', 'outcomes', 'error', 'duration'])
+
+#: a :func:`collections.namedtuple` summarizing a fleet run: the number of hosts (total, ok, failed and skipped)
+#: and the disk space freed over all hosts (in bytes)
+FleetSummary = namedtuple('FleetSummary', ['hosts', 'ok', 'failed', 'skipped', 'freed'])
+
+
+class Transport(object):
+    """
+    the way **cleanmymac** is run on a host. This is an abstract class, new transports can be installed
+    through the :attr:`cleanmymac.constants.TRANSPORT_ENTRY_POINT` entry point.
+    """
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def command(self, host, args):
+        """
+        the command running **cleanmymac** on a host
+
+        :param str host: the host
+        :param list args: the **cleanmymac** command line arguments
+        :return: the command line
+        :rtype: list
+        """
+        pass
+
+    def environment(self, host):
+        """
+        extra environment variables for the command
+
+        :param str host: the host
+        :return: the variables
+        :rtype: dict
+        """
+        return {}
+
+
+class SshTransport(Transport):
+    """
+    run **cleanmymac** over **ssh**, in batch mode (no password prompts)
+
+    :param str ssh: the ssh executable
+    :param list options: extra ssh options (i.e., ['-i', '~/.ssh/fleet'])
+    :param str remote_command: the remote command (i.e., 'sudo cleanmymac')
+    """
+    def __init__(self, ssh='ssh', options=None, remote_command='cleanmymac'):
+        self._ssh = ssh
+        self._options = list(options) if options else []
+        self._remote_command = remote_command
+
+    def command(self, host, args):
+        remote = ' '.join([self._remote_command] + [shlex_quote(arg) for arg in args])
+        return [self._ssh, '-o', 'BatchMode=yes'] + self._options + [host, remote]
+
+
+class LocalTransport(Transport):
+    """
+    run **cleanmymac** as a local sub-process for every host, mostly useful for testing. The host
+    is passed in the *CLEANMYMAC_HOST* environment variable.
+
+    :param list command: the command (defaults to running the current **cleanmymac** package)
+    """
+    def __init__(self, command=None):
+        self._command = list(command) if command else [sys.executable, '-m', 'cleanmymac']
+
+    def command(self, host, args):
+        return self._command + list(args)
+
+    def environment(self, host):
+        return {'CLEANMYMAC_HOST': host}
+
+
+_TRANSPORTS = {
+    'ssh': SshTransport,
+    'local': LocalTransport,
+}
+
+
+def get_transport(name, **kwargs):
+    """
+    create a transport by name, either a builtin one (*ssh* or *local*) or one installed
+    through the :attr:`cleanmymac.constants.TRANSPORT_ENTRY_POINT` entry point
+
+    :param str name: the transport name
+    :param dict kwargs: the transport arguments
+    :return: the transport
+    :rtype: :class:`Transport`
+    :raise: :class:`ValueError` if no such transport exists
+    """
+    if name in _TRANSPORTS:
+        return _TRANSPORTS[name](**kwargs)
+    from pkg_resources import iter_entry_points
+    for ep in iter_entry_points(TRANSPORT_ENTRY_POINT, name=name):
+        debug('found transport: %s', ep)
+        return ep.load()(**kwargs)
+    raise ValueError('unknown transport: "{0}", valid options are: {1}'.format(name, sorted(_TRANSPORTS)))
+
+
+def load_inventory(path):
+    """
+    load the hosts from an inventory file: either a **YAML** list of hosts (optionally under a `hosts` key)
+    or a plain text file with one host per line (*#* starts a comment). Duplicates are dropped.
+
+    :param str path: the inventory file
+    :return: the hosts
+    :rtype: list
+    """
+    from yaml import load, YAMLError
+    with open(path, 'r') as inventory:
+        content = inventory.read()
+    try:
+        data = load(content)
+    except YAMLError:
+        data = None
+    if isinstance(data, dict):
+        data = data.get('hosts', [])
+    if isinstance(data, list):
+        hosts = [str(host).strip() for host in data]
+    else:
+        hosts = [line.split('#', 1)[0].strip() for line in content.splitlines()]
+
+    unique = []
+    for host in hosts:
+        if host and host not in unique:
+            unique.append(host)
+    return unique
+
+
+def _kill(process):
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+
+def run_host(transport, host, args, timeout=FLEET_TIMEOUT):
+    """
+    run **cleanmymac** on a host and collect the target outcomes from its report
+    (the *--report* option must be part of `args`)
+
+    :param transport: the transport
+    :type transport: :class:`Transport`
+    :param str host: the host
+    :param list args: the **cleanmymac** command line arguments
+    :param float timeout: the host is stopped after this many seconds
+    :return: the result
+    :rtype: :class:`HostResult`
+    """
+    start = time()
+    env = dict(os.environ)
+    env.update(transport.environment(host))
+    command = transport.command(host, args)
+    debug('[%s] %s', host, command)
+
+    with BoundedCapture(name=host) as stderr:
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr.stream, env=env)
+        except OSError as e:
+            return HostResult(host, HOST_FAILED, [], str(e), time() - start)
+        timer = Timer(timeout, _kill, [process])
+        timer.daemon = True
+        timer.start()
+        try:
+            output, _ = process.communicate()
+        finally:
+            timer.cancel()
+    duration = time() - start
+
+    try:
+        outcomes = parse_report(output.decode('utf-8', 'replace'))
+    except ValueError as e:
+        return HostResult(host, HOST_FAILED, [], 'malformed report: {0}'.format(e), duration)
+    if outcomes is None:
+        reason = 'exit code {0}, no report'.format(process.returncode)
+        if duration >= timeout:
+            reason = 'timed out after {0:.0f} seconds'.format(timeout)
+        return HostResult(host, HOST_FAILED, [], '\n'.join([reason] + stderr.tail), duration)
+
+    failed = [outcome for outcome in outcomes if not outcome.success]
+    if failed:
+        return HostResult(host, HOST_FAILED, outcomes, '\n'.join(
+            '{0}: {1}'.format(outcome.target, outcome.error) for outcome in failed), duration)
+    return HostResult(host, HOST_OK, outcomes, None, duration)
+
+
+def run_fleet(hosts, transport, args, concurrency=FLEET_CONCURRENCY, max_failure_rate=FLEET_MAX_FAILURE_RATE,
+              min_sample=FLEET_MIN_SAMPLE, timeout=FLEET_TIMEOUT):
+    """
+    run **cleanmymac** on many hosts concurrently, see :func:`run_host`. Once `min_sample` hosts completed,
+    no new hosts are started if the rate of failed hosts exceeds `max_failure_rate` (the hosts already
+    running are allowed to complete), the remaining hosts are skipped.
+
+    :param list hosts: the hosts
+    :param transport: the transport
+    :type transport: :class:`Transport`
+    :param list args: the **cleanmymac** command line arguments
+    :param int concurrency: the maximum number of hosts cleaned at the same time
+    :param float max_failure_rate: the failure rate (between 0 and 1) above which the run stops
+    :param int min_sample: the number of hosts completed before the failure rate is checked
+    :param float timeout: the per host timeout (in seconds)
+    :return: a generator of results (in completion order)
+    """
+    if not hosts:
+        return
+    stop = Event()
+    lock = Lock()
+    completed = {HOST_OK: 0, HOST_FAILED: 0}
+    sample = min(min_sample, len(hosts))
+
+    def clean(host):
+        if stop.is_set():
+            return HostResult(host, HOST_SKIPPED, [], 'failure rate exceeded', 0.0)
+        result = run_host(transport, host, args, timeout=timeout)
+        with lock:
+            completed[result.status] += 1
+            total = sum(completed.values())
+            if total >= sample and float(completed[HOST_FAILED]) / total > max_failure_rate:
+                if not stop.is_set():
+                    debug('failure rate exceeded: %s of %s hosts failed', completed[HOST_FAILED], total)
+                stop.set()
+        return result
+
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(min(concurrency, len(hosts)))
+    try:
+        for result in pool.imap_unordered(clean, hosts):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def summarize(results):
+    """
+    summarize a fleet run
+
+    :param list results: the host results
+    :type results: list of :class:`HostResult`
+    :return: the summary
+    :rtype: :class:`FleetSummary`
+    """
+    statuses = [result.status for result in results]
+    freed = sum(outcome.freed or 0 for result in results for outcome in result.outcomes)
+    return FleetSummary(len(results), statuses.count(HOST_OK), statuses.count(HOST_FAILED),
+                        statuses.count(HOST_SKIPPED), freed)
@@ -0,0 +1,194 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import sys
+import ctypes
+import ctypes.util
+import platform
+from threading import Lock
+from time import time, sleep
+
+from cleanmymac.log import debug, warn
+
+#: Linux **ioprio_set** system call numbers
+_IOPRIO_SET_SYSCALL = {
+    'x86_64': 251,
+    'amd64': 251,
+    'i386': 289,
+    'i686': 289,
+    'aarch64': 30,
+    'armv7l': 314,
+    'ppc64le': 273,
+}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+
+#: the Linux I/O scheduling classes
+IO_CLASSES = {
+    'realtime': 1,
+    'best-effort': 2,
+    'idle': 3,
+}
+
+#: OS X **setiopolicy_np** constants
+_IOPOL_TYPE_DISK = 0
+_IOPOL_SCOPE_PROCESS = 0
+_IOPOL_THROTTLE = 3
+_IOPOL_UTILITY = 4
+
+
+def _libc():
+    name = ctypes.util.find_library('c')
+    return ctypes.CDLL(name, use_errno=True) if name else None
+
+
+def lower_cpu_priority(increment):
+    """
+    lower the CPU scheduling priority of the current process (see :func:`os.nice`), the
+    priority is inherited by the spawned shell commands
+
+    :param int increment: the niceness increment
+    :return: True if the priority was lowered
+    :rtype: bool
+    """
+    try:
+        os.nice(increment)
+        return True
+    except OSError as e:
+        warn('could not lower the CPU priority. Reason: {0}'.format(e))
+        return False
+
+
+def lower_io_priority(io_class='idle'):
+    """
+    lower the I/O scheduling priority of the current process: **ioprio_set** on Linux and
+    **setiopolicy_np** on OS X (where any class below best-effort maps to the throttled policy).
+    The priority is inherited by the spawned shell commands.
+
+    :param str io_class: the I/O scheduling class, one of :attr:`IO_CLASSES`
+    :return: True if the priority was lowered
+    :rtype: bool
+    """
+    libc = _libc()
+    if libc is None:
+        return False
+    if sys.platform.startswith('linux'):
+        syscall_nr = _IOPRIO_SET_SYSCALL.get(platform.machine().lower())
+        if syscall_nr is None:
+            debug('ioprio_set not supported on %s', platform.machine())
+            return False
+        # the priority level (data) is only relevant for the best-effort class: 7 is the lowest
+        ioprio = (IO_CLASSES[io_class] << _IOPRIO_CLASS_SHIFT) | 7
+        result = libc.syscall(syscall_nr, _IOPRIO_WHO_PROCESS, 0, ioprio)
+    elif sys.platform == 'darwin' and hasattr(libc, 'setiopolicy_np'):
+        policy = _IOPOL_THROTTLE if io_class == 'idle' else _IOPOL_UTILITY
+        result = libc.setiopolicy_np(_IOPOL_TYPE_DISK, _IOPOL_SCOPE_PROCESS, policy)
+    else:
+        debug('lowering the I/O priority is not supported on %s', sys.platform)
+        return False
+    if result != 0:
+        warn('could not lower the I/O priority (errno {0})'.format(ctypes.get_errno()))
+        return False
+    return True
+
+
+class TokenBucket(object):
+    """
+    a thread safe token bucket rate limiter. Requests larger than the bucket are allowed, the
+    caller then waits until the debt is paid off, the average rate is preserved either way.
+
+    :param float rate: the tokens added per second
+    :param float capacity: the maximum tokens that can be accumulated (burst size), defaults to `rate`
+    """
+    def __init__(self, rate, capacity=None):
+        assert rate > 0
+        self._rate = float(rate)
+        self._capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self._capacity
+        self._last = time()
+        self._lock = Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def consume(self, tokens=1):
+        """
+        take tokens from the bucket, waits if not enough tokens are available
+
+        :param float tokens: the number of tokens
+        :return: the time waited (in seconds)
+        :rtype: float
+        """
+        with self._lock:
+            now = time()
+            self._tokens = min(self._capacity, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            self._tokens -= tokens
+            delay = -self._tokens / self._rate if self._tokens < 0 else 0
+        if delay > 0:
+            sleep(delay)
+        return delay
+
+
+class Throttle(object):
+    """
+    throttle for deletions, limits the number of files unlinked and bytes freed per second
+
+    :param float files_per_second: the maximum number of unlinks per second (unlimited if None)
+    :param float bytes_per_second: the maximum number of bytes freed per second (unlimited if None)
+    """
+    def __init__(self, files_per_second=None, bytes_per_second=None):
+        self._files = TokenBucket(files_per_second) if files_per_second else None
+        self._bytes = TokenBucket(bytes_per_second) if bytes_per_second else None
+
+    def __call__(self, files=1, size=0):
+        """
+        wait until `files` (totalling `size` bytes) may be deleted
+
+        :param int files: the number of files
+        :param int size: the total size in bytes
+        """
+        if self._files is not None and files:
+            self._files.consume(files)
+        if self._bytes is not None and size:
+            self._bytes.consume(size)
+
+
+_throttle = None
+
+
+def set_throttle(throttle):
+    """
+    set the global deletion throttle, used by :func:`cleanmymac.util.remove_tree`
+
+    :param throttle: the throttle, None disables throttling
+    :type throttle: :class:`Throttle`
+    """
+    global _throttle
+    _throttle = throttle
+
+
+def get_throttle():
+    """
+    get the global deletion throttle
+
+    :return: the throttle or None if not set
+    :rtype: :class:`Throttle`
+    """
+    return _throttle
@@ -0,0 +1,393 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+from math import ceil
+from time import time
+from threading import Lock, local
+from collections import namedtuple, defaultdict
+
+from cleanmymac.log import debug, warn
+from cleanmymac.constants import HISTORY_FILE, HISTORY_MAX_RUNS, HISTORY_WINDOW, HISTORY_RECENT, DUE_MAX_INTERVAL, \
+    DUE_MARGIN
+
+#: a :func:`collections.namedtuple` holding the trend of a target over its recent runs: the number of runs
+#: (and failed runs), the median (p50), 95th percentile (p95) and recent median durations (in seconds), the median
+#: bytes (None if unknown) and files freed per run, the reclaim rate (bytes freed per second) and the time of the
+#: last run
+TargetTrend = namedtuple('TargetTrend', ['target', 'runs', 'failed', 'p50', 'p95', 'recent', 'freed', 'files', 'rate',
+                                         'last'])
+
+#: a :func:`collections.namedtuple` holding the trend of a shell command over its recent runs: the number of runs
+#: (and runs with a non zero exit code), the median (p50) and 95th percentile (p95) durations (in seconds)
+CommandTrend = namedtuple('CommandTrend', ['target', 'command', 'runs', 'failed', 'p50', 'p95'])
+
+#: a :func:`collections.namedtuple` holding when the next run of a target is due: its growth rate (bytes per
+#: second), the size it should not grow beyond (in bytes), the time of its last run and of its next run
+Due = namedtuple('Due', ['target', 'growth', 'threshold', 'last', 'next'])
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, started REAL, duration REAL)',
+    'CREATE TABLE IF NOT EXISTS targets (run INTEGER, target TEXT, started REAL, duration REAL, freed INTEGER, '
+    'files INTEGER, success INTEGER, deleted INTEGER DEFAULT 0, skipped INTEGER DEFAULT 0)',
+    'CREATE TABLE IF NOT EXISTS commands (run INTEGER, target TEXT, command TEXT, duration REAL, exit_code INTEGER)',
+    'CREATE INDEX IF NOT EXISTS targets_by_run ON targets (run)',
+    'CREATE INDEX IF NOT EXISTS commands_by_run ON commands (run)',
+]
+
+_history = None
+
+
+def get_history_path():
+    """
+    the run history database, in the state folder (see :func:`cleanmymac.state.get_state_path`)
+
+    :return: the path
+    :rtype: str
+    """
+    from cleanmymac.state import get_state_path
+    return os.path.join(get_state_path(), HISTORY_FILE)
+
+
+def percentile(values, p):
+    """
+    the nearest rank percentile
+
+    :param list values: the values
+    :param float p: the percentile (0 to 1)
+    :return: the percentile or None if there are no values
+    :rtype: float
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, int(ceil(p * len(values))) - 1))]
+
+
+class History(object):
+    """
+    the history of runs, kept in a **SQLite** database: the duration, freed bytes and files and success of every
+    target and the duration and exit code of every shell command. The records of a run are kept in memory (targets
+    running concurrently record from different threads) and written in a single transaction by :meth:`close`,
+    only the last `max_runs` runs are kept.
+
+    :param str path: the database file
+    :param int max_runs: the number of runs kept
+    """
+    def __init__(self, path, max_runs=HISTORY_MAX_RUNS):
+        self.path = path
+        self._max_runs = max_runs
+        self._connection = None
+        self._lock = Lock()
+        # the target of the current thread
+        self._local = local()
+        self._started = time()
+        self._targets = []
+        self._commands = []
+
+    def _connect(self):
+        if self._connection is None:
+            import sqlite3
+            folder = os.path.dirname(self.path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            self._connection = sqlite3.connect(self.path)
+            with self._connection:
+                for statement in _SCHEMA:
+                    self._connection.execute(statement)
+                # histories written before the deleted bytes (and skipped runs) were recorded
+                columns = [column[1] for column in self._connection.execute('PRAGMA table_info(targets)')]
+                for column in ('deleted', 'skipped'):
+                    if column not in columns:
+                        self._connection.execute('ALTER TABLE targets ADD COLUMN {0} INTEGER DEFAULT 0'.format(column))
+        return self._connection
+
+    def begin(self, target):
+        """
+        start recording the shell commands of a target (in the current thread)
+
+        :param str target: the target name
+        """
+        self._local.target = target
+
+    def record_command(self, command, duration, exit_code):
+        """
+        record a shell command run by the current target
+
+        :param str command: the command
+        :param float duration: the duration (in seconds)
+        :param int exit_code: the exit code
+        """
+        with self._lock:
+            self._commands.append((getattr(self._local, 'target', None), command, duration, exit_code))
+
+    def record_target(self, outcome, files=0, deleted=0, skipped=False):
+        """
+        record the outcome of a target
+
+        :param outcome: the outcome, the space freed may be unknown (None)
+        :type outcome: :class:`cleanmymac.outcome.Outcome`
+        :param int files: the number of files deleted
+        :param int deleted: the bytes deleted (the apparent size of the files)
+        :param bool skipped: True if the target skipped itself (see :attr:`cleanmymac.target.Target.skipped`)
+        """
+        with self._lock:
+            self._targets.append((outcome.target, time() - outcome.duration, outcome.duration, outcome.freed,
+                                  files, 1 if outcome.success else 0, deleted, 1 if skipped else 0))
+        self._local.target = None
+
+    def close(self):
+        """
+        write the recorded run (if anything was recorded) and drop the runs beyond `max_runs`
+        """
+        with self._lock:
+            targets, commands, self._targets, self._commands = self._targets, self._commands, [], []
+        if targets or commands:
+            import sqlite3
+            try:
+                connection = self._connect()
+                with connection:
+                    run = connection.execute('INSERT INTO runs (started, duration) VALUES (?, ?)',
+                                             (self._started, time() - self._started)).lastrowid
+                    connection.executemany('INSERT INTO targets (run, target, started, duration, freed, files, '
+                                           'success, deleted, skipped) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                           [(run,) + record for record in targets])
+                    connection.executemany('INSERT INTO commands VALUES (?, ?, ?, ?, ?)',
+                                           [(run,) + record for record in commands])
+                    oldest = run - self._max_runs
+                    for table in ('commands', 'targets'):
+                        connection.execute('DELETE FROM {0} WHERE run <= ?'.format(table), (oldest,))
+                    connection.execute('DELETE FROM runs WHERE id <= ?', (oldest,))
+                debug('recorded %s targets and %s commands in the history', len(targets), len(commands))
+            except sqlite3.Error as e:
+                warn('could not record the run in the history "%s". Reason: %s', self.path, e)
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _recent(self, query, key, window):
+        # the rows of the most recent `window` runs per key, most recent first
+        rows = defaultdict(list)
+        if not os.path.exists(self.path):
+            return rows
+        import sqlite3
+        try:
+            for row in self._connect().execute(query):
+                if len(rows[key(row)]) < window:
+                    rows[key(row)].append(row)
+        except sqlite3.Error as e:
+            warn('could not read the history "%s". Reason: %s', self.path, e)
+        return rows
+
+    def _target_rows(self, window):
+        return self._recent('SELECT target, started, duration, freed, files, success, deleted, skipped FROM targets '
+                            'ORDER BY run DESC', lambda row: row[0], window)
+
+    def durations(self, window=HISTORY_WINDOW):
+        """
+        the expected duration of the targets: the median duration of their recent successful runs
+
+        :param int window: the number of recent runs per target
+        :return: the expected duration (in seconds) per target name
+        :rtype: dict
+        """
+        return dict((target, percentile([row[2] for row in rows if row[5]], 0.5))
+                    for target, rows in self._target_rows(window).items() if any(row[5] for row in rows))
+
+    def reclaim_rates(self, window=HISTORY_WINDOW):
+        """
+        the reclaim rate of the targets over their recent successful runs, runs that freed an unknown amount of
+        space are left out
+
+        :param int window: the number of recent runs per target
+        :return: the bytes freed per second per target name
+        :rtype: dict
+        """
+        rates = {}
+        for target, rows in self._target_rows(window).items():
+            rows = [row for row in rows if row[5] and row[3] is not None]
+            duration = sum(row[2] for row in rows)
+            if duration > 0:
+                rates[target] = sum(row[3] for row in rows) / duration
+        return rates
+
+    def growth_rates(self, window=HISTORY_WINDOW):
+        """
+        the growth rate of the targets: every successful run cleans what the target accumulated since the previous
+        one (its footprint: the bytes deleted, or freed for targets deleting through shell commands). Runs the
+        target skipped (smaller than its `min_size`) cleaned nothing and are left out, as is the time before runs
+        whose footprint is unknown. At least two runs are needed
+
+        :param int window: the number of recent runs per target
+        :return: the bytes per second per target name
+        :rtype: dict
+        """
+        rates = {}
+        for target, rows in self._target_rows(window).items():
+            rows = [row for row in rows if row[5] and not row[7]]
+            if len(rows) < 2:
+                continue
+            # the oldest run cleaned what grew before the window
+            footprint, span = 0, 0.0
+            for row, previous in zip(rows, rows[1:]):
+                if row[6] or row[3] is not None:
+                    footprint += max(row[6] or 0, row[3] or 0)
+                    span += row[1] - previous[1]
+            if span > 0:
+                rates[target] = footprint / span
+        return rates
+
+    def due(self, thresholds, max_interval=DUE_MAX_INTERVAL, margin=DUE_MARGIN, window=HISTORY_WINDOW):
+        """
+        when the next runs of the targets are due (see :func:`next_run`) from their last run that was not
+        skipped, targets without a growth rate are not included (these are always due)
+
+        :param dict thresholds: the size (in bytes) every target should not grow beyond, per target name
+        :param float max_interval: the longest time between two runs (in seconds)
+        :param float margin: the fraction of the time to reach the threshold the next run is scheduled at
+        :param int window: the number of recent runs per target
+        :return: when the next run is due per target name
+        :rtype: dict of :class:`Due`
+        """
+        rates = self.growth_rates(window=window)
+        last = dict((target, [row[1] for row in rows if not row[7]][0])
+                    for target, rows in self._target_rows(window).items() if target in rates)
+        return dict((target, Due(target, rates[target], threshold, last[target],
+                                 next_run(last[target], rates[target], threshold, max_interval, margin=margin)))
+                    for target, threshold in thresholds.items() if target in rates)
+
+    def trends(self, window=HISTORY_WINDOW, recent=HISTORY_RECENT):
+        """
+        the trends of all targets with a history
+
+        :param int window: the number of recent runs per target
+        :param int recent: the number of most recent runs the recent median is computed on
+        :return: the trends, sorted by target name
+        :rtype: list of :class:`TargetTrend`
+        """
+        trends = []
+        for target, rows in sorted(self._target_rows(window).items()):
+            durations = [row[2] for row in rows]
+            known = [row for row in rows if row[3] is not None]
+            total = sum(row[2] for row in known)
+            trends.append(TargetTrend(target, len(rows), sum(1 for row in rows if not row[5]),
+                                      percentile(durations, 0.5), percentile(durations, 0.95),
+                                      percentile(durations[:recent], 0.5), percentile([row[3] for row in known], 0.5),
+                                      percentile([row[4] for row in rows], 0.5),
+                                      sum(row[3] for row in known) / total if total > 0 else 0.0, rows[0][1]))
+        return trends
+
+    def command_trends(self, window=HISTORY_WINDOW):
+        """
+        the trends of all shell commands with a history
+
+        :param int window: the number of recent runs per command
+        :return: the trends, sorted by target name and command
+        :rtype: list of :class:`CommandTrend`
+        """
+        commands = self._recent('SELECT target, command, duration, exit_code FROM commands ORDER BY run DESC',
+                                lambda row: row[:2], window)
+        return [CommandTrend(target, command, len(rows), sum(1 for row in rows if row[3]),
+                             percentile([row[2] for row in rows], 0.5), percentile([row[2] for row in rows], 0.95))
+                for (target, command), rows in sorted(commands.items())]
+
+
+def next_run(last, growth, threshold, max_interval=DUE_MAX_INTERVAL, margin=DUE_MARGIN):
+    """
+    the time the next run of a target is due: ahead of the time its footprint is expected to grow beyond
+    `threshold`, at most `max_interval` after the last run
+
+    :param float last: the time of the last run
+    :param float growth: the growth rate (bytes per second)
+    :param int threshold: the size (in bytes) the target should not grow beyond
+    :param float max_interval: the longest time between two runs (in seconds)
+    :param float margin: the fraction of the time to reach the threshold the next run is scheduled at
+    :return: the time the next run is due
+    :rtype: float
+    """
+    if growth <= 0:
+        return last + max_interval
+    return last + min(max_interval, margin * threshold / growth)
+
+
+def longest_first(targets, durations):
+    """
+    order targets longest processing time first (the classic **LPT** heuristic for parallel machines), targets
+    without a history go first (their duration is unknown), the original order is kept otherwise
+
+    :param list targets: (name, target) pairs
+    :param dict durations: the expected duration per target name (see :meth:`History.durations`)
+    :return: the ordered (name, target) pairs
+    :rtype: list
+    """
+    return sorted(targets, key=lambda item: -durations.get(item[0], float('inf')))
+
+
+def fastest_reclaim_first(targets, rates):
+    """
+    order targets by their reclaim rate (bytes freed per second), highest first. Targets without a history
+    follow the targets known to free space
+
+    :param list targets: (name, target) pairs
+    :param dict rates: the reclaim rate per target name (see :meth:`History.reclaim_rates`)
+    :return: the ordered (name, target) pairs
+    :rtype: list
+    """
+    return sorted(targets, key=lambda item: -rates.get(item[0], 0.0))
+
+
+def estimate_reclaim(needed, names, durations, rates):
+    """
+    estimate the time it takes the targets (in order) to free `needed` bytes, from their recent runs
+
+    :param int needed: the bytes to free
+    :param list names: the target names, in the order they run
+    :param dict durations: the expected duration per target name (see :meth:`History.durations`)
+    :param dict rates: the reclaim rate per target name (see :meth:`History.reclaim_rates`)
+    :return: the estimated time (in seconds) or None if the known targets are not expected to free enough
+    :rtype: float
+    """
+    elapsed, freed = 0.0, 0
+    for name in names:
+        if freed >= needed:
+            break
+        if name not in durations or not rates.get(name):
+            continue
+        elapsed += durations[name]
+        freed += rates[name] * durations[name]
+    return elapsed if freed >= needed else None
+
+
+def set_history(history):
+    """
+    set the global run history, shell command targets record their commands in it
+
+    :param history: the history, None disables recording
+    :type history: :class:`History`
+    """
+    global _history
+    _history = history
+
+
+def get_history():
+    """
+    get the global run history
+
+    :return: the history (or None)
+    :rtype: :class:`History`
+    """
+    return _history
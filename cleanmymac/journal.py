@@ -0,0 +1,283 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import json
+import errno
+import fcntl
+from time import time
+from threading import Lock, local
+from contextlib import contextmanager
+from collections import namedtuple, OrderedDict
+
+from cleanmymac.log import debug, warn
+from cleanmymac.constants import JOURNAL_FILE, JOURNAL_SYNC_EVERY, JOURNAL_SYNC_INTERVAL
+
+#: a :func:`collections.namedtuple` holding a planned removal: the path and whether only the `content`
+#: of the directory is removed (or the whole tree)
+Removal = namedtuple('Removal', ['path', 'content'])
+
+#: a :func:`collections.namedtuple` holding what an interrupted run left to do for a target: the removals
+#: not completed and whether all the removals of the target were `planned` (the target needs no new scan)
+Unfinished = namedtuple('Unfinished', ['target', 'pending', 'planned'])
+
+_journal = None
+
+
+def get_journal_path():
+    """
+    the journal file, in the state folder (see :func:`cleanmymac.state.get_state_path`)
+
+    :return: the path
+    :rtype: str
+    """
+    from cleanmymac.state import get_state_path
+    return os.path.join(get_state_path(), JOURNAL_FILE)
+
+
+def _lock(a_file):
+    # an exclusive lock on the open journal, held by the run writing it (released when the file is closed, even
+    # if the run is killed). False if another run holds it or the journal was removed (or replaced) since opened
+    try:
+        fcntl.flock(a_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError as e:
+        if e.errno in (errno.EAGAIN, errno.EACCES):
+            return False
+        raise
+    try:
+        return os.fstat(a_file.fileno()).st_ino == os.stat(a_file.name).st_ino
+    except OSError:
+        return False
+
+
+class Journal(object):
+    """
+    an append only journal of the removals of a run: for every target the planned removals are recorded
+    before anything is removed, followed by the completed removals. Records are synced to disk in batches
+    (every `sync_every` records or `sync_interval` seconds), a lost batch only means some removals are
+    attempted again. The file is created on the first record and deleted by :meth:`close`, a journal left
+    behind belongs to an interrupted run (see :func:`claim_journal`). The run writing the journal holds an
+    exclusive lock on it, a run started meanwhile is not journaled.
+    Targets running concurrently (in different threads) share the journal, a `begin` record is written whenever
+    the records switch to another target.
+
+    :param str path: the journal file
+    :param int sync_every: sync after this many records
+    :param float sync_interval: sync after this many seconds
+    """
+    def __init__(self, path, sync_every=JOURNAL_SYNC_EVERY, sync_interval=JOURNAL_SYNC_INTERVAL):
+        self.path = path
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._file = None
+        self._lock = Lock()
+        # the target of the current thread and whether its removals were planned
+        self._local = local()
+        # the target of the last record written
+        self._current = None
+        self._disabled = False
+        self._unsynced = 0
+        self._synced_at = time()
+
+    @property
+    def _target(self):
+        return getattr(self._local, 'target', None)
+
+    @property
+    def _begun(self):
+        return getattr(self._local, 'begun', False)
+
+    def _write(self, *records):
+        with self._lock:
+            if self._disabled:
+                return
+            if self._file is None:
+                folder = os.path.dirname(self.path)
+                if not os.path.isdir(folder):
+                    os.makedirs(folder)
+                self._file = open(self.path, 'a')
+                if not _lock(self._file):
+                    warn('the journal "%s" is in use by another run, this run is not journaled', self.path)
+                    self._file.close()
+                    self._file = None
+                    self._disabled = True
+                    return
+            target = self._target
+            if target is not None and target != self._current:
+                self._current = target
+                records = (('begin', target),) + records
+            for record in records:
+                self._file.write(json.dumps(record) + '\n')
+            self._unsynced += len(records)
+            if self._unsynced >= self._sync_every or time() - self._synced_at >= self._sync_interval:
+                self._sync()
+
+    def _sync(self):
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time()
+
+    def sync(self):
+        """
+        flush and sync the records written so far
+        """
+        with self._lock:
+            self._sync()
+
+    def begin(self, target):
+        """
+        start recording the removals of a target (in the current thread)
+
+        :param str target: the target name
+        """
+        self._local.target = target
+        self._local.begun = False
+
+    def plan(self, paths=(), contents=()):
+        """
+        record the planned removals of the current target, call once with all of them before removing anything
+
+        :param list paths: the files and directory trees to remove
+        :param list contents: the directories to remove the content of
+        """
+        self._local.begun = True
+        self._write(*([('plan', path, False) for path in paths] + [('plan', path, True) for path in contents] +
+                      [('planned',)]))
+        self.sync()
+
+    def done(self, path):
+        """
+        record a completed removal
+
+        :param str path: the removed path
+        """
+        if self._begun:
+            self._write(('done', path))
+
+    def end(self):
+        """
+        the current target completed
+        """
+        if self._begun:
+            self._write(('end',))
+        self._local.target = None
+        self._local.begun = False
+
+    def close(self):
+        """
+        the run completed, delete the journal
+        """
+        with self._lock:
+            if self._file is not None:
+                # removed while still locked, no other run takes it for the journal of an interrupted run
+                try:
+                    os.remove(self.path)
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                self._file.close()
+                self._file = None
+
+
+def read_journal(path):
+    """
+    read the journal of an interrupted run. A partially written last record is ignored, the records of a target
+    follow its last `begin` record
+
+    :param str path: the journal file
+    :return: what is left to do per target (only targets that did not complete are returned)
+    :rtype: list of :class:`Unfinished`
+    """
+    if not os.path.exists(path):
+        return []
+    targets = OrderedDict()
+    target = None
+    with open(path, 'r') as journal:
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                debug('skipping malformed journal record: %s', line)
+                continue
+            kind = record[0]
+            if kind == 'begin':
+                target = record[1]
+                targets.setdefault(target, {'pending': OrderedDict(), 'planned': False, 'ended': False})
+            elif target is None:
+                continue
+            elif kind == 'plan':
+                targets[target]['pending'][record[1]] = Removal(record[1], record[2])
+            elif kind == 'planned':
+                targets[target]['planned'] = True
+            elif kind == 'done':
+                targets[target]['pending'].pop(record[1], None)
+            elif kind == 'end':
+                targets[target]['ended'] = True
+                target = None
+    return [Unfinished(name, list(state['pending'].values()), state['planned'])
+            for name, state in targets.items() if not state['ended']]
+
+
+@contextmanager
+def claim_journal(path):
+    """
+    claim the journal left behind by an interrupted run: the journal is locked (see :class:`Journal`) while the
+    block runs, the caller completes the pending removals and deletes it. The journal of a run still in progress
+    is left alone
+
+    :param str path: the journal file
+    :return: a context manager yielding what is left to do per target (see :func:`read_journal`), None if the
+        journal belongs to a run in progress
+    """
+    try:
+        a_file = open(path, 'r')
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        yield []
+        return
+    try:
+        if _lock(a_file):
+            yield read_journal(path)
+        else:
+            debug('the journal "%s" belongs to a run in progress', path)
+            yield None
+    finally:
+        a_file.close()
+
+
+def set_journal(journal):
+    """
+    set the global journal, used by the removal functions in :mod:`cleanmymac.util`
+
+    :param journal: the journal, None disables journaling
+    :type journal: :class:`Journal`
+    """
+    global _journal
+    _journal = journal
+
+
+def get_journal():
+    """
+    get the global journal
+
+    :return: the journal (or None)
+    :rtype: :class:`Journal`
+    """
+    return _journal
@@ -41,15 +41,53 @@ def disable_logger(name):
     logger.setLevel(100)
 
 
+class _Lazy(object):
+    __slots__ = ('_func', '_args')
+
+    def __init__(self, func, args):
+        self._func = func
+        self._args = args
+
+    def __str__(self):
+        return str(self._func(*self._args))
+
+
+def lazy(func, *args):
+    """
+    defer a (potentially expensive) computation until the log message is actually formatted,
+    i.e. `debug('spec: %s', lazy(pformat, spec))` never calls :func:`pprint.pformat` unless
+    debug messages are logged
+
+    :param callable func: the function to call
+    :param list args: the function arguments
+    :return: a lazy message argument
+    """
+    return _Lazy(func, args)
+
+
+def is_enabled_for(level):
+    """
+    test if messages of the given level are logged. Cheap enough to guard hot code paths with
+
+    :param int level: the logging level
+    :return: True if messages are logged
+    :rtype: bool
+    """
+    return _logger.isEnabledFor(level)
+
+
 def _log(level, msg, *args):
     """
-    log messages.
+    log messages. Nothing is formatted unless the `level` is enabled.
 
-    :param str or object msg: the message + format
+    :param str or object or callable msg: the message + format, called first if callable
     :oaram int level: the logging level
-    :param list args: message arguments
+    :param list args: message arguments, applied with the % operator like :mod:`logging` does
+        (i.e., `debug('got %s', value)`, see also :func:`lazy`)
     """
-    if _logger:
+    if _logger and _logger.isEnabledFor(level):
+        if callable(msg):
+            msg = msg()
         if not isinstance(msg, string_types):
             msg = pformat(msg)
         _logger.log(level, msg, *args)
@@ -73,8 +111,9 @@ def debug_param(msg, value, padding=30):
     :param Object value: the value
     :param int padding: padding for the message
     """
-    fmt = '{0: <' + str(padding) + '} : {1}'
-    debug(fmt.format(msg, click.style(str(value), fg=get_color('debug'))))
+    if _logger.isEnabledFor(logging.DEBUG):
+        fmt = '{0: <' + str(padding) + '} : {1}'
+        debug(fmt.format(msg, click.style(str(value), fg=get_color('debug'))))
 
 
 def info(msg, *args):
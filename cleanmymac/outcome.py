@@ -0,0 +1,56 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+from collections import namedtuple
+
+from cleanmymac.constants import REPORT_PREFIX
+
+#: a :func:`collections.namedtuple` holding the outcome of running a target: the target name, whether it
+#: succeeded, the disk space freed (in bytes), the duration (in seconds) and the error message (if any)
+Outcome = namedtuple('Outcome', ['target', 'success', 'freed', 'duration', 'error'])
+
+
+def format_report(outcomes):
+    """
+    serialize outcomes as a single report line, see :func:`parse_report`
+
+    :param list outcomes: the outcomes
+    :type outcomes: list of :class:`Outcome`
+    :return: the report line
+    :rtype: str
+    """
+    return REPORT_PREFIX + json.dumps([outcome._asdict() for outcome in outcomes])
+
+
+def parse_report(output):
+    """
+    extract the outcomes from the output of a **cleanmymac** run (with the *--report* option).
+    The last report line wins, any other output is ignored
+
+    :param str output: the output
+    :return: the outcomes or None if the output holds no report
+    :rtype: list of :class:`Outcome`
+    :raise: :class:`ValueError` if the report is malformed
+    """
+    report = None
+    for line in output.splitlines():
+        if line.startswith(REPORT_PREFIX):
+            report = line[len(REPORT_PREFIX):]
+    if report is None:
+        return None
+    return [Outcome(**dict((field, item.get(field)) for field in Outcome._fields)) for item in json.loads(report)]
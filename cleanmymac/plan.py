@@ -0,0 +1,216 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import json
+from time import time
+from collections import namedtuple
+
+from cleanmymac.log import warn, error, echo_warn
+from cleanmymac.util import get_signature, remove_path, plan_removal, Signature
+from cleanmymac.target import ShellCommandTarget, DedupeTarget
+from cleanmymac.constants import PLAN_VERSION, RESOURCE_IO, RESOURCE_NETWORK
+
+#: a :func:`collections.namedtuple` holding a path to remove and its :class:`cleanmymac.util.Signature` (**lstat**)
+#: at planning time, the path is removed only if its signature did not change. Duplicates also hold the path and
+#: signature of the copy kept in their place (None otherwise), removed only if the kept copy did not change either
+Victim = namedtuple('Victim', ['path', 'signature', 'one_file_system', 'kept', 'kept_signature'])
+
+#: a :func:`collections.namedtuple` holding the plan of a target: the shell commands to run (their `env` and
+#: whether they run in a `session`) followed by the victims to remove
+TargetPlan = namedtuple('TargetPlan', ['target', 'commands', 'env', 'session', 'victims'])
+
+
+def plan_target(name, target):
+    """
+    plan the execution of a target: the shell commands it runs (see
+    :meth:`cleanmymac.target.ShellCommandTarget.commands`) and the paths it removes (see
+    :meth:`cleanmymac.target.DirTarget.removals`), fingerprinted with a single **lstat** each. Removals are
+    (path, one_file_system) pairs or (path, one_file_system, kept) triples, where `kept` is the copy that must
+    stay unchanged for the path to be removed (see :meth:`cleanmymac.target.DedupeTarget.removals`)
+
+    :param str name: the target name
+    :param target: the target
+    :type target: :class:`cleanmymac.target.Target`
+    :return: the plan
+    :rtype: TargetPlan
+    """
+    commands = target.commands() if hasattr(target, 'commands') else []
+    env = dict(target.config.get('env', {})) if commands else {}
+    session = bool(commands) and getattr(target, 'session', False)
+    if isinstance(target, DedupeTarget) and target.action != 'delete':
+        warn('not planning "%s", duplicates are replaced by hard links on a normal run only', name)
+    victims = []
+    for removal in (target.removals() if hasattr(target, 'removals') else []):
+        path, one_file_system = removal[:2]
+        kept = removal[2] if len(removal) > 2 else None
+        try:
+            victims.append(Victim(path, get_signature(path, follow_symlinks=False), one_file_system, kept,
+                                  get_signature(kept, follow_symlinks=False) if kept is not None else None))
+        except OSError:
+            continue
+    return TargetPlan(name, commands, env, session, victims)
+
+
+def write_plan(path, plans):
+    """
+    write the plans of a run to a (**json**) plan file
+
+    :param str path: the plan file
+    :param list plans: the target plans
+    :type plans: list of :class:`TargetPlan`
+    """
+    with open(path, 'w') as plan_file:
+        json.dump({
+            'version': PLAN_VERSION,
+            'created': time(),
+            'targets': [{
+                'target': plan.target,
+                'commands': plan.commands,
+                'env': plan.env,
+                'session': plan.session,
+                'victims': [{
+                    'path': victim.path,
+                    'dev': victim.signature.dev,
+                    'ino': victim.signature.ino,
+                    'mtime_ns': victim.signature.mtime_ns,
+                    'one_file_system': victim.one_file_system,
+                    'kept': _kept(victim)
+                } for victim in plan.victims]
+            } for plan in plans]
+        }, plan_file, indent=1)
+
+
+def _kept(victim):
+    if victim.kept is None:
+        return None
+    return {'path': victim.kept, 'dev': victim.kept_signature.dev, 'ino': victim.kept_signature.ino,
+            'mtime_ns': victim.kept_signature.mtime_ns}
+
+
+def _read_victim(victim):
+    kept = victim.get('kept')
+    return Victim(victim['path'], Signature(victim['dev'], victim['ino'], victim['mtime_ns']),
+                  victim['one_file_system'], kept['path'] if kept else None,
+                  Signature(kept['dev'], kept['ino'], kept['mtime_ns']) if kept else None)
+
+
+def read_plan(path):
+    """
+    read a plan file written by :func:`write_plan`
+
+    :param str path: the plan file
+    :return: the target plans
+    :rtype: list of :class:`TargetPlan`
+    :raise: :class:`ValueError` if the file is not a valid plan
+    """
+    with open(path, 'r') as plan_file:
+        content = json.load(plan_file)
+    if not isinstance(content, dict) or content.get('version') != PLAN_VERSION:
+        raise ValueError('{0} is not a version {1} plan'.format(path, PLAN_VERSION))
+    try:
+        return [TargetPlan(plan['target'], plan['commands'], plan['env'], plan.get('session', False),
+                           [_read_victim(victim) for victim in plan['victims']]) for plan in content['targets']]
+    except (KeyError, TypeError) as e:
+        raise ValueError('{0} is not a valid plan. Reason: {1}'.format(path, e))
+
+
+def is_unchanged(victim):
+    """
+    test if a victim is unchanged since planned, with a single **lstat** (two for duplicates, the kept copy
+    must be unchanged too)
+
+    :param Victim victim: the victim
+    :return: True if the path (and its kept copy) still has the planned signature
+    :rtype: bool
+    """
+    try:
+        if victim.kept is not None and get_signature(victim.kept, follow_symlinks=False) != victim.kept_signature:
+            return False
+        return get_signature(victim.path, follow_symlinks=False) == victim.signature
+    except OSError:
+        return False
+
+
+class PlannedTarget(ShellCommandTarget):
+    """
+    a target executing a :class:`TargetPlan` exactly: the planned shell commands are run and the planned victims
+    are removed, nothing is scanned. Victims changed since planned (see :func:`is_unchanged`) are skipped.
+
+    :param TargetPlan plan: the plan
+    :param verbose: verbose output if True
+    :type verbose: bool
+    """
+    def __init__(self, plan, verbose=False):
+        self._plan = plan
+        super(PlannedTarget, self).__init__({'env': dict(plan.env)}, update=False, verbose=verbose)
+
+    @property
+    def plan(self):
+        return self._plan
+
+    @property
+    def update_commands(self):
+        return []
+
+    @property
+    def clean_commands(self):
+        return self._plan.commands
+
+    @property
+    def session(self):
+        return self._plan.session
+
+    def scan_roots(self):
+        roots = []
+        for victim in self._plan.victims:
+            parent = os.path.dirname(victim.path)
+            if parent not in roots:
+                roots.append(parent)
+        return roots
+
+    @property
+    def resource_class(self):
+        return RESOURCE_NETWORK if self._plan.commands else RESOURCE_IO
+
+    def _unchanged(self):
+        for victim in self._plan.victims:
+            if is_unchanged(victim):
+                yield victim
+            else:
+                warn('skipping "%s", %schanged since planned', victim.path,
+                     'its kept copy "{0}" '.format(victim.kept) if victim.kept is not None else '')
+
+    def clean(self, **kwargs):
+        super(PlannedTarget, self).clean(**kwargs)
+        victims = list(self._unchanged())
+        plan_removal(paths=[victim.path for victim in victims])
+        for victim in victims:
+            if self._verbose:
+                echo_warn('delete: {0}'.format(victim.path))
+            try:
+                remove_path(victim.path, one_file_system=victim.one_file_system)
+            except OSError as e:
+                error('could not delete "{0}". Reason: {1}'.format(victim.path, e))
+
+    def describe(self, full=False):
+        for line in super(PlannedTarget, self).describe(full=full):
+            yield line
+        victims = (('delete: {0}{1}'.format(victim.path, '' if is_unchanged(victim) else ' (changed, skipped)'), None)
+                   for victim in self._plan.victims)
+        for line in self._describe_summary(victims, 'paths', full=full):
+            yield line
@@ -0,0 +1,272 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import click
+from time import time
+from threading import Event, Lock, Thread, local
+from contextlib import contextmanager
+from collections import namedtuple
+
+from cleanmymac.constants import PROGRESS_REFRESH_INTERVAL, PROGRESS_BAR_WIDTH
+
+#: the units of work tracked by a :class:`Progress`: targets run, shell commands run, files deleted and their bytes
+UNITS = ('targets', 'commands', 'files', 'size')
+
+#: a :func:`collections.namedtuple` holding a consistent view of a :class:`Progress`: the planned and done work
+#: (dictionaries keyed by :attr:`UNITS`) and the time elapsed since the start (in seconds)
+Snapshot = namedtuple('Snapshot', ['planned', 'done', 'elapsed'])
+
+# the units progress is measured in, finest first
+_FINEST_FIRST = ('size', 'files', 'commands', 'targets')
+
+_progress = None
+
+
+def _format_eta(seconds):
+    seconds = int(seconds + 0.5)
+    return '{0:02d}:{1:02d}:{2:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class Progress(object):
+    """
+    tracks the work done by a run in real units (see :attr:`UNITS`): the targets and shell commands completed, the
+    files deleted and bytes freed. Work is added as planned when known upfront (i.e., the files of a *files* target)
+    and advanced as it completes, both thread safe. When started, a timer thread redraws the progress line at most
+    every `interval` seconds, the work itself never waits on the display.
+
+    :param str label: the label shown in front of the progress bar
+    :param float interval: the refresh interval (in seconds)
+    :param int width: the width of the progress bar (in characters)
+    :param file stream: the output stream, defaults to stdout
+    """
+    def __init__(self, label='', interval=PROGRESS_REFRESH_INTERVAL, width=PROGRESS_BAR_WIDTH, stream=None):
+        self.label = label
+        self._interval = interval
+        self._width = width
+        self._stream = stream if stream is not None else click.get_text_stream('stdout')
+        self._lock = Lock()
+        self._planned = dict((unit, 0) for unit in UNITS)
+        self._done = dict((unit, 0) for unit in UNITS)
+        # the work done by the current thread
+        self._local = local()
+        self._started = time()
+        self._stopped = Event()
+        self._thread = None
+        self._last_width = 0
+
+    def plan(self, **units):
+        """
+        add planned work, i.e. `plan(files=10, size=4096)`
+
+        :param dict units: the amount planned per unit (see :attr:`UNITS`)
+        """
+        with self._lock:
+            for unit, amount in units.items():
+                self._planned[unit] += amount
+
+    def advance(self, **units):
+        """
+        add completed work, i.e. `advance(files=1, size=4096)`
+
+        :param dict units: the amount completed per unit (see :attr:`UNITS`)
+        """
+        with self._lock:
+            for unit, amount in units.items():
+                self._done[unit] += amount
+        done = self.thread_done()
+        for unit, amount in units.items():
+            done[unit] += amount
+
+    def thread_done(self, reset=False):
+        """
+        the work completed by the current thread, i.e. by the target it runs
+
+        :param bool reset: start counting from zero
+        :return: the amount completed per unit (see :attr:`UNITS`)
+        :rtype: dict
+        """
+        done = getattr(self._local, 'done', None)
+        if done is None or reset:
+            done = self._local.done = dict((unit, 0) for unit in UNITS)
+        return done
+
+    def snapshot(self):
+        """
+        the work planned and done so far
+
+        :return: the snapshot
+        :rtype: :class:`Snapshot`
+        """
+        with self._lock:
+            return Snapshot(dict(self._planned), dict(self._done), time() - self._started)
+
+    @staticmethod
+    def eta(snapshot):
+        """
+        estimate the time left from the observed throughput, in the finest unit with planned work left (bytes,
+        then files, then commands), falling back to the time per completed target
+
+        :param snapshot: the progress snapshot
+        :type snapshot: :class:`Snapshot`
+        :return: the estimated time left (in seconds) or None if nothing can be estimated yet
+        :rtype: float
+        """
+        planned, done, elapsed = snapshot
+        for unit in _FINEST_FIRST:
+            left = planned[unit] - done[unit]
+            if left > 0 and done[unit] > 0 and elapsed > 0:
+                return left / (done[unit] / float(elapsed))
+        return None
+
+    @staticmethod
+    def fraction(snapshot):
+        """
+        the fraction of the work done, in the finest unit with planned work left (bytes, then files, then commands),
+        falling back to the completed targets
+
+        :param snapshot: the progress snapshot
+        :type snapshot: :class:`Snapshot`
+        :return: the fraction (0 to 1)
+        :rtype: float
+        """
+        planned, done, _ = snapshot
+        for unit in _FINEST_FIRST:
+            if planned[unit] > done[unit] or (unit == 'targets' and planned[unit]):
+                return min(1.0, done[unit] / float(planned[unit]))
+        return 0.0
+
+    def render(self, snapshot=None):
+        """
+        the progress line
+
+        :param snapshot: the progress snapshot, defaults to the current one
+        :type snapshot: :class:`Snapshot`
+        :return: the line
+        :rtype: str
+        """
+        from cleanmymac.util import format_size
+        snapshot = snapshot or self.snapshot()
+        planned, done, elapsed = snapshot
+        fraction = self.fraction(snapshot)
+        filled = int(fraction * self._width)
+        info = ['{0}/{1} targets'.format(done['targets'], planned['targets'])]
+        if planned['commands']:
+            info.append('{0}/{1} commands'.format(done['commands'], planned['commands']))
+        if planned['files']:
+            info.append('{0}/{1} files'.format(done['files'], planned['files']))
+        elif done['files']:
+            info.append('{0} files'.format(done['files']))
+        if done['size'] or planned['size']:
+            deleted = format_size(done['size'])
+            if planned['size']:
+                deleted += '/' + format_size(planned['size'])
+            info.append('{0} deleted ({1}/s)'.format(deleted,
+                                                   format_size(int(done['size'] / elapsed) if elapsed else 0)))
+        eta = self.eta(snapshot)
+        if eta is not None and fraction < 1.0:
+            info.append('ETA {0}'.format(_format_eta(eta)))
+        return '{0}  [{1}]  {2}'.format(self.label,
+                                        click.style('#' * filled + '-' * (self._width - filled), fg='blue'),
+                                        click.style(', '.join(info), fg='yellow'))
+
+    def refresh(self):
+        """
+        redraw the progress line (only on terminals)
+        """
+        if not self._stream.isatty():
+            return
+        line = self.render()
+        width = len(click.unstyle(line))
+        click.echo('\r' + line + ' ' * max(0, self._last_width - width), file=self._stream, nl=False)
+        self._stream.flush()
+        self._last_width = width
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(self._interval):
+            self.refresh()
+
+    def start(self):
+        """
+        start the display: draw the progress line and start the timer thread redrawing it
+        """
+        self._started = time()
+        self._stopped.clear()
+        if not self._stream.isatty():
+            click.echo(self.label, file=self._stream)
+            return
+        self.refresh()
+        self._thread = Thread(target=self._refresh_loop, name='progress')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop the timer thread and draw the final progress line
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self.refresh()
+            click.echo('', file=self._stream)
+
+
+@contextmanager
+def track_progress(display, label='', targets=0):
+    """
+    track the progress of a run, the tracker is set as the global progress (see :func:`set_progress`)
+    for the duration of the context
+
+    :param bool display: if True display the progress bar
+    :param str label: the label shown in front of the progress bar
+    :param int targets: the number of targets planned
+    :return: the progress tracker
+    :rtype: :class:`Progress`
+    """
+    progress = Progress(label=label)
+    progress.plan(targets=targets)
+    set_progress(progress)
+    if display:
+        progress.start()
+    try:
+        yield progress
+    finally:
+        if display:
+            progress.stop()
+        set_progress(None)
+
+
+def set_progress(progress):
+    """
+    set the global progress tracker, advanced by the removal functions in :mod:`cleanmymac.util` and by
+    the shell command targets
+
+    :param progress: the progress tracker, None disables tracking
+    :type progress: :class:`Progress`
+    """
+    global _progress
+    _progress = progress
+
+
+def get_progress():
+    """
+    get the global progress tracker
+
+    :return: the progress tracker (or None)
+    :rtype: :class:`Progress`
+    """
+    return _progress
@@ -16,27 +16,45 @@
 # limitations under the License.
 #
 import os
-from tabulate import tabulate
-from yaml import load
+from copy import deepcopy
 from functools import partial
-from pkg_resources import iter_entry_points
-from cleanmymac.util import yaml_files
+from contextlib import contextmanager
+from cleanmymac.util import yaml_files, get_signature
 
 from cleanmymac.builtins import BUILTINS_PATH
 from cleanmymac.log import debug, error
 from cleanmymac.constants import TARGET_ENTRY_POINT, VALID_TARGET_TYPES, TYPE_TARGET_CMD, TYPE_TARGET_DIR, \
-    GLOBAL_CONFIG_FILE
-from cleanmymac.schema import validate_yaml_target
-from cleanmymac.target import Target, YamlShellCommandTarget, YamlDirTarget
+    TYPE_TARGET_FILES, TYPE_TARGET_ARTIFACTS, TYPE_TARGET_CAP, TYPE_TARGET_DEDUPE, GLOBAL_CONFIG_FILE
+from cleanmymac.target import Target, YamlShellCommandTarget, YamlDirTarget, YamlFilesTarget, YamlArtifactsTarget, \
+    YamlCapTarget, YamlDedupeTarget
 
 
 __TARGETS__ = {}
+__YAML_PATHS__ = set()
+__DESCRIPTIONS__ = {}
+__ENTRY_POINTS_LOADED__ = False
 __YAML_TYPES__ = {
     TYPE_TARGET_CMD: YamlShellCommandTarget,
-    TYPE_TARGET_DIR: YamlDirTarget
+    TYPE_TARGET_DIR: YamlDirTarget,
+    TYPE_TARGET_FILES: YamlFilesTarget,
+    TYPE_TARGET_ARTIFACTS: YamlArtifactsTarget,
+    TYPE_TARGET_CAP: YamlCapTarget,
+    TYPE_TARGET_DEDUPE: YamlDedupeTarget
 }
 
 
+def _load_description(yaml_file):
+    # parsed descriptions are cached until the file changes
+    signature = get_signature(yaml_file)
+    cached = __DESCRIPTIONS__.get(yaml_file)
+    if cached is None or cached[0] != signature:
+        from yaml import load
+        debug('loading : %s', yaml_file)
+        with open(yaml_file, 'r+') as DESC:
+            cached = __DESCRIPTIONS__[yaml_file] = (signature, load(DESC))
+    return deepcopy(cached[1])
+
+
 def load_target(yaml_file, config, update=False, verbose=False, strict=True):
     """
     load a target given its description from a **YAML** file.
@@ -49,34 +67,34 @@ def load_target(yaml_file, config, update=False, verbose=False, strict=True):
     :return: the target
     :rtype: :class:`cleanmymac.target.Target`
     """
-    with open(yaml_file, 'r+') as DESC:
-        try:
-            description = load(DESC)
-            description = validate_yaml_target(description, strict=strict)
-            _type = description['type']
-            if _type not in VALID_TARGET_TYPES:
-                error('unknown yaml target type: "{0}", valid options are: {1}'.format(
-                        _type, VALID_TARGET_TYPES
-                ))
-                return None
-
-            target_class = __YAML_TYPES__[_type]
-            if not issubclass(target_class, Target):
-                error('expected a subclass of Target for "{0}", instead got: "{1}"'.format(
-                        os.path.basename(yaml_file), target_class
-                ))
-                return None
-
-            if not config:
-                config = {}
-            config['spec'] = description['spec']
-            return target_class(config, update=update, verbose=verbose)
-        except Exception as e:
-            error('Error loading configuration: "{0}". Reason: {1}'.format(yaml_file, e))
-            if strict:
-                raise e
+    from cleanmymac.schema import validate_yaml_target
+    try:
+        description = _load_description(yaml_file)
+        description = validate_yaml_target(description, strict=strict)
+        _type = description['type']
+        if _type not in VALID_TARGET_TYPES:
+            error('unknown yaml target type: "{0}", valid options are: {1}'.format(
+                    _type, VALID_TARGET_TYPES
+            ))
+            return None
+
+        target_class = __YAML_TYPES__[_type]
+        if not issubclass(target_class, Target):
+            error('expected a subclass of Target for "{0}", instead got: "{1}"'.format(
+                    os.path.basename(yaml_file), target_class
+            ))
             return None
 
+        if not config:
+            config = {}
+        config['spec'] = description['spec']
+        return target_class(config, update=update, verbose=verbose)
+    except Exception as e:
+        error('Error loading configuration: "{0}". Reason: {1}'.format(yaml_file, e))
+        if strict:
+            raise e
+        return None
+
 
 def register_target(name, target):
     """
@@ -87,8 +105,9 @@ def register_target(name, target):
     :type target: :class:`cleanmymac.target.Target`
     """
     global __TARGETS__
+    _register_installed_targets()
     if issubclass(target, Target):
-        debug('registering : {0}'.format(name))
+        debug('registering : %s', name)
         __TARGETS__[name] = target
     else:
         error('target {0} is not of type Target, instead got: {1}'.format(name, target))
@@ -101,14 +120,54 @@ def register_yaml_targets(path):
 
     :param str path: a valid directory
     """
+    _register_installed_targets()
+    _register_yaml_targets(path)
+
+
+def _register_yaml_targets(path):
     global __TARGETS__
+    __YAML_PATHS__.add(path)
     for name, yaml_file in yaml_files(path):
         if os.path.basename(yaml_file) == GLOBAL_CONFIG_FILE:
             continue
-        debug('registering : {0}'.format(name))
+        debug('registering : %s', name)
         __TARGETS__[name] = partial(load_target, yaml_file)
 
 
+def refresh_yaml_targets():
+    """
+    rescan all the paths registered with :func:`register_yaml_targets`: targets whose **YAML** file is gone
+    are unregistered and new files are registered. Changed files are reloaded when their target is loaded.
+    """
+    global __TARGETS__
+    for name, target in list(__TARGETS__.items()):
+        if isinstance(target, partial) and target.func is load_target and not os.path.exists(target.args[0]):
+            debug('unregistering : %s', name)
+            del __TARGETS__[name]
+            __DESCRIPTIONS__.pop(target.args[0], None)
+    for path in list(__YAML_PATHS__):
+        if os.path.isdir(path):
+            _register_yaml_targets(path)
+
+
+@contextmanager
+def scoped_registry():
+    """
+    a context manager restoring the registry when leaving the block: the targets registered within it (i.e., the
+    extra targets of a run served by :mod:`cleanmymac.server`) and their **YAML** paths are unregistered
+    """
+    global __ENTRY_POINTS_LOADED__
+    targets, yaml_paths, entry_points_loaded = dict(__TARGETS__), set(__YAML_PATHS__), __ENTRY_POINTS_LOADED__
+    try:
+        yield
+    finally:
+        __TARGETS__.clear()
+        __TARGETS__.update(targets)
+        __YAML_PATHS__.clear()
+        __YAML_PATHS__.update(yaml_paths)
+        __ENTRY_POINTS_LOADED__ = entry_points_loaded
+
+
 def get_target(name):
     """
     get a registered target
@@ -118,6 +177,7 @@ def get_target(name):
     :rtype: :class:`cleanmymac.target.Target`
     """
     global __TARGETS__
+    _register_installed_targets()
     try:
         return __TARGETS__[name]
     except KeyError:
@@ -132,11 +192,13 @@ def iter_targets():
     :return: pairs of (name: target)
     """
     global __TARGETS__
-    for name, target in __TARGETS__.iteritems():
+    _register_installed_targets()
+    for name, target in __TARGETS__.items():
         yield name, target
 
 
 def get_targets_as_table(simple=True, fancy=False):
+    from tabulate import tabulate
     headers = ['Name', 'Type']
 
     def row(name, target):
@@ -145,16 +207,25 @@ def get_targets_as_table(simple=True, fancy=False):
         data.append(t.__class__.__name__ if simple else t.__class__)
         return data
 
-    return tabulate([row(name, target) for name, target in __TARGETS__.iteritems()],
+    return tabulate([row(name, target) for name, target in iter_targets()],
                     headers=headers, tablefmt='fancy_grid' if fancy else 'orgtbl')
 
 
+def _register_installed_targets():
+    # scanning the entry points is expensive, installed targets are registered on first use
+    global __ENTRY_POINTS_LOADED__
+    if __ENTRY_POINTS_LOADED__:
+        return
+    __ENTRY_POINTS_LOADED__ = True
+    from pkg_resources import iter_entry_points
+    debug("looking for registered cleanup targets...")
+    for ep in iter_entry_points(TARGET_ENTRY_POINT):
+        debug("found: %s", ep)
+        register_target(ep.name, ep.load())
+
+
 # register built in targets
 # 1 YAML based ones
-register_yaml_targets(BUILTINS_PATH)
+_register_yaml_targets(BUILTINS_PATH)
 
-# register installed targets (if any)
-debug("looking for registered cleanup targets...")
-for ep in iter_entry_points(TARGET_ENTRY_POINT):
-    debug("found: {0}".format(ep))
-    register_target(ep.name, ep.load())
+# 2 installed targets (if any) are registered on first use, see _register_installed_targets
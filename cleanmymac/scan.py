@@ -0,0 +1,687 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import io
+import os
+import re
+import stat
+import heapq
+import hashlib
+import fnmatch
+from time import time
+from array import array
+from collections import namedtuple, defaultdict
+
+from cleanmymac.log import debug
+from cleanmymac.util import scandir, parse_duration, parse_size, is_on_device, disk_size
+from cleanmymac.constants import ARTIFACT_NAMES, ARTIFACTS_WORKERS, VALID_CAP_ORDERS, DEDUPE_MIN_SIZE, \
+    DEDUPE_EDGE_SIZE, DEDUPE_READ_SIZE, DEDUPE_WORKERS, DEDUPE_HASH
+
+#: a :func:`collections.namedtuple` holding a file matched by a :class:`FileScanner`
+FileMatch = namedtuple('FileMatch', ['path', 'size', 'mtime'])
+
+#: a :func:`collections.namedtuple` holding a build artifact directory found by an :class:`ArtifactFinder` and
+#: the modification time of the most recently modified project file next to it
+Artifact = namedtuple('Artifact', ['path', 'project_mtime'])
+
+#: a :func:`collections.namedtuple` holding a file considered by a :class:`DuplicateFinder`: its path, size,
+#: modification time, device and inode
+FileRecord = namedtuple('FileRecord', ['path', 'size', 'mtime', 'device', 'inode'])
+
+#: a :func:`collections.namedtuple` holding a file rule: a glob pattern (on file names), a minimum age
+#: (in seconds) and a minimum size (in bytes). Either of `older_than` and `min_size` can be None
+FileRule = namedtuple('FileRule', ['glob', 'older_than', 'min_size'])
+
+
+def file_rule(glob, older_than=None, min_size=None):
+    """
+    create a :class:`FileRule`, parsing durations (i.e., '7d') and sizes (i.e., '1 GB') if needed
+
+    :param str glob: the file name glob pattern
+    :param older_than: the minimum age
+    :type older_than: int or str
+    :param min_size: the minimum size
+    :type min_size: int or str
+    :return: the rule
+    :rtype: FileRule
+    """
+    return FileRule(glob,
+                    parse_duration(older_than) if older_than is not None else None,
+                    parse_size(min_size) if min_size is not None else None)
+
+
+def compile_globs(globs):
+    """
+    compile a list of glob patterns into a single matcher
+
+    :param list globs: the glob patterns
+    :return: a function returning a match object if a name matches any of the patterns, None otherwise
+    :rtype: callable
+    """
+    patterns = []
+    for glob in globs:
+        pattern = fnmatch.translate(glob)
+        # python 2 appends the flags to the pattern, they must be global when combining patterns
+        if pattern.endswith('(?ms)'):
+            pattern = pattern[:-len('(?ms)')]
+        patterns.append('(?:{0})'.format(pattern))
+    return re.compile('|'.join(patterns), re.S).match
+
+
+class ScanRequest(object):
+    """
+    a request to traverse a directory tree on behalf of a target, see :func:`walk`. The results of `match`
+    are collected in :attr:`matches` by :func:`scan_coalesced`, :attr:`scanned` is set once the `root`
+    directory has been read (and :attr:`device` to its device).
+
+    :param str root: the root directory
+    :param callable match: called with every entry (:class:`os.DirEntry`) under `root`, returns a result or None
+    :param callable prune: called with every directory entry, returns True if the directory is not to be
+        descended into
+    :param int max_depth: the maximum depth to descend to (0 means only the entries of `root`), unlimited if None
+    :param bool one_file_system: if True directories on another device than `root` (mount points) are not
+        descended into
+    """
+    __slots__ = ('root', 'match', 'prune', 'max_depth', 'one_file_system', 'matches', 'scanned', 'device')
+
+    def __init__(self, root, match, prune=None, max_depth=None, one_file_system=True):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.match = match
+        self.prune = prune
+        self.max_depth = max_depth
+        self.one_file_system = one_file_system
+        self.matches = []
+        self.scanned = False
+        self.device = None
+
+    def __repr__(self):
+        return 'ScanRequest({0!r})'.format(self.root)
+
+
+def _path_trie(requests):
+    # a trie node is a pair of: children by name, requests rooted at the node
+    trie = ({}, [])
+    for request in requests:
+        node = trie
+        for part in request.root.split(os.sep):
+            if part:
+                node = node[0].setdefault(part, ({}, []))
+        node[1].append(request)
+    return trie
+
+
+def walk(requests):
+    """
+    traverse the directory trees of all requests together: the request roots are merged into a path trie
+    and every directory is read once, no matter how many requests (overlapping roots) it falls under.
+    Each entry is dispatched to the `match` function of every interested request. Requests do not cross
+    into other devices (see :attr:`ScanRequest.one_file_system`), the roots of other requests always are.
+
+    :param list requests: the scan requests
+    :type requests: list of :class:`ScanRequest`
+    :return: a generator of (request, result) pairs
+    """
+    stack = []
+    pending = [(os.sep, _path_trie(requests))]
+    while pending:
+        path, node = pending.pop()
+        if node[1]:
+            stack.append((path, node, [(request, 0) for request in node[1]]))
+        else:
+            pending.extend((os.path.join(path, name), child) for name, child in node[0].items())
+
+    while stack:
+        folder, node, active = stack.pop()
+        try:
+            entries = scandir(folder)
+        except OSError as e:
+            debug('cannot scan "%s". Reason: %s', folder, e)
+            continue
+        children = node[0] if node is not None else {}
+        for request in (node[1] if node is not None else []):
+            request.scanned = True
+            if request.one_file_system:
+                try:
+                    request.device = os.stat(folder).st_dev
+                except OSError:
+                    request.device = None
+
+        for entry in entries:
+            for request, depth in active:
+                result = request.match(entry)
+                if result is not None:
+                    yield request, result
+
+            child = children.get(entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                child_active = [(request, depth + 1) for request, depth in active
+                                if (request.max_depth is None or depth < request.max_depth) and
+                                not (request.prune is not None and request.prune(entry)) and
+                                is_on_device(entry, request.device)]
+            else:
+                child_active = []
+                if child is None or not entry.is_dir():
+                    continue
+            # the roots of other requests nested in this directory
+            if child is not None:
+                child_active.extend((request, 0) for request in child[1])
+            if child_active or (child is not None and child[0]):
+                stack.append((entry.path, child, child_active))
+
+
+def scan_coalesced(requests):
+    """
+    run all scan requests in a single traversal (see :func:`walk`), the results are collected in the
+    :attr:`ScanRequest.matches` of each request
+
+    :param list requests: the scan requests
+    :type requests: list of :class:`ScanRequest`
+    :return: the requests
+    :rtype: list
+    """
+    for request in requests:
+        request.matches = []
+        request.scanned = False
+    for request, result in walk(requests):
+        request.matches.append(result)
+    return requests
+
+
+def unique_roots(roots):
+    """
+    remove duplicate roots and roots nested in other roots
+
+    :param list roots: the root directories
+    :return: the expanded top most roots
+    :rtype: list
+    """
+    roots = sorted(set(os.path.abspath(os.path.expanduser(root)) for root in roots))
+    unique = []
+    for root in roots:
+        if not any(root == parent or root.startswith(os.path.join(parent, '')) for parent in unique):
+            unique.append(root)
+    return unique
+
+
+class FileScanner(object):
+    """
+    evaluates a set of :class:`FileRule` in a single traversal. The globs of all rules are compiled into
+    a single matcher, rules are only evaluated for names matching any of them. Directories whose name
+    matches one of the `exclude` globs are not descended into. Only regular files are matched and symbolic
+    links are never followed.
+
+    :param list rules: the rules
+    :param list exclude: glob patterns of directory names to prune
+    :param float now: the reference time for file ages (defaults to the current time)
+    :param bool one_file_system: if True mount points under the roots are not traversed
+    """
+    def __init__(self, rules, exclude=None, now=None, one_file_system=True):
+        self._rules = [(compile_globs([rule.glob]), rule) for rule in rules]
+        self._match_any = compile_globs([rule.glob for rule in rules]) if rules else None
+        self._exclude = compile_globs(exclude) if exclude else None
+        self._now = now if now is not None else time()
+        self._one_file_system = one_file_system
+
+    def prune(self, entry):
+        """
+        test if a directory is to be pruned
+
+        :param entry: the directory entry
+        :type entry: :class:`os.DirEntry`
+        :return: True if the directory is not to be traversed
+        :rtype: bool
+        """
+        return self._exclude is not None and self._exclude(entry.name) is not None
+
+    def match(self, entry):
+        """
+        evaluate the rules for a file
+
+        :param entry: the directory entry
+        :type entry: :class:`os.DirEntry`
+        :return: the match or None
+        :rtype: FileMatch
+        """
+        if self._match_any is None or self._match_any(entry.name) is None or entry.is_dir(follow_symlinks=False):
+            return None
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        age = self._now - st.st_mtime
+        for matcher, rule in self._rules:
+            if rule.older_than is not None and age < rule.older_than:
+                continue
+            if rule.min_size is not None and st.st_size < rule.min_size:
+                continue
+            if len(self._rules) > 1 and matcher(entry.name) is None:
+                continue
+            return FileMatch(entry.path, st.st_size, st.st_mtime)
+        return None
+
+    def requests(self, roots):
+        """
+        the scan requests for the given roots, roots nested in other roots are dropped
+
+        :param list roots: the root directories
+        :return: the scan requests
+        :rtype: list of :class:`ScanRequest`
+        """
+        return [ScanRequest(root, self.match, prune=self.prune, one_file_system=self._one_file_system)
+                for root in unique_roots(roots)]
+
+    def scan(self, roots):
+        """
+        traverse the roots once, overlapping roots are traversed only once
+
+        :param list roots: the root directories
+        :return: a generator of matches
+        """
+        for _, match in walk(self.requests(roots)):
+            yield match
+
+
+class ArtifactFinder(object):
+    """
+    finds build artifact directories (i.e., `node_modules`, `.tox`) under a set of workspace roots. Artifact
+    directories are leafs: they are never descended into. The entries next to an artifact (the project files)
+    tell how recently the project was worked on, see :attr:`Artifact.project_mtime`.
+    The workspaces (the subdirectories of each root) are searched in parallel on a thread pool, every directory
+    is read once and symbolic links are never followed.
+
+    :param list names: the artifact directory names
+    :param list exclude: glob patterns of directory names to prune
+    :param int workers: the number of threads
+    :param bool one_file_system: if True mount points under the roots are neither searched nor reported
+    """
+    def __init__(self, names=None, exclude=None, workers=ARTIFACTS_WORKERS, one_file_system=True):
+        self._names = frozenset(names if names is not None else ARTIFACT_NAMES)
+        self._exclude = compile_globs(exclude) if exclude else None
+        self._workers = max(1, workers)
+        self._one_file_system = one_file_system
+
+    def prune(self, entry):
+        """
+        test if a directory is to be pruned, artifacts are always pruned
+
+        :param entry: the directory entry
+        :type entry: :class:`os.DirEntry`
+        :return: True if the directory is not to be traversed
+        :rtype: bool
+        """
+        return entry.name in self._names or (self._exclude is not None and self._exclude(entry.name) is not None)
+
+    def _artifacts(self, entries, device):
+        artifacts = [entry for entry in entries if entry.name in self._names and entry.is_dir(follow_symlinks=False)
+                     and is_on_device(entry, device)]
+        if not artifacts:
+            return []
+        # only the folders holding artifacts pay for the stat calls
+        project_mtime = None
+        for entry in entries:
+            if entry.name in self._names:
+                continue
+            try:
+                mtime = entry.stat(follow_symlinks=False).st_mtime
+            except OSError:
+                continue
+            project_mtime = mtime if project_mtime is None else max(project_mtime, mtime)
+
+        found = []
+        for entry in artifacts:
+            mtime = project_mtime
+            if mtime is None:
+                try:
+                    mtime = entry.stat(follow_symlinks=False).st_mtime
+                except OSError:
+                    continue
+            found.append(Artifact(entry.path, mtime))
+        return found
+
+    def _subdirs(self, entries, device):
+        return [entry.path for entry in entries if entry.is_dir(follow_symlinks=False) and not self.prune(entry)
+                and is_on_device(entry, device)]
+
+    def _search(self, workspace):
+        workspace, device = workspace
+        found = []
+        stack = [workspace]
+        while stack:
+            folder = stack.pop()
+            try:
+                entries = list(scandir(folder))
+            except OSError as e:
+                debug('cannot scan "%s". Reason: %s', folder, e)
+                continue
+            found.extend(self._artifacts(entries, device))
+            stack.extend(self._subdirs(entries, device))
+        return found
+
+    def find(self, roots):
+        """
+        search the roots, overlapping roots are searched only once
+
+        :param list roots: the workspace root directories
+        :return: a generator of artifacts (in no particular order)
+        """
+        workspaces = []
+        for root in unique_roots(roots):
+            try:
+                entries = list(scandir(root))
+                device = os.stat(root).st_dev if self._one_file_system else None
+            except OSError as e:
+                debug('cannot scan "%s". Reason: %s', root, e)
+                continue
+            for artifact in self._artifacts(entries, device):
+                yield artifact
+            workspaces.extend((workspace, device) for workspace in self._subdirs(entries, device))
+        if not workspaces:
+            return
+
+        from multiprocessing.pool import ThreadPool
+        debug('searching %s workspaces for artifacts', len(workspaces))
+        pool = ThreadPool(min(self._workers, len(workspaces)))
+        try:
+            for artifacts in pool.imap_unordered(self._search, workspaces):
+                for artifact in artifacts:
+                    yield artifact
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+class CacheIndex(object):
+    """
+    a compact index of the regular files under a cache directory, filled by a single traversal (see
+    :meth:`request`). Every file is a record of its size (disk usage), time (last access or modification) and
+    path id, kept in parallel arrays: the directories are stored once and shared by the files in them. Symbolic
+    links are never followed.
+
+    :param str order_by: the file time evictions are ordered by: *atime* (last access) or *mtime* (last
+        modification), see :attr:`cleanmymac.constants.VALID_CAP_ORDERS`
+    :param bool one_file_system: if True mount points under the cache directory are not traversed
+    """
+    def __init__(self, order_by='atime', one_file_system=True):
+        if order_by not in VALID_CAP_ORDERS:
+            raise ValueError('invalid order_by: "{0}", valid options are: {1}'.format(order_by,
+                                                                                     sorted(VALID_CAP_ORDERS)))
+        self._time_field = 'st_' + order_by
+        self._one_file_system = one_file_system
+        self.dirs = []
+        self.parents = array('l')
+        self.names = []
+        self.sizes = array('l')
+        self.times = array('d')
+        self.total = 0
+        # the directory (path, id) of the last file added, files are added directory by directory
+        self._folder = (None, None)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, entry):
+        """
+        index a file, directories and other non regular files are ignored
+
+        :param entry: the directory entry
+        :type entry: :class:`os.DirEntry`
+        :return: None (used as the `match` function of a :class:`ScanRequest`, nothing is collected)
+        """
+        if entry.is_dir(follow_symlinks=False):
+            return None
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        folder = entry.path[:-len(entry.name)]
+        if folder != self._folder[0]:
+            self._folder = (folder, len(self.dirs))
+            self.dirs.append(folder)
+        size = disk_size(st)
+        self.parents.append(self._folder[1])
+        self.names.append(entry.name)
+        self.sizes.append(size)
+        self.times.append(getattr(st, self._time_field))
+        self.total += size
+        return None
+
+    def path(self, file_id):
+        """
+        the path of an indexed file
+
+        :param int file_id: the file id (its position in the index)
+        :return: the path
+        :rtype: str
+        """
+        return self.dirs[self.parents[file_id]] + self.names[file_id]
+
+    def request(self, root):
+        """
+        the scan request indexing the files under `root`, see :func:`scan_coalesced`
+
+        :param str root: the cache directory
+        :return: the scan request
+        :rtype: :class:`ScanRequest`
+        """
+        return ScanRequest(root, self.add, one_file_system=self._one_file_system)
+
+    def evictions(self, budget):
+        """
+        the files to evict to get the total size within `budget`: the oldest first and just enough of them.
+        The heap of all files is built in linear time and only the evicted files are popped off it, the files
+        are never fully sorted.
+
+        :param int budget: the size budget (in bytes)
+        :return: the ids of the files to evict, oldest first
+        :rtype: list
+        """
+        excess = self.total - budget
+        if excess <= 0:
+            return []
+        heap = list(zip(self.times, range(len(self.names))))
+        heapq.heapify(heap)
+        evicted = []
+        while excess > 0 and heap:
+            _, file_id = heapq.heappop(heap)
+            evicted.append(file_id)
+            excess -= self.sizes[file_id]
+        return evicted
+
+
+def edge_hash(path, size, edge=DEDUPE_EDGE_SIZE):
+    """
+    hash the first and last `edge` bytes of a file, the whole file if it is not larger than that
+
+    :param str path: the file
+    :param int size: the file size
+    :param int edge: the number of bytes hashed at each end
+    :return: the digest
+    :rtype: bytes
+    """
+    digest = hashlib.new(DEDUPE_HASH)
+    with io.open(path, 'rb') as a_file:
+        if size <= 2 * edge:
+            digest.update(a_file.read())
+        else:
+            digest.update(a_file.read(edge))
+            a_file.seek(-edge, os.SEEK_END)
+            digest.update(a_file.read(edge))
+    return digest.digest()
+
+
+def full_hash(path, read_size=DEDUPE_READ_SIZE):
+    """
+    hash a whole file, read unbuffered in large blocks into a single reused buffer
+
+    :param str path: the file
+    :param int read_size: the read size (in bytes)
+    :return: the digest
+    :rtype: bytes
+    """
+    digest = hashlib.new(DEDUPE_HASH)
+    buf = bytearray(read_size)
+    view = memoryview(buf)
+    with io.open(path, 'rb', buffering=0) as a_file:
+        while True:
+            count = a_file.readinto(buf)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.digest()
+
+
+def _hash_worker(args):
+    # runs in the hashing processes (or threads): failures are reported, not raised
+    kind, record, size = args
+    try:
+        if kind == 'edge':
+            return record, edge_hash(record.path, record.size, edge=size)
+        return record, full_hash(record.path, read_size=size)
+    except (IOError, OSError) as e:
+        return record, e
+
+
+class DuplicateFinder(object):
+    """
+    finds duplicate files in stages, every stage reads more of fewer files so most of the data is never read:
+
+    1. the files are grouped by size, straight from the traversal, files of a unique size are dropped
+    2. the remaining files are grouped by the hash of their first and last `edge` bytes (on a thread pool,
+       a few small reads per file)
+    3. the remaining candidates larger than two edges are fully hashed on a process pool
+
+    Only regular files of at least `min_size` bytes are considered, symbolic links are never followed and
+    hard links to the same file count once.
+
+    :param int min_size: the minimum file size
+    :param list exclude: glob patterns of directory names to prune
+    :param int workers: the number of hashing processes (and threads), hashing runs in process if 1
+    :param bool one_file_system: if True mount points under the roots are not traversed
+    :param int edge: the number of bytes hashed at both ends of a file (stage 2)
+    :param int read_size: the read size when fully hashing files (stage 3)
+    """
+    def __init__(self, min_size=DEDUPE_MIN_SIZE, exclude=None, workers=DEDUPE_WORKERS, one_file_system=True,
+                 edge=DEDUPE_EDGE_SIZE, read_size=DEDUPE_READ_SIZE):
+        self._min_size = max(1, min_size)
+        self._exclude = compile_globs(exclude) if exclude else None
+        self._workers = max(1, workers)
+        self._one_file_system = one_file_system
+        self._edge = edge
+        self._read_size = read_size
+
+    def prune(self, entry):
+        """
+        test if a directory is to be pruned
+
+        :param entry: the directory entry
+        :type entry: :class:`os.DirEntry`
+        :return: True if the directory is not to be traversed
+        :rtype: bool
+        """
+        return self._exclude is not None and self._exclude(entry.name) is not None
+
+    def match(self, entry):
+        """
+        record a regular file of at least `min_size` bytes
+
+        :param entry: the directory entry
+        :type entry: :class:`os.DirEntry`
+        :return: the file record or None
+        :rtype: :class:`FileRecord`
+        """
+        if entry.is_dir(follow_symlinks=False):
+            return None
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode) or st.st_size < self._min_size:
+            return None
+        return FileRecord(entry.path, st.st_size, st.st_mtime, st.st_dev, st.st_ino)
+
+    def requests(self, roots):
+        """
+        the scan requests for the given roots, roots nested in other roots are dropped
+
+        :param list roots: the root directories
+        :return: the scan requests
+        :rtype: list of :class:`ScanRequest`
+        """
+        return [ScanRequest(root, self.match, prune=self.prune, one_file_system=self._one_file_system)
+                for root in unique_roots(roots)]
+
+    def _hash(self, pool_class, kind, size, groups):
+        # regroup the records of every group by their hash
+        jobs = [(kind, record, size) for group in groups for record in group]
+        if not jobs:
+            return []
+        debug('%s hashing %s files', kind, len(jobs))
+        if self._workers > 1 and len(jobs) > 1:
+            pool = pool_class(min(self._workers, len(jobs)))
+            chunksize = max(1, len(jobs) // (4 * self._workers))
+            try:
+                results = list(pool.imap_unordered(_hash_worker, jobs, chunksize=chunksize))
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            results = [_hash_worker(job) for job in jobs]
+        regrouped = defaultdict(list)
+        for record, digest in results:
+            if isinstance(digest, Exception):
+                debug('cannot hash "%s". Reason: %s', record.path, digest)
+                continue
+            regrouped[record.size, digest].append(record)
+        return [group for group in regrouped.values() if len(group) > 1]
+
+    def duplicates(self, records):
+        """
+        group identical files
+
+        :param iterable records: the file records (see :meth:`match`)
+        :return: the groups of identical files (at least two files each)
+        :rtype: list of lists of :class:`FileRecord`
+        """
+        from multiprocessing import Pool
+        from multiprocessing.pool import ThreadPool
+        by_size, inodes = defaultdict(list), set()
+        for record in records:
+            if (record.device, record.inode) in inodes:
+                continue
+            inodes.add((record.device, record.inode))
+            by_size[record.size].append(record)
+        candidates = [group for group in by_size.values() if len(group) > 1]
+        candidates = self._hash(ThreadPool, 'edge', self._edge, candidates)
+        # files not larger than two edges were hashed whole
+        duplicates = [group for group in candidates if group[0].size <= 2 * self._edge]
+        duplicates.extend(self._hash(Pool, 'full', self._read_size,
+                                     [group for group in candidates if group[0].size > 2 * self._edge]))
+        return duplicates
+
+    def find(self, roots):
+        """
+        traverse the roots once and group identical files, see :meth:`duplicates`
+
+        :param list roots: the root directories
+        :return: the groups of identical files
+        :rtype: list of lists of :class:`FileRecord`
+        """
+        return self.duplicates(match for _, match in walk(self.requests(roots)))
@@ -0,0 +1,179 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+from threading import Thread
+from collections import defaultdict
+
+from six.moves.queue import Queue, Empty
+
+from cleanmymac.log import debug
+from cleanmymac.constants import SCHEDULE_PER_DEVICE, SCHEDULE_COMMANDS, SCHEDULE_CPU, RESOURCE_NETWORK, RESOURCE_CPU
+
+#: the resource used by network bound targets and targets without directories (i.e., *cmd* targets)
+RESOURCE_COMMANDS = 'commands'
+
+
+def physical_device(dev):
+    """
+    the physical device holding a file system: on Linux partitions map to their disk (through **sysfs**),
+    elsewhere the file system device itself is returned
+
+    :param int dev: the file system device (**st_dev**)
+    :return: the device identifier
+    :rtype: str
+    """
+    sysfs = '/sys/dev/block/{0}:{1}'.format(os.major(dev), os.minor(dev))
+    if os.path.exists(sysfs):
+        block = os.path.realpath(sysfs)
+        if os.path.exists(os.path.join(block, 'partition')):
+            block = os.path.dirname(block)
+        return os.path.basename(block)
+    return 'dev:{0}'.format(dev)
+
+
+def target_resources(target):
+    """
+    the resources a target keeps busy while running: the physical devices of the directories it scans
+    (see :meth:`cleanmymac.target.Target.scan_roots`), :data:`RESOURCE_COMMANDS` for network bound targets and
+    targets without directories, :data:`cleanmymac.constants.RESOURCE_CPU` for CPU bound targets (see
+    :attr:`cleanmymac.target.Target.resource_class`)
+
+    :param target: the target
+    :type target: :class:`cleanmymac.target.Target`
+    :return: the sorted resources (none for targets that failed to load)
+    :rtype: list
+    """
+    if target is None or isinstance(target, Exception):
+        return []
+    roots = target.scan_roots() if hasattr(target, 'scan_roots') else []
+    resources = set()
+    for root in roots:
+        try:
+            resources.add(physical_device(os.stat(root).st_dev))
+        except OSError:
+            continue
+    resource_class = getattr(target, 'resource_class', None)
+    if resource_class == RESOURCE_CPU:
+        resources.add(RESOURCE_CPU)
+    elif resource_class == RESOURCE_NETWORK or not roots:
+        resources.add(RESOURCE_COMMANDS)
+    return sorted(resources)
+
+
+def is_parallel_safe(target):
+    """
+    whether a target can run concurrently with other targets (see :attr:`cleanmymac.target.Target.parallel_safe`)
+
+    :param target: the target
+    :type target: :class:`cleanmymac.target.Target`
+    :return: True unless the target says otherwise
+    :rtype: bool
+    """
+    if target is None or isinstance(target, Exception):
+        return True
+    return getattr(target, 'parallel_safe', True)
+
+
+class Scheduler(object):
+    """
+    runs targets concurrently while limiting the load on every device: at most `per_device` targets use
+    the same physical device at a time, at most `commands` network bound targets (or targets without directories)
+    run at a time, at most `cpu` CPU bound targets run at a time and at most `jobs` targets run in total.
+    A target waiting for a busy device does not hold back targets on other devices. Targets that are not
+    parallel safe (see :func:`is_parallel_safe`) run alone, in their turn.
+
+    :param int jobs: the maximum number of targets running concurrently
+    :param int per_device: the maximum number of targets running concurrently on a device
+    :param int commands: the maximum number of network bound targets running concurrently
+    :param int cpu: the maximum number of CPU bound targets running concurrently
+    """
+    def __init__(self, jobs, per_device=SCHEDULE_PER_DEVICE, commands=SCHEDULE_COMMANDS, cpu=SCHEDULE_CPU):
+        self._jobs = max(1, jobs)
+        self._per_device = max(1, per_device)
+        self._commands = max(1, commands)
+        self._cpu = max(1, cpu)
+
+    def _limit(self, resource):
+        if resource == RESOURCE_COMMANDS:
+            return self._commands
+        if resource == RESOURCE_CPU:
+            return self._cpu
+        return self._per_device
+
+    @staticmethod
+    def _worker(func, name, target, done):
+        try:
+            done.put((name, func(name, target), None))
+        except BaseException as e:
+            done.put((name, None, e))
+
+    def run(self, func, targets, stop=None):
+        """
+        run `func` for every target, targets are started in order as soon as their resources are available
+
+        :param callable func: called with the name and the target, in a new thread
+        :param list targets: (name, target) pairs
+        :param callable stop: called after each completed target, no new targets are started once it returns True
+        :return: a generator of (name, result) pairs, in the order of completion
+        """
+        pending = [(name, target, target_resources(target), is_parallel_safe(target)) for name, target in targets]
+        busy = defaultdict(int)
+        running = {}
+        exclusive = None
+        done = Queue()
+        stopped = False
+        while pending or running:
+            for item in list(pending):
+                if stopped or exclusive is not None or len(running) >= self._jobs:
+                    break
+                name, target, resources, parallel_safe = item
+                if not parallel_safe:
+                    # targets after it wait until it ran alone
+                    if running:
+                        break
+                    exclusive = name
+                elif any(busy[resource] >= self._limit(resource) for resource in resources):
+                    continue
+                pending.remove(item)
+                for resource in resources:
+                    busy[resource] += 1
+                debug('starting %s on %s', name, resources)
+                running[name] = resources
+                thread = Thread(target=self._worker, args=(func, name, target, done), name='target-' + name)
+                thread.daemon = True
+                thread.start()
+            if stopped:
+                pending = []
+            if not running:
+                break
+
+            while True:
+                try:
+                    name, result, e = done.get(timeout=1.0)
+                    break
+                except Empty:
+                    continue
+            for resource in running.pop(name):
+                busy[resource] -= 1
+            if name == exclusive:
+                exclusive = None
+            if e is not None:
+                raise e
+            yield name, result
+            if stop is not None and stop():
+                stopped = True
@@ -17,10 +17,14 @@
 #
 import os
 
-from voluptuous import Schema, Required, All, Optional, ALLOW_EXTRA, Any, IsDir, In, Or, message, DirInvalid, truth
+from voluptuous import Schema, Required, All, Optional, ALLOW_EXTRA, Any, IsDir, In, Or, message, DirInvalid, truth, \
+    Invalid, Length, Range
 
 from cleanmymac.log import error
-from cleanmymac.constants import VALID_TARGET_TYPES
+from cleanmymac.util import parse_size, parse_duration
+from cleanmymac.gentle import IO_CLASSES
+from cleanmymac.constants import VALID_TARGET_TYPES, VALID_CAP_ORDERS, VALID_DEDUPE_ACTIONS, VALID_DEDUPE_KEEP, \
+    VALID_DIR_ACTIONS, ARCHIVE_COMPRESSORS
 
 
 @message('not a directory', cls=DirInvalid)
@@ -34,28 +38,132 @@ def IsDirUserExpand(v):
     return os.path.isdir(os.path.expanduser(v))
 
 
+def Size(msg=None):
+    """Parse a size given in bytes or with a unit (i.e., '500 MB'), see :func:`cleanmymac.util.parse_size`.
+
+    >>> Size()('1 KB')
+    1024
+    """
+    def f(v):
+        try:
+            return parse_size(v)
+        except ValueError:
+            raise Invalid(msg or 'expected a size, i.e. 500 MB')
+    return f
+
+
+def Duration(msg=None):
+    """Parse a duration given in seconds or with a unit (i.e., '7d'), see :func:`cleanmymac.util.parse_duration`.
+
+    >>> Duration()('1m')
+    60.0
+    """
+    def f(v):
+        try:
+            return parse_duration(v)
+        except ValueError:
+            raise Invalid(msg or 'expected a duration, i.e. 7d')
+    return f
+
+
+def ArchiveDir(msg=None):
+    """Verify a *dir* entry archiving its folders (`action: archive`) has an `archive_dir`.
+
+    >>> ArchiveDir()({'dir': '~', 'action': 'archive', 'archive_dir': '~/Archives'})['archive_dir']
+    '~/Archives'
+    """
+    def f(v):
+        if v.get('action') == 'archive' and 'archive_dir' not in v:
+            raise Invalid(msg or 'archive_dir is required with action: archive')
+        return v
+    return f
+
+
 def _cmd_spec_schema(strict=True):
     return Schema({
         Required('update_commands', default=[]): All(list),
         Required('clean_commands'): All(list),
+        Optional('session'): bool
     })
 
 
 def _dir_spec_schema(strict=True):
     return Schema({
         Optional('update_message'): str,
-        Required('entries'): [
+        Optional('min_size'): Size(),
+        Required('entries'): [All(
             {
                 Required('dir'): IsDirUserExpand() if strict else str,
-                Optional('pattern'): str
+                Optional('pattern'): str,
+                Optional('min_size'): Size(),
+                Optional('one_file_system'): bool,
+                Optional('action'): In(VALID_DIR_ACTIONS),
+                Optional('archive_dir'): str,
+                Optional('compression'): In(frozenset(ARCHIVE_COMPRESSORS))
+            },
+            ArchiveDir()
+        )]
+    })
+
+
+def _files_spec_schema(strict=True):
+    return Schema({
+        Optional('update_message'): str,
+        Required('roots'): All([IsDirUserExpand() if strict else str], Length(min=1)),
+        Optional('exclude'): [str],
+        Optional('one_file_system'): bool,
+        Required('rules'): All([
+            {
+                Required('glob'): str,
+                Optional('older_than'): Duration(),
+                Optional('min_size'): Size()
             }
-        ]
+        ], Length(min=1))
+    })
+
+
+def _artifacts_spec_schema(strict=True):
+    return Schema({
+        Optional('update_message'): str,
+        Required('roots'): All([IsDirUserExpand() if strict else str], Length(min=1)),
+        Optional('names'): All([str], Length(min=1)),
+        Optional('exclude'): [str],
+        Required('older_than'): Duration(),
+        Optional('workers'): All(int, Range(min=1)),
+        Optional('one_file_system'): bool
+    })
+
+
+def _cap_spec_schema(strict=True):
+    return Schema({
+        Optional('update_message'): str,
+        Required('dir'): IsDirUserExpand() if strict else str,
+        Required('max_size'): Size(),
+        Optional('order_by'): In(VALID_CAP_ORDERS),
+        Optional('one_file_system'): bool
+    })
+
+
+def _dedupe_spec_schema(strict=True):
+    return Schema({
+        Optional('update_message'): str,
+        Required('roots'): All([IsDirUserExpand() if strict else str], Length(min=1)),
+        Optional('min_size'): Size(),
+        Optional('action'): In(VALID_DEDUPE_ACTIONS),
+        Optional('keep'): In(VALID_DEDUPE_KEEP),
+        Optional('exclude'): [str],
+        Optional('workers'): All(int, Range(min=1)),
+        Optional('one_file_system'): bool
     })
 
 
 __TYPE_SCHEMA__ = {
     'cmd': _cmd_spec_schema,
-    'dir': _dir_spec_schema
+    'dir': _dir_spec_schema,
+    'files': _files_spec_schema,
+    'artifacts': _artifacts_spec_schema,
+    'cap': _cap_spec_schema,
+    'dedupe': _dedupe_spec_schema
 }
 
 
@@ -69,7 +177,7 @@ def _target_schema():
 def validate_yaml_target(description, strict=True):
     """
     performs the validation of the **YAML** definition of a :class:`cleanmymac.target.Target`.
-    Currently two kinds of schemas are supported.
+    Currently six kinds of schemas are supported.
 
     * Shell command based Targets
 
@@ -87,12 +195,14 @@ def validate_yaml_target(description, strict=True):
         }
 
 
-    * Directory based Targets
+    * Directory based Targets, the optional `min_size` (for the whole target or per entry) skips the cleanup
+      while the footprint is below the given size
 
     .. code-block:: yaml
 
         type: 'dir'
         spec: {
+            min_size: '100 MB',
             update_message: 'Get the latest Java version from http://www.oracle.com/technetwork/java/javase/downloads/index.html',
             entries: [
                 {
@@ -105,11 +215,72 @@ def validate_yaml_target(description, strict=True):
                 },
                 {
                     dir: '/Library/Java/JavaVirtualMachines',
-                    pattern: 'jdk1\.8\.\d_\d+\.jdk'
+                    pattern: 'jdk1\.8\.\d_\d+\.jdk',
+                    min_size: '1 GB'
                 },
             ]
         }
 
+    * File based Targets, all files under `roots` matching any of the `rules` are removed. Directories matching
+      the `exclude` globs are not descended into
+
+    .. code-block:: yaml
+
+        type: 'files'
+        spec: {
+            roots: ['~/Library/Logs', '/cores'],
+            exclude: ['.git'],
+            rules: [
+                {
+                    glob: '*.log',
+                    older_than: '7d'
+                },
+                {
+                    glob: 'core.*',
+                    min_size: '1 GB'
+                },
+            ]
+        }
+
+    * Build artifact Targets, artifact directories (i.e., `node_modules`) under the `roots` are removed if the
+      project files next to them were not modified for `older_than`. The `names` default to
+      :attr:`cleanmymac.constants.ARTIFACT_NAMES`
+
+    .. code-block:: yaml
+
+        type: 'artifacts'
+        spec: {
+            roots: ['~/workspace'],
+            names: ['node_modules', 'target', '.tox', '__pycache__'],
+            older_than: '30d'
+        }
+
+    * Cache Targets, the least recently used files (by `atime`, the default, or `mtime`) under `dir` are evicted
+      until the cache fits in `max_size`
+
+    .. code-block:: yaml
+
+        type: 'cap'
+        spec: {
+            dir: '~/Library/Caches/pip',
+            max_size: '2 GB',
+            order_by: 'atime'
+        }
+
+    * Duplicate file Targets, files of at least `min_size` under the `roots` with identical content are replaced
+      by hard links to the kept copy (`action: 'hardlink'`, the default) or deleted (`action: 'delete'`).
+      The `oldest` (default) or `newest` copy is kept
+
+    .. code-block:: yaml
+
+        type: 'dedupe'
+        spec: {
+            roots: ['~/Downloads', '/srv/artifacts'],
+            min_size: '1 MB',
+            action: 'hardlink',
+            keep: 'oldest'
+        }
+
     :param dict description: the loaded description
     :param bool strict: perform strict validation (fail on invalid specification if True)
     :return: the validate description
@@ -133,7 +304,29 @@ def validate_yaml_target(description, strict=True):
 def _config_schema():
     return Schema({
         Optional('cleanmymac'): Schema({
-            Optional('targets_path'): list
+            Optional('targets_path'): list,
+            Optional('state_path'): str,
+            Optional('watch'): Schema({
+                Optional('min_free'): Size(),
+                Optional('debounce'): Any(int, float),
+                Optional('space_interval'): Any(int, float),
+            }),
+            Optional('schedule'): Schema({
+                Optional('per_device'): All(int, Range(min=1)),
+                Optional('commands'): All(int, Range(min=1)),
+                Optional('cpu'): All(int, Range(min=1)),
+            }),
+            Optional('due'): Schema({
+                Optional('max_size'): Size(),
+                Optional('max_interval'): Duration(),
+                Optional('margin'): All(Any(int, float), Range(min=0, max=1)),
+            }),
+            Optional('gentle'): Schema({
+                Optional('nice'): int,
+                Optional('io_class'): In(IO_CLASSES),
+                Optional('files_per_second'): Any(int, float),
+                Optional('bytes_per_second'): Size(),
+            })
         }, extra=ALLOW_EXTRA),
     }, extra=ALLOW_EXTRA)
 
@@ -141,19 +334,46 @@ def _config_schema():
 def validate_yaml_config(config):
     """
     performs the validation of the **YAML** definition of the global **cleanmymac** configuration.
-    The current supported syntax allows for the specification of extra environment variables on a
-    per target basis. See for example the case when the *anaconda* target is not in **PATH**:
+    The current supported syntax allows for the specification of extra environment variables (and of
+    scheduling hints, *parallel_safe* and *resource_class*, see :class:`cleanmymac.target.Target`) on a
+    per target basis. See for example the case when the *anaconda* target is not in **PATH** and the
+    *brew* target has to run alone:
 
     .. code-block:: yaml
 
         cleanmymac: {
-          targets_path: ['.']
+          targets_path: ['.'],
+          state_path: '~/.cleanmymac',
+          watch: {
+            min_free: '10 GB',
+            debounce: 5,
+            space_interval: 30
+          },
+          schedule: {
+            per_device: 1,
+            commands: 4,
+            cpu: 1
+          },
+          due: {
+            max_size: '1 GB',
+            max_interval: '7d',
+            margin: 0.8
+          },
+          gentle: {
+            nice: 10,
+            io_class: 'idle',
+            files_per_second: 1000,
+            bytes_per_second: '256 MB'
+          }
         }
         anaconda: {
           env: {
             PATH: '~/anaconda/bin',
           },
         }
+        brew: {
+          parallel_safe: false
+        }
 
     :param dict config: the loaded configuration
     :return: the validate configuration
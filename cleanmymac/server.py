@@ -0,0 +1,190 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import sys
+import json
+import socket
+import logging
+from contextlib import contextmanager
+
+from cleanmymac.log import debug, error
+from cleanmymac.client import get_socket_path, connect
+
+
+class _MessageStream(object):
+    """
+    a file like object sending everything written to it to the client as messages of the given `kind`.
+    Output is dropped once the client disconnects
+    """
+    encoding = 'utf-8'
+
+    def __init__(self, connection, kind):
+        self._connection = connection
+        self._kind = kind
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8', 'replace')
+        if data:
+            self._connection.send({self._kind: data})
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+class _Connection(object):
+    def __init__(self, sock):
+        self._sock = sock
+        self._closed = False
+
+    def send(self, message):
+        if self._closed:
+            return
+        try:
+            self._sock.sendall((json.dumps(message) + '\n').encode('utf-8'))
+        except socket.error as e:
+            debug('client disconnected: %s', e)
+            self._closed = True
+
+    def receive(self):
+        line = self._sock.makefile('rb').readline()
+        return json.loads(line.decode('utf-8')) if line else None
+
+    def close(self):
+        self._sock.close()
+
+
+@contextmanager
+def _request_context(connection, cwd, env):
+    stdout, stderr, old_cwd = sys.stdout, sys.stderr, os.getcwd()
+    old_env = dict((key, os.environ.get(key)) for key in env)
+    root_logger = logging.getLogger()
+    old_level = root_logger.level
+    sys.stdout = _MessageStream(connection, 'out')
+    sys.stderr = _MessageStream(connection, 'err')
+    try:
+        os.environ.update(env)
+        if cwd and os.path.isdir(cwd):
+            os.chdir(cwd)
+        yield
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        root_logger.setLevel(old_level)
+        os.chdir(old_cwd)
+        for key, value in old_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+class Server(object):
+    """
+    the **cleanmymac** server: accepts command lines from clients (see :func:`cleanmymac.client.forward`)
+    over a Unix socket and runs them with `handler` in this (warm) process. Requests are served one at a time,
+    the output of the handler (the standard output and error streams) is streamed back to the client.
+    A request runs to completion even if the client disconnects.
+
+    :param callable handler: called with the command line arguments, returns the exit code
+    :param str socket_path: the server socket (defaults to :func:`cleanmymac.client.get_socket_path`)
+    :param callable refresh: called before every request (i.e., to reload changed targets)
+    """
+    def __init__(self, handler, socket_path=None, refresh=None):
+        self._handler = handler
+        self._refresh = refresh
+        self.socket_path = socket_path or get_socket_path()
+        self._sock = None
+
+    def bind(self):
+        """
+        bind the server socket, only the current user can connect
+
+        :raise: :class:`RuntimeError` if another server is already running
+        """
+        other = connect(self.socket_path)
+        if other is not None:
+            other.close()
+            raise RuntimeError('a cleanmymac server is already running on {0}'.format(self.socket_path))
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # stale socket, its server is gone
+        folder = os.path.dirname(self.socket_path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            self._sock.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        self._sock.listen(16)
+
+    def handle(self, sock):
+        """
+        serve a single client connection
+
+        :param sock: the client socket
+        :type sock: :class:`socket.socket`
+        """
+        connection = _Connection(sock)
+        try:
+            request = connection.receive()
+            if not request:
+                return
+            debug('request: %s', request)
+            if self._refresh:
+                self._refresh()
+            code = 1
+            with _request_context(connection, request.get('cwd'), request.get('env', {})):
+                try:
+                    code = self._handler(request.get('argv', []))
+                except Exception as e:
+                    error('request failed. Reason: {0}'.format(e))
+            connection.send({'exit': code})
+        finally:
+            connection.close()
+
+    def serve_forever(self):
+        """
+        accept and serve clients until interrupted
+        """
+        if self._sock is None:
+            self.bind()
+        try:
+            while True:
+                sock, _ = self._sock.accept()
+                self.handle(sock)
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        close the server socket
+        """
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
@@ -0,0 +1,159 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import subprocess
+from uuid import uuid4
+from threading import Thread
+
+from six.moves.queue import Queue, Empty
+
+from cleanmymac.log import debug, error
+from cleanmymac.capture import read_lines
+from cleanmymac.constants import SESSION_SHELL
+
+# the template of the script sent to the shell for every command: the command reads nothing from the session
+# input, its exit code and the end of its output are marked with the session sentinel on both streams
+_SCRIPT = '''{{ {command}
+}} </dev/null
+printf '%s %d\\n' '{sentinel}' "$?"
+printf '%s\\n' '{sentinel}' >&2
+'''
+
+
+class _SessionStream(object):
+    """
+    reads an output stream of the shell, passes the lines of the running command to its handler and
+    the sentinel lines to a queue (None once the stream ends)
+    """
+    def __init__(self, stream, sentinel):
+        self.handler = None
+        self.marks = Queue()
+        self._stream = stream
+        self._sentinel = sentinel
+        self._thread = Thread(target=self._read)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _line(self, line):
+        index = line.find(self._sentinel)
+        if index < 0:
+            if self.handler:
+                self.handler(line)
+            return
+        if index > 0 and self.handler:
+            # the last line of output did not end with a new line
+            self.handler(line[:index])
+        self.marks.put(line[index + len(self._sentinel):].strip())
+
+    def _read(self):
+        try:
+            read_lines(self._stream.fileno(), self._line)
+        except Exception as e:
+            error('shell session output capture failed. Reason: {0}'.format(e))
+        finally:
+            self.marks.put(None)
+
+    def mark(self):
+        while True:
+            try:
+                return self.marks.get(timeout=1.0)
+            except Empty:
+                continue
+
+    def join(self, timeout=5.0):
+        self._thread.join(timeout)
+
+
+class ShellSession(object):
+    """
+    a persistent shell running many commands one after the other: the process creation (and the **PATH**
+    resolution) is paid once for all of them. Each command is delimited on both output streams by a
+    random sentinel line carrying its exit code. Commands share the shell state (i.e., the current directory),
+    they cannot read from the standard input. A command ending the shell (i.e., *exit 1*) fails with the
+    exit code of the shell, a new shell is started for the next command.
+
+    :param dict env: the environment variables (on top of the current environment)
+    :param str shell: the shell executable
+    """
+    def __init__(self, env=None, shell=SESSION_SHELL):
+        self._env = dict(os.environ, **(env or {}))
+        self._shell = shell
+        self._sentinel = 'cleanmymac-{0}'.format(uuid4().hex)
+        self._process = None
+        self._out = None
+        self._err = None
+
+    def _start(self):
+        debug('starting shell session: %s', self._shell)
+        self._process = subprocess.Popen([self._shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE, env=self._env, close_fds=True)
+        self._out = _SessionStream(self._process.stdout, self._sentinel.encode('utf-8'))
+        self._err = _SessionStream(self._process.stderr, self._sentinel.encode('utf-8'))
+
+    def _ended(self):
+        code = self._process.wait()
+        self._out.join()
+        self._err.join()
+        self._process.stdin.close()
+        self._process = None
+        return code
+
+    def run(self, command, out=None, err=None):
+        """
+        run a command in the session
+
+        :param str command: the shell command
+        :param callable out: called with every line (as bytes) of standard output, discarded if None
+        :param callable err: called with every line (as bytes) of standard error, discarded if None
+        :return: the exit code
+        :rtype: int
+        :raise: :class:`OSError` if the shell cannot be started
+        """
+        if self._process is None:
+            self._start()
+        self._out.handler, self._err.handler = out, err
+        try:
+            self._process.stdin.write(_SCRIPT.format(command=command, sentinel=self._sentinel).encode('utf-8'))
+            self._process.stdin.flush()
+        except (IOError, OSError):
+            # the shell is gone
+            pass
+        status = self._out.mark()
+        if status is not None and self._err.mark() is not None:
+            return int(status)
+        code = self._ended()
+        debug('shell session ended with exit code %s', code)
+        return int(status) if status else code
+
+    def close(self):
+        """
+        end the session
+        """
+        if self._process is not None:
+            try:
+                self._process.stdin.write(b'exit 0\n')
+                self._process.stdin.flush()
+            except (IOError, OSError):
+                pass
+            self._ended()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,123 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import json
+import tempfile
+
+from cleanmymac.log import debug, error
+from cleanmymac.constants import DEFAULT_STATE_PATH
+
+_state_path = DEFAULT_STATE_PATH
+
+_incremental = False
+
+
+def set_state_path(path):
+    """
+    set the folder where **cleanmymac** keeps state between runs
+
+    :param str path: the state folder, user home (**~**) is expanded
+    """
+    global _state_path
+    _state_path = path if path else DEFAULT_STATE_PATH
+
+
+def get_state_path():
+    """
+    get the folder where **cleanmymac** keeps state between runs
+
+    :return: the expanded state path
+    :rtype: str
+    """
+    return os.path.abspath(os.path.expanduser(_state_path))
+
+
+def set_incremental(value):
+    """
+    toggle incremental mode. In incremental mode directory entries which did not change since
+    the last clean are skipped
+
+    :param bool value: enable / disable incremental mode
+    """
+    global _incremental
+    _incremental = True if value else False
+
+
+def is_incremental():
+    """
+    test if incremental mode is enabled
+
+    :return: True if in incremental mode
+    :rtype: bool
+    """
+    return _incremental
+
+
+def _state_file(name):
+    return os.path.join(get_state_path(), '{0}.json'.format(name))
+
+
+def load_state(name):
+    """
+    load a named state object. A missing or unreadable state is treated as empty
+
+    :param str name: the name of the state
+    :return: the state
+    :rtype: dict
+    """
+    path = _state_file(name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as STATE:
+            state = json.load(STATE)
+        return state if isinstance(state, dict) else {}
+    except (IOError, ValueError) as e:
+        error('could not load state "{0}". Reason: {1}'.format(path, e))
+        return {}
+
+
+def save_state(name, state):
+    """
+    save a named state object. The state is written to a temporary file first and then moved
+    in place, a crash never leaves a partially written state behind
+
+    :param str name: the name of the state
+    :param dict state: the state (must be serializable as **JSON**)
+    """
+    path = _state_file(name)
+    folder = os.path.dirname(path)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.{0}.'.format(name))
+    with os.fdopen(fd, 'w') as STATE:
+        json.dump(state, STATE)
+    os.rename(tmp_path, path)
+    debug('saved state: %s', path)
+
+
+def update_state(name, values):
+    """
+    update (merge) the given values into a named state object
+
+    :param str name: the name of the state
+    :param dict values: the values to update
+    """
+    state = load_state(name)
+    state.update(values)
+    save_state(name, state)
@@ -18,15 +18,24 @@
 import click
 import os
 import re
+from logging import DEBUG
+from time import time
+from functools import partial
+from collections import deque
 from pprint import pformat
-from natsort import natsorted
-from threading import Thread, Event
-from time import sleep
-from sarge import run, shell_format, Capture
 from abc import ABCMeta, abstractmethod, abstractproperty
-from cleanmymac.log import info, debug, error, warn, echo_info, echo_warn, echo_success
-from cleanmymac.util import delete_dir_content, DirList, Dir, delete_dirs
-from cleanmymac.constants import DESCRIBE_UPDATE, DESCRIBE_CLEAN, VALID_DESCRIBE_MESSAGES
+from cleanmymac.log import info, debug, error, warn, echo_info, echo_warn, echo_success, is_enabled_for, lazy
+from cleanmymac.util import delete_dir_content, DirList, Dir, delete_dirs, get_signature, parse_size, probe_size, \
+    format_size, remove_path, plan_removal, parse_duration, scandir, is_on_device, SizeProbe
+from cleanmymac.scan import FileScanner, ScanRequest, ArtifactFinder, CacheIndex, DuplicateFinder, file_rule, \
+    scan_coalesced
+from cleanmymac.state import is_incremental, load_state, update_state
+from cleanmymac.progress import get_progress
+from cleanmymac.history import get_history
+from cleanmymac.capture import BoundedCapture, OutputLines, has_output_log, write_output_log
+from cleanmymac.constants import DESCRIBE_UPDATE, DESCRIBE_CLEAN, VALID_DESCRIBE_MESSAGES, STATE_SIGNATURES, \
+    ARTIFACT_NAMES, ARTIFACTS_WORKERS, DESCRIBE_SUMMARY_ITEMS, DEDUPE_MIN_SIZE, DEDUPE_WORKERS, ARCHIVE_COMPRESSION, \
+    RESOURCE_IO, RESOURCE_NETWORK, RESOURCE_CPU, VALID_RESOURCE_CLASSES
 
 
 # ----------------------------------------------------------------------------------------
@@ -37,6 +46,11 @@ from cleanmymac.constants import DESCRIBE_UPDATE, DESCRIBE_CLEAN, VALID_DESCRIBE
 class Target(object):
     """
     the main cleanup Target. This is an abstract class.
+    Besides the update, clean and describe operations a target can tell the scheduler (see
+    :mod:`cleanmymac.schedule`) about itself: the directories it scans (:meth:`scan_roots`), a cheap estimate
+    of the space it frees (:meth:`estimate_size`), whether it can run concurrently with other targets
+    (:attr:`parallel_safe`) and what it is mostly bound by (:attr:`resource_class`). The defaults suit targets
+    that do not know, installed targets override what they can.
 
     :param config: a configuration dictionary
     :type config: dict
@@ -47,18 +61,95 @@ class Target(object):
     """
     __metaclass__ = ABCMeta
 
+    # the resource class unless configured otherwise, see resource_class
+    _resource_class = RESOURCE_IO
+
     def __init__(self, config, update=False, verbose=False):
         self._config = config if isinstance(config, dict) else {}
         self._update = update
         self._verbose = verbose
+        self._skipped = False
 
-    def _debug(self, msg, *arg):
-        debug('[{0}] {1}'.format(click.style(str(self.__class__.__name__), fg='yellow'), msg))
+    def _debug(self, msg, *args):
+        if is_enabled_for(DEBUG):
+            debug('[%s] %s', click.style(str(self.__class__.__name__), fg='yellow'), msg % args if args else msg)
 
     @property
     def config(self):
         return self._config
 
+    def scan_roots(self):
+        """
+        the directories this target scans for cleanup, used to place it on its devices when running
+        concurrently (see :func:`cleanmymac.schedule.target_resources`) and to watch it (see *--watch*)
+
+        :return: a list of expanded directory paths, empty if the target does not scan directories
+        :rtype: list
+        """
+        return []
+
+    def scan_requests(self):
+        """
+        the scans this target needs, run together with the scans of other targets (see
+        :func:`cleanmymac.scan.scan_coalesced`) before cleaning
+
+        :return: the scan requests, empty if the target scans on its own (or not at all)
+        :rtype: list of :class:`cleanmymac.scan.ScanRequest`
+        """
+        return []
+
+    def estimate_size(self, limit=None):
+        """
+        a cheap estimate of the space cleaning this target frees: sizes are added up from file metadata, nothing
+        is read or removed
+
+        :param int limit: stop adding up once the size reaches `limit` (the estimate is a lower bound then)
+        :return: the estimate or None if the target cannot tell (i.e., shell commands)
+        :rtype: :class:`cleanmymac.util.SizeProbe`
+        """
+        return None
+
+    @property
+    def skipped(self):
+        """
+        whether the last cleanup skipped the whole target (i.e., smaller than its `min_size`), the run history
+        does not count skipped runs as cleaning the target
+
+        :return: False unless the target skipped itself
+        :rtype: bool
+        """
+        return getattr(self, '_skipped', False)
+
+    @property
+    def parallel_safe(self):
+        """
+        whether the target can run concurrently with other targets, targets that cannot run alone (in their turn)
+        when running with *-j / --jobs*. Configured per target in the global configuration file
+        (i.e., `brew: {parallel_safe: false}`)
+
+        :return: True by default
+        :rtype: bool
+        """
+        return bool(self._config.get('parallel_safe', True))
+
+    @property
+    def resource_class(self):
+        """
+        what the target is mostly bound by: disk I/O, the network or the CPU (see
+        :data:`cleanmymac.constants.VALID_RESOURCE_CLASSES`), targets bound by the network or the CPU are limited
+        separately when running concurrently. Configured per target in the global configuration file
+        (i.e., `docker: {resource_class: 'cpu'}`)
+
+        :return: the resource class
+        :rtype: str
+        """
+        resource_class = self._config.get('resource_class', self._resource_class)
+        if resource_class not in VALID_RESOURCE_CLASSES:
+            warn('unknown resource class "%s", valid options are: %s', resource_class,
+                 ', '.join(sorted(VALID_RESOURCE_CLASSES)))
+            return self._resource_class
+        return resource_class
+
     @abstractmethod
     def update(self, **kwargs):
         """
@@ -80,14 +171,15 @@ class Target(object):
         pass
 
     @abstractmethod
-    def describe(self):
+    def describe(self, full=False):
         """
-        the description of the combined update and clean operations
+        the description of the combined update and clean operations, streamed one line at a time.
+        Long lists of items to remove are summarized unless `full` is set (see :meth:`_describe_summary`)
 
-        :return: a string describing the steps to be undertaken
-        :rtype: str
+        :param bool full: describe every item to remove
+        :return: a generator of lines describing the steps to be undertaken
         """
-        return ''
+        return iter([])
 
     @staticmethod
     def __describe__(kind, message, fg=None):
@@ -102,6 +194,42 @@ class Target(object):
     def _describe_clean(self, message, fg='white'):
         return self.__describe__(DESCRIBE_CLEAN, message, fg=fg)
 
+    def _describe_summary(self, items, what, nothing=None, full=False, limit=DESCRIBE_SUMMARY_ITEMS):
+        """
+        stream the description of a (potentially huge) number of items to remove: all of them if `full`,
+        only the first and the last `limit` otherwise, followed by their count and total size. At most
+        `limit` items are held in memory.
+
+        :param iterable items: pairs of (message, size), the size can be None if not known
+        :param str what: what the items are (i.e., 'files')
+        :param str nothing: the message if there are no items, no message if None
+        :param bool full: describe every item
+        :param int limit: the number of items described at both ends of the list
+        :return: a generator of description lines
+        """
+        tail = deque(maxlen=limit)
+        count, size, skipped = 0, 0, 0
+        for message, item_size in items:
+            count += 1
+            if item_size is not None:
+                size += item_size
+            if full or count <= limit:
+                yield self._describe_clean(message)
+                continue
+            if len(tail) == limit:
+                skipped += 1
+            tail.append(message)
+        if skipped:
+            yield self._describe_clean('... {0} more {1}'.format(skipped, what))
+        for message in tail:
+            yield self._describe_clean(message)
+
+        if count:
+            yield self._describe_clean('delete {0} {1}{2}'.format(
+                count, what, ', {0} in total'.format(format_size(size)) if size else ''))
+        elif nothing:
+            yield self._describe_clean(nothing)
+
     def __call__(self, **kwargs):
         """
         initiate the cleanup (and update if enabled) operations
@@ -124,7 +252,8 @@ class Target(object):
 class ShellCommandTarget(Target):
     """
     Class encapsulating general logic to execute cleanup operations based on predefined
-    shell commands. This is an abstract class.
+    shell commands. Shell commands are taken to be network bound (i.e., package managers), their size
+    cannot be estimated. This is an abstract class.
 
     :param config: a configuration dictionary
     :type config: dict
@@ -135,6 +264,8 @@ class ShellCommandTarget(Target):
     """
     __metaclass__ = ABCMeta
 
+    _resource_class = RESOURCE_NETWORK
+
     def __init__(self, config, update=False, verbose=False):
         super(ShellCommandTarget, self).__init__(config, update=update, verbose=verbose)
         self._env = self._config['env'] if 'env' in self._config else {}
@@ -144,7 +275,8 @@ class ShellCommandTarget(Target):
             path = '{0}:{1}'.format(os.environ['PATH'],
                                     os.path.expanduser(self._env['PATH']))
         self._env['PATH'] = path
-        self._debug('target local env: {0}'.format(pformat(self._env)))
+        self._debug('target local env: %s', lazy(pformat, self._env))
+        self._session = None
 
     @abstractproperty
     def update_commands(self):
@@ -166,49 +298,84 @@ class ShellCommandTarget(Target):
         """
         return []
 
+    @property
+    def session(self):
+        """
+        if True all the commands of the target run in a single shell (see :class:`cleanmymac.session.ShellSession`)
+        instead of a new process each
+
+        :return: True if running the commands in a shell session
+        :rtype: bool
+        """
+        return False
+
+    def _report(self, cmd, returncode, out, err):
+        if returncode:
+            error('command: "{0}" failed with exit code {1}'.format(cmd, returncode))
+            for line in (out.tail if out else []) + err.tail:
+                error('\t{0}'.format(line))
+        return returncode
+
+    def _run_session_command(self, cmd):
+        err = OutputLines(callback=warn if self._verbose else None, name='err')
+        out = None
+        if self._verbose or has_output_log():
+            out = OutputLines(callback=echo_info if self._verbose else None, name='out')
+        return self._report(cmd, self._session.run(cmd, out=out, err=err), out, err)
+
+    def _run_command(self, cmd):
+        if self._session is not None:
+            return self._run_session_command(cmd)
+        from sarge import run
+        err = BoundedCapture(callback=warn if self._verbose else None, name='err')
+        out, devnull = None, None
+        if self._verbose or has_output_log():
+            out = BoundedCapture(callback=echo_info if self._verbose else None, name='out')
+        else:
+            # nobody looks at the output
+            devnull = open(os.devnull, 'wb')
+        try:
+            p = run(cmd, stdout=out.stream if out else devnull, stderr=err.stream, env=self._env, async=True)
+            p.wait()
+        finally:
+            err.close()
+            if out:
+                out.close()
+            if devnull:
+                devnull.close()
+        return self._report(cmd, p.returncode, out, err)
+
     def _run(self, commands):
+        if self.session and self._session is None:
+            from cleanmymac.session import ShellSession
+            with ShellSession(env=self._env) as self._session:
+                try:
+                    return self._run(commands)
+                finally:
+                    self._session = None
+        commands = list(commands)
+        progress, history = get_progress(), get_history()
+        if progress:
+            progress.plan(commands=len(commands))
         for cmd in commands:
-            self._debug('run command "{0}"'.format(cmd))
+            self._debug('run command "%s"', cmd)
+            if self._verbose:
+                echo_success('running: {0}'.format(cmd))
+            write_output_log('$ {0}\n'.format(cmd).encode('utf-8'))
+            start = time()
             try:
-                with Capture() as err:
-                    with Capture() as out:
-                        if self._verbose:
-                            echo_success('running: {0}'.format(cmd))
-
-                        command_done = Event()
-
-                        def redirect():
-                            while not command_done.is_set():
-                                try:
-                                    for line in out:
-                                        echo_info(line.strip())
-                                except TypeError:
-                                    pass
-
-                                try:
-                                    for line in err:
-                                        warn(line.strip())
-                                except TypeError:
-                                    pass
-
-                                sleep(0.05)
-
-                        p = run(cmd, stdout=out, stderr=err, env=self._env, async=True)
-
-                        if self._verbose:
-                            Thread(target=redirect).start()
-
-                        try:
-                            p.wait()
-                        finally:
-                            # make sure the console redirect thread is properly shutting down
-                            command_done.set()
-
+                returncode = self._run_command(cmd)
             except OSError:
                 error('command: "{0}" could not be executed (not found?)'.format(cmd))
+                returncode = 127
+            if history:
+                history.record_command(cmd, time() - start, returncode)
+            if progress:
+                progress.advance(commands=1)
 
     @staticmethod
     def _describe(commands):
+        from sarge import shell_format
         return map(shell_format, commands)
 
     def update(self, **kwargs):
@@ -217,12 +384,32 @@ class ShellCommandTarget(Target):
     def clean(self, **kwargs):
         self._run(self.clean_commands)
 
-    def describe(self):
-        commands_to_run = []
+    def __call__(self, **kwargs):
+        if not self.session:
+            return super(ShellCommandTarget, self).__call__(**kwargs)
+        # the update and clean commands share the session
+        from cleanmymac.session import ShellSession
+        with ShellSession(env=self._env) as self._session:
+            try:
+                return super(ShellCommandTarget, self).__call__(**kwargs)
+            finally:
+                self._session = None
+
+    def commands(self):
+        """
+        the shell commands this target runs, in order (the update commands only if updating)
+
+        :return: a list of shell commands
+        :rtype: list
+        """
+        return (list(self.update_commands) if self._update else []) + list(self.clean_commands)
+
+    def describe(self, full=False):
         if self._update:
-            commands_to_run += map(self._describe_update, self._describe(self.update_commands))
-        commands_to_run += map(self._describe_clean, self._describe(self.clean_commands))
-        return '\n'.join(commands_to_run)
+            for command in self._describe(self.update_commands):
+                yield self._describe_update(command)
+        for command in self._describe(self.clean_commands):
+            yield self._describe_clean(command)
 
 
 # ----------------------------------------------------------------------------------------
@@ -244,7 +431,7 @@ class YamlShellCommandTarget(ShellCommandTarget):
     """
     def __init__(self, config, update=False, verbose=False):
         self._spec = config['spec']
-        self._debug('spec: {0}'.format(pformat(self._spec)))
+        self._debug('spec: %s', lazy(pformat, self._spec))
         super(YamlShellCommandTarget, self).__init__(config, update=update, verbose=verbose)
 
     @property
@@ -255,6 +442,10 @@ class YamlShellCommandTarget(ShellCommandTarget):
     def clean_commands(self):
         return self._spec['clean_commands']
 
+    @property
+    def session(self):
+        return self._spec.get('session', False)
+
 
 # ----------------------------------------------------------------------------------------
 #
@@ -266,6 +457,11 @@ class DirTarget(Target):
     Class encapsulating the logic to execute directory based cleanup operations. The main operation
     consists of identifying and removing all matching directories in a given path with the exception
     of the most recent version.
+    Entries with `action: archive` archive each folder into a compressed tarball in `archive_dir` first (see
+    :func:`cleanmymac.archive.archive_tree`), folders are only removed once their archive is verified.
+    In incremental mode (see :func:`cleanmymac.state.set_incremental`) the signature of each entry
+    directory is recorded after a successful clean, entries with an unchanged signature are skipped on
+    subsequent runs.
     This is an abstract class.
 
     .. warning::
@@ -283,6 +479,8 @@ class DirTarget(Target):
 
     def __init__(self, config, update=False, verbose=False):
         super(DirTarget, self).__init__(config, update=update, verbose=verbose)
+        self._requests = {}
+        self._described = None
 
     @property
     def update_message(self):
@@ -298,55 +496,285 @@ class DirTarget(Target):
         if self._verbose and self.update_message:
             echo_info(self.update_message)
 
-    def _to_remove(self):
+    def scan_roots(self):
+        """
+        the directories this target scans for cleanup
+
+        :return: a list of expanded directory paths
+        :rtype: list
+        """
+        roots = []
+        for entry in self.entries:
+            _dir = os.path.abspath(os.path.expanduser(entry['dir']))
+            if _dir not in roots:
+                roots.append(_dir)
+        return roots
+
+    @staticmethod
+    def _entry_key(entry):
+        return '{0}:{1}'.format(os.path.abspath(os.path.expanduser(entry['dir'])), entry.get('pattern', ''))
+
+    @staticmethod
+    def _one_file_system(entry):
+        return entry.get('one_file_system', True)
+
+    @staticmethod
+    def _archives(entry):
+        return entry.get('action', 'delete') == 'archive'
+
+    def _is_unchanged(self, entry, signatures):
+        recorded = signatures.get(self._entry_key(entry))
+        if not recorded:
+            return False
+        try:
+            return list(get_signature(os.path.expanduser(entry['dir']))) == recorded
+        except OSError:
+            return False
+
+    @staticmethod
+    def _match_entry(pattern, entry):
+        return entry.path if pattern.match(entry.name) and entry.is_dir() else None
+
+    def scan_requests(self):
+        """
+        the scan requests for the entries with a `pattern`, to be run together with the requests of other
+        targets (see :func:`cleanmymac.scan.scan_coalesced`) before cleaning. Entries without results fall
+        back to scanning on their own.
+
+        :return: the scan requests
+        :rtype: list of :class:`cleanmymac.scan.ScanRequest`
+        """
+        signatures = load_state(STATE_SIGNATURES) if is_incremental() else {}
+        self._requests = {}
         for entry in self.entries:
-            self._debug('check entry "{0}" to clean'.format(entry['dir']))
-            _dir = os.path.expanduser(entry['dir'])
-            if 'pattern' in entry:
-                _pattern = entry['pattern']
+            if 'pattern' not in entry or self._is_unchanged(entry, signatures):
+                continue
+            self._requests[self._entry_key(entry)] = ScanRequest(
+                entry['dir'], partial(self._match_entry, re.compile(entry['pattern'])), max_depth=0,
+                one_file_system=self._one_file_system(entry))
+        return list(self._requests.values())
+
+    def _scan_entry(self, entry):
+        _dir = os.path.expanduser(entry['dir'])
+        if 'pattern' in entry:
+            _pattern = entry['pattern']
+            request = self._requests.pop(self._entry_key(entry), None)
+            if request is not None and request.scanned:
+                dirs = request.matches
+            else:
                 dirs = [os.path.join(_dir, d) for d in os.listdir(_dir)
                         if os.path.isdir(os.path.join(_dir, d)) and re.match(_pattern, d)]
-                dirs = natsorted(dirs, reverse=True)
-                dir_list = DirList(dirs[1:])
-                self._debug('\tremove multiple directories: {0}'.format(dir_list.dirs))
-                yield dir_list
-            else:
-                self._debug('\tremove single directory: {0}'.format(_dir))
-                yield Dir(_dir)
+            from natsort import natsorted
+            dirs = natsorted(dirs, reverse=True)
+            dir_list = DirList(dirs[1:])
+            self._debug('\tremove multiple directories: %s', dir_list.dirs)
+            return dir_list
+        else:
+            self._debug('\tremove single directory: %s', _dir)
+            return Dir(_dir)
+
+    @staticmethod
+    def _victims(to_remove):
+        return to_remove.dirs if isinstance(to_remove, DirList) else [to_remove.path]
+
+    def _removed_paths(self, entry, to_remove):
+        # a Dir folder is kept, only its entries are removed (see delete_dir_content)
+        if isinstance(to_remove, DirList):
+            return to_remove.dirs
+        if not isinstance(to_remove, Dir) or not os.path.isdir(to_remove.path):
+            return []
+        device = os.stat(to_remove.path).st_dev if self._one_file_system(entry) else None
+        return [dir_entry.path for dir_entry in scandir(to_remove.path) if is_on_device(dir_entry, device)]
+
+    @staticmethod
+    def _describe_probe(probe, min_size):
+        return '{0}{1} (min_size: {2})'.format('' if probe.exact else '>= ', format_size(probe.size),
+                                              format_size(min_size))
+
+    def _to_remove(self):
+        signatures = load_state(STATE_SIGNATURES) if is_incremental() else {}
+        for entry in self.entries:
+            self._debug('check entry "%s" to clean', entry['dir'])
+            if self._is_unchanged(entry, signatures):
+                self._debug('\tunchanged since last clean, skipping: %s', entry['dir'])
+                yield entry, None, 'unchanged since last clean'
+                continue
+            to_remove = self._scan_entry(entry)
+            if 'min_size' in entry:
+                min_size = parse_size(entry['min_size'])
+                probe = probe_size(self._removed_paths(entry, to_remove), limit=min_size,
+                                   one_file_system=self._one_file_system(entry))
+                self._debug('\tsize probe: %s', lazy(self._describe_probe, probe, min_size))
+                if probe.size < min_size:
+                    yield entry, None, 'size {0}, skipping'.format(self._describe_probe(probe, min_size))
+                    continue
+            yield entry, to_remove, None
+
+    def estimate_size(self, limit=None):
+        """
+        the size of what this target removes (see :func:`cleanmymac.util.probe_size`): the content of `Dir`
+        entries, whose folder is kept, and the folders of `DirList` ones. Entries skipped on their own (unchanged
+        or smaller than their `min_size`) are not counted, nor is anything if the target is smaller than its
+        `min_size`. Right after :meth:`describe` the plan it described is reused, nothing is scanned again
+
+        :param int limit: stop adding up once the size reaches `limit` (the estimate is a lower bound then)
+        :return: the estimate
+        :rtype: :class:`cleanmymac.util.SizeProbe`
+        """
+        plan, self._described = self._described, None
+        return self._probe(plan if plan is not None else self._plan()[0], limit=limit)
+
+    def _probe(self, plan, limit=None):
+        # mount points are crossed or not per entry
+        size, exact = 0, True
+        for one_file_system in (True, False):
+            paths = [path for entry, to_remove, _ in plan
+                     if to_remove is not None and self._one_file_system(entry) == one_file_system
+                     for path in self._removed_paths(entry, to_remove)]
+            if not paths:
+                continue
+            if limit is not None and size >= limit:
+                exact = False
+                break
+            probe = probe_size(paths, limit=limit - size if limit is not None else None,
+                               one_file_system=one_file_system)
+            size += probe.size
+            exact = exact and probe.exact
+        return SizeProbe(size, exact)
+
+    def _plan(self):
+        plan = list(self._to_remove())
+        min_size = self.min_size
+        if min_size is None:
+            return plan, None
+        probe = self._probe(plan, limit=min_size)
+        self._debug('target size probe: %s', lazy(self._describe_probe, probe, min_size))
+        if probe.size < min_size:
+            return [], 'target size {0}, skipping'.format(self._describe_probe(probe, min_size))
+        return plan, 'target size {0}'.format(self._describe_probe(probe, min_size))
+
+    def removals(self):
+        """
+        the paths this target removes, the content of `Dir` entries is listed entry by entry. Entries archived
+        before removal are left out (plans do not cover archiving, these are archived on a normal run)
+
+        :return: a generator of (path, one_file_system) pairs
+        """
+        plan, _ = self._plan()
+        for entry, to_remove, _ in plan:
+            if to_remove is not None and self._archives(entry):
+                warn('not planning "%s", archived on a normal run only', entry['dir'])
+                continue
+            one_file_system = self._one_file_system(entry)
+            for path in self._removed_paths(entry, to_remove):
+                yield path, one_file_system
 
     def clean(self, **kwargs):
-        for entry in self._to_remove():
-            if isinstance(entry, DirList):
+        plan, message = self._plan()
+        if message and self._verbose:
+            echo_info(message)
+        # smaller than its min_size
+        self._skipped = message is not None and not plan
+        # archived folders are removed once their archive is verified, these are not resumed after an interruption
+        deleted = [(entry, to_remove) for entry, to_remove, _ in plan if not self._archives(entry)]
+        plan_removal(paths=[d for _, to_remove in deleted if isinstance(to_remove, DirList) for d in to_remove.dirs],
+                     contents=[to_remove.path for _, to_remove in deleted if isinstance(to_remove, Dir)])
+        signatures = {}
+        for entry, to_remove, _ in plan:
+            if to_remove is not None and self._archives(entry):
+                if not self._archive(entry, to_remove):
+                    continue
+            elif isinstance(to_remove, DirList):
                 if self._verbose:
-                    echo_warn('delete folders: {0}'.format(pformat(entry.dirs)))
-                delete_dirs(entry)
-            elif isinstance(entry, Dir):
+                    echo_warn('delete folders: {0}'.format(pformat(to_remove.dirs)))
+                delete_dirs(to_remove, one_file_system=self._one_file_system(entry))
+            elif isinstance(to_remove, Dir):
                 if self._verbose:
-                    echo_warn('delete folder contents: {0}'.format(entry.path))
-                delete_dir_content(entry)
+                    echo_warn('delete folder contents: {0}'.format(to_remove.path))
+                delete_dir_content(to_remove, one_file_system=self._one_file_system(entry))
+            else:
+                continue
+            if is_incremental():
+                signatures[self._entry_key(entry)] = list(get_signature(os.path.expanduser(entry['dir'])))
+        if signatures:
+            update_state(STATE_SIGNATURES, signatures)
+
+    def _archive(self, entry, to_remove):
+        from cleanmymac.archive import archive_tree
+        one_file_system = self._one_file_system(entry)
+        compression = entry.get('compression', ARCHIVE_COMPRESSION)
+        archived = True
+        for folder in self._victims(to_remove):
+            if not os.path.isdir(folder):
+                continue
+            try:
+                archive = archive_tree(folder, entry['archive_dir'], compression=compression,
+                                       one_file_system=one_file_system)
+            except (IOError, OSError) as e:
+                error('could not archive "%s", not removed. Reason: %s', folder, e)
+                archived = False
+                continue
+            if self._verbose:
+                echo_warn('archived folder: {0} to {1} ({2})'.format(folder, archive.path, format_size(archive.size)))
+            if isinstance(to_remove, Dir):
+                delete_dir_content(to_remove, one_file_system=one_file_system)
+            else:
+                remove_path(folder, one_file_system=one_file_system)
+        return archived
 
-    def describe(self):
-        msgs = []
+    def _describe_action(self, entry, what, path):
+        if self._archives(entry):
+            return 'archive and delete {0}: {1} (to {2}, {3})'.format(what, path, entry['archive_dir'],
+                                                                     entry.get('compression', ARCHIVE_COMPRESSION))
+        return 'delete {0}: {1}'.format(what, path)
+
+    def describe(self, full=False):
         if self._update and self.update_message:
-            msgs.append(self._describe_update(self.update_message))
+            yield self._describe_update(self.update_message)
+
+        plan, message = self._plan()
+        # reused by estimate_size
+        self._described = plan
+        if message:
+            yield self._describe_clean(message)
 
         nothing_to_remove = True
-        for entry in self._to_remove():
-            if isinstance(entry, DirList) and entry.dirs:
-                msgs.append(self._describe_clean('delete folders: {0}'.format(pformat(entry.dirs))))
+        for entry, to_remove, reason in plan:
+            if to_remove is None:
+                yield self._describe_clean('{0}: {1}'.format(entry['dir'], reason))
+            elif isinstance(to_remove, DirList) and to_remove.dirs:
+                yield self._describe_clean(self._describe_action(entry, 'folders in', entry['dir']))
+                for line in self._describe_summary(((self._describe_action(entry, 'folder', d), None)
+                                                    for d in to_remove.dirs), 'folders', full=full):
+                    yield line
                 nothing_to_remove = False
-            elif isinstance(entry, Dir):
-                msgs.append(self._describe_clean('delete folder contents: {0}'.format(entry.path)))
+            elif isinstance(to_remove, Dir):
+                yield self._describe_clean(self._describe_action(entry, 'folder contents', to_remove.path))
                 nothing_to_remove = False
 
         if nothing_to_remove:
-            msgs.append(self._describe_clean('There are no folders to delete/clean'))
-        return '\n'.join(msgs)
+            yield self._describe_clean('There are no folders to delete/clean')
+
+    @property
+    def min_size(self):
+        """
+        the minimum size of the target (in bytes), smaller targets are not cleaned. Configured per target
+        in the global configuration file (i.e., `trash: {min_size: '1 GB'}`)
+
+        :return: the size or None if not set
+        :rtype: int
+        """
+        if 'min_size' in self._config:
+            return parse_size(self._config['min_size'])
+        return None
 
     @abstractproperty
     def entries(self):
         """
         the list of entries (pairs of path: regex pattern) to scan for cleanup. Keeps latest versions only.
+        An entry may also specify a `min_size`, entries smaller than that are not cleaned. Mount points under
+        an entry are left alone unless the entry sets `one_file_system` to False. With `action: archive` the
+        folders are archived into `archive_dir` (compressed with `compression`, zstd or xz) before removal.
 
         :return: a list of entries path:pattern pairs
         :rtype: list
@@ -375,7 +803,7 @@ class YamlDirTarget(DirTarget):
     """
     def __init__(self, config, update=False, verbose=False):
         self._spec = config['spec']
-        self._debug('spec: {0}'.format(pformat(self._spec)))
+        self._debug('spec: %s', lazy(pformat, self._spec))
         super(YamlDirTarget, self).__init__(config, update=update, verbose=verbose)
 
     @property
@@ -385,3 +813,882 @@ class YamlDirTarget(DirTarget):
     @property
     def update_message(self):
         return self._spec['update_message'] if 'update_message' in self._spec else ''
+
+    @property
+    def min_size(self):
+        min_size = super(YamlDirTarget, self).min_size
+        if min_size is None and 'min_size' in self._spec:
+            min_size = parse_size(self._spec['min_size'])
+        return min_size
+
+
+# ----------------------------------------------------------------------------------------
+#
+# a Files based Target class
+#
+# ----------------------------------------------------------------------------------------
+class FilesTarget(Target):
+    """
+    Class encapsulating the logic to execute file based cleanup operations. The main operation
+    consists of removing all files under a set of root directories matching any of the given rules
+    (a file name glob, a minimum age and a minimum size). All rules are evaluated in a single traversal,
+    see :class:`cleanmymac.scan.FileScanner`.
+    This is an abstract class.
+
+    :param config: a configuration dictionary
+    :type config: dict
+    :param update: perform the update before cleanup if True
+    :type update: bool
+    :param verbose: verbose output if True
+    :type verbose: bool
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self, config, update=False, verbose=False):
+        super(FilesTarget, self).__init__(config, update=update, verbose=verbose)
+        self._requests = None
+
+    @property
+    def update_message(self):
+        """
+        message to be displayed during the update operation
+
+        :return: the message
+        :rtype: str
+        """
+        return 'update not supported for "files" targets'
+
+    def update(self, **kwargs):
+        if self._verbose and self.update_message:
+            echo_info(self.update_message)
+
+    def scan_roots(self):
+        """
+        the directories this target scans for cleanup
+
+        :return: a list of expanded directory paths
+        :rtype: list
+        """
+        return [os.path.abspath(os.path.expanduser(root)) for root in self.roots]
+
+    def _scanner(self):
+        return FileScanner([file_rule(**rule) for rule in self.rules], exclude=self.exclude,
+                           one_file_system=self.one_file_system)
+
+    def scan_requests(self):
+        """
+        the scan requests for the roots, to be run together with the requests of other targets
+        (see :func:`cleanmymac.scan.scan_coalesced`) before cleaning
+
+        :return: the scan requests
+        :rtype: list of :class:`cleanmymac.scan.ScanRequest`
+        """
+        self._requests = self._scanner().requests(self.scan_roots())
+        return self._requests
+
+    def _matches(self):
+        if self._requests is not None:
+            requests, self._requests = self._requests, None
+            for request in requests:
+                for match in request.matches:
+                    yield match
+        else:
+            for match in self._scanner().scan(self.scan_roots()):
+                yield match
+
+    def _to_remove(self):
+        for match in self._matches():
+            self._debug('\tmatched: %s', match.path)
+            yield match
+
+    def removals(self):
+        """
+        the paths this target removes
+
+        :return: a generator of (path, one_file_system) pairs
+        """
+        for match in self._to_remove():
+            yield match.path, self.one_file_system
+
+    def clean(self, **kwargs):
+        matches = list(self._to_remove())
+        plan_removal(paths=[match.path for match in matches], files=len(matches),
+                     size=sum(match.size for match in matches))
+        for match in matches:
+            if self._verbose:
+                echo_warn('delete file: {0}'.format(match.path))
+            try:
+                remove_path(match.path)
+            except OSError as e:
+                error('could not delete "{0}". Reason: {1}'.format(match.path, e))
+
+    def describe(self, full=False):
+        if self._update and self.update_message:
+            yield self._describe_update(self.update_message)
+
+        files = (('delete file: {0} ({1})'.format(match.path, format_size(match.size)), match.size)
+                 for match in self._to_remove())
+        for line in self._describe_summary(files, 'files', nothing='There are no files to delete', full=full):
+            yield line
+
+    @abstractproperty
+    def roots(self):
+        """
+        the root directories to scan
+
+        :return: a list of directory paths
+        :rtype: list
+        """
+        return []
+
+    @abstractproperty
+    def rules(self):
+        """
+        the file rules, each rule is a dictionary with a `glob` (matched against file names) and optionally
+        an `older_than` age and a `min_size`. A file is removed if any of the rules matches.
+
+        :return: a list of rules
+        :rtype: list
+        """
+        return []
+
+    @property
+    def exclude(self):
+        """
+        glob patterns of directory names not to descend into
+
+        :return: a list of glob patterns
+        :rtype: list
+        """
+        return []
+
+    @property
+    def one_file_system(self):
+        """
+        if True (the default) mount points (directories on another device than their root) are not traversed
+
+        :return: True if the traversal stays on the devices of the roots
+        :rtype: bool
+        """
+        return True
+
+
+# ----------------------------------------------------------------------------------------
+#
+# a Files Target class that can read it's description from a yaml file
+#
+# ----------------------------------------------------------------------------------------
+class YamlFilesTarget(FilesTarget):
+    """
+    Class encapsulating the logic to execute file based cleanup operations. This concrete implementation
+    allows for the specification of roots, rules and excluded directories in a **YAML** configuration file.
+
+    :param config: a configuration dictionary
+    :type config: dict
+    :param update: perform the update before cleanup if True
+    :type update: bool
+    :param verbose: verbose output if True
+    :type verbose: bool
+    """
+    def __init__(self, config, update=False, verbose=False):
+        self._spec = config['spec']
+        self._debug('spec: %s', lazy(pformat, self._spec))
+        super(YamlFilesTarget, self).__init__(config, update=update, verbose=verbose)
+
+    @property
+    def roots(self):
+        return self._spec['roots']
+
+    @property
+    def rules(self):
+        return self._spec['rules']
+
+    @property
+    def exclude(self):
+        return self._spec.get('exclude', [])
+
+    @property
+    def one_file_system(self):
+        return self._spec.get('one_file_system', True)
+
+    @property
+    def update_message(self):
+        return self._spec['update_message'] if 'update_message' in self._spec else ''
+
+
+# ----------------------------------------------------------------------------------------
+#
+# the Artifacts Target class
+#
+# ----------------------------------------------------------------------------------------
+class ArtifactsTarget(Target):
+    """
+    Class encapsulating the logic to remove stale build artifacts (i.e., `node_modules`, `target`, `.tox`)
+    from abandoned project checkouts. Artifact directories are searched for under a set of workspace roots
+    and are removed if none of the project files next to them was modified within `older_than`,
+    see :class:`cleanmymac.scan.ArtifactFinder`.
+    This is an abstract class.
+
+    :param config: a configuration dictionary
+    :type config: dict
+    :param update: perform the update before cleanup if True
+    :type update: bool
+    :param verbose: verbose output if True
+    :type verbose: bool
+    """
+    __metaclass__ = ABCMeta
+
+    @property
+    def update_message(self):
+        """
+        message to be displayed during the update operation
+
+        :return: the message
+        :rtype: str
+        """
+        return 'update not supported for "artifacts" targets'
+
+    def update(self, **kwargs):
+        if self._verbose and self.update_message:
+            echo_info(self.update_message)
+
+    def scan_roots(self):
+        """
+        the directories this target scans for cleanup
+
+        :return: a list of expanded directory paths
+        :rtype: list
+        """
+        return [os.path.abspath(os.path.expanduser(root)) for root in self.roots]
+
+    def _to_remove(self):
+        threshold = time() - parse_duration(self.older_than)
+        finder = ArtifactFinder(self.names, exclude=self.exclude, workers=self.workers,
+                                one_file_system=self.one_file_system)
+        for artifact in finder.find(self.scan_roots()):
+            if artifact.project_mtime > threshold:
+                self._debug('\tin use: %s', artifact.path)
+                continue
+            self._debug('\tstale: %s', artifact.path)
+            yield artifact
+
+    def removals(self):
+        """
+        the paths this target removes
+
+        :return: a generator of (path, one_file_system) pairs
+        """
+        for artifact in self._to_remove():
+            yield artifact.path, self.one_file_system
+
+    def clean(self, **kwargs):
+        artifacts = list(self._to_remove())
+        plan_removal(paths=[artifact.path for artifact in artifacts])
+        for artifact in artifacts:
+            if self._verbose:
+                echo_warn('delete artifacts: {0}'.format(artifact.path))
+            try:
+                remove_path(artifact.path, one_file_system=self.one_file_system)
+            except OSError as e:
+                error('could not delete "{0}". Reason: {1}'.format(artifact.path, e))
+
+    def _describe_artifact(self, artifact):
+        size = probe_size([artifact.path], one_file_system=self.one_file_system).size
+        return 'delete artifacts: {0} ({1}, untouched for {2:.0f} days)'.format(
+            artifact.path, format_size(size), (time() - artifact.project_mtime) / (24 * 60 * 60)), size
+
+    def describe(self, full=False):
+        if self._update and self.update_message:
+            yield self._describe_update(self.update_message)
+
+        artifacts = (self._describe_artifact(artifact) for artifact in self._to_remove())
+        for line in self._describe_summary(artifacts, 'artifact folders', full=full,
+                                           nothing='There are no stale artifacts to delete'):
+            yield line
+
+    @abstractproperty
+    def roots(self):
+        """
+        the workspace root directories, each subdirectory of a root is searched in parallel
+
+        :return: a list of directory paths
+        :rtype: list
+        """
+        return []
+
+    @abstractproperty
+    def older_than(self):
+        """
+        artifacts of projects not modified for this long are removed
+
+        :return: the duration (in seconds or as a string, i.e., '30d')
+        :rtype: int or str
+        """
+        return None
+
+    @property
+    def names(self):
+        """
+        the artifact directory names
+
+        :return: a list of names
+        :rtype: list
+        """
+        return ARTIFACT_NAMES
+
+    @property
+    def exclude(self):
+        """
+        glob patterns of directory names not to descend into
+
+        :return: a list of glob patterns
+        :rtype: list
+        """
+        return []
+
+    @property
+    def workers(self):
+        """
+        the number of threads searching the workspaces
+
+        :return: the number of threads
+        :rtype: int
+        """
+        return ARTIFACTS_WORKERS
+
+    @property
+    def one_file_system(self):
+        """
+        if True (the default) mount points (directories on another device than their root) are not searched
+
+        :return: True if the traversal stays on the devices of the roots
+        :rtype: bool
+        """
+        return True
+
+
+# ----------------------------------------------------------------------------------------
+#
+# an Artifacts Target class that can read it's description from a yaml file
+#
+# ----------------------------------------------------------------------------------------
+class YamlArtifactsTarget(ArtifactsTarget):
+    """
+    Class encapsulating the logic to remove stale build artifacts. This concrete implementation allows for
+    the specification of roots, artifact names, the staleness age and excluded directories in a **YAML**
+    configuration file.
+
+    :param config: a configuration dictionary
+    :type config: dict
+    :param update: perform the update before cleanup if True
+    :type update: bool
+    :param verbose: verbose output if True
+    :type verbose: bool
+    """
+    def __init__(self, config, update=False, verbose=False):
+        self._spec = config['spec']
+        self._debug('spec: %s', lazy(pformat, self._spec))
+        super(YamlArtifactsTarget, self).__init__(config, update=update, verbose=verbose)
+
+    @property
+    def roots(self):
+        return self._spec['roots']
+
+    @property
+    def older_than(self):
+        return self._spec['older_than']
+
+    @property
+    def names(self):
+        return self._spec.get('names', ARTIFACT_NAMES)
+
+    @property
+    def exclude(self):
+        return self._spec.get('exclude', [])
+
+    @property
+    def one_file_system(self):
+        return self._spec.get('one_file_system', True)
+
+    @property
+    def workers(self):
+        return self._spec.get('workers', ARTIFACTS_WORKERS)
+
+    @property
+    def update_message(self):
+        return self._spec['update_message'] if 'update_message' in self._spec else ''
+
+
+# ----------------------------------------------------------------------------------------
+#
+# the Cap Target class
+#
+# ----------------------------------------------------------------------------------------
+class CapTarget(Target):
+    """
+    Class encapsulating the logic to trim a shared cache (i.e., pip, Gradle) back to a size budget instead of
+    wiping it: the least recently used files (by access or modification time) are evicted until the cache fits
+    in `max_size`. The cache is traversed once into a compact index, see :class:`cleanmymac.scan.CacheIndex`.
+    This is an abstract class.
+
+    :param config: a configuration dictionary
+    :type config: dict
+    :param update: perform the update before cleanup if True
+    :type update: bool
+    :param verbose: verbose output if True
+    :type verbose: bool
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self, config, update=False, verbose=False):
+        super(CapTarget, self).__init__(config, update=update, verbose=verbose)
+        self._index = None
+
+    @property
+    def update_message(self):
+        """
+        message to be displayed during the update operation
+
+        :return: the message
+        :rtype: str
+        """
+        return 'update not supported for "cap" targets'
+
+    def update(self, **kwargs):
+        if self._verbose and self.update_message:
+            echo_info(self.update_message)
+
+    def scan_roots(self):
+        """
+        the directories this target scans for cleanup
+
+        :return: a list of expanded directory paths
+        :rtype: list
+        """
+        return [os.path.abspath(os.path.expanduser(self.directory))]
+
+    def scan_requests(self):
+        """
+        the scan request indexing the cache, to be run together with the requests of other targets
+        (see :func:`cleanmymac.scan.scan_coalesced`) before cleaning
+
+        :return: the scan requests
+        :rtype: list of :class:`cleanmymac.scan.ScanRequest`
+        """
+        self._index = CacheIndex(order_by=self.order_by, one_file_system=self.one_file_system)
+        return [self._index.request(root) for root in self.scan_roots()]
+
+    def _scan(self):
+        if self._index is not None:
+            index, self._index = self._index, None
+            return index
+        index = CacheIndex(order_by=self.order_by, one_file_system=self.one_file_system)
+        scan_coalesced([index.request(root) for root in self.scan_roots()])
+        return index
+
+    def _to_remove(self):
+        index = self._scan()
+        budget = parse_size(self.max_size)
+        evictions = index.evictions(budget)
+        self._debug('cache size: %s, budget: %s, %s of %s files to evict', lazy(format_size, index.total),
+                    lazy(format_size, budget), len(evictions), len(index))
+        return index, [(index.path(file_id), index.sizes[file_id]) for file_id in evictions]
+
+    def removals(self):
+        """
+        the paths this target removes
+
+        :return: a generator of (path, one_file_system) pairs
+        """
+        for path, _ in self._to_remove()[1]:
+            yield path, self.one_file_system
+
+    def clean(self, **kwargs):
+        _, evictions = self._to_remove()
+        plan_removal(paths=[path for path, _ in evictions], files=len(evictions))
+        for path, _ in evictions:
+            if self._verbose:
+                echo_warn('evict file: {0}'.format(path))
+            try:
+                remove_path(path)
+            except OSError as e:
+                error('could not delete "{0}". Reason: {1}'.format(path, e))
+
+    def describe(self, full=False):
+        if self._update and self.update_message:
+            yield self._describe_update(self.update_message)
+
+        index, evictions = self._to_remove()
+        yield self._describe_clean('cache size: {0}, budget: {1}'.format(format_size(index.total),
+                                                                         format_size(parse_size(self.max_size))))
+        files = (('evict file: {0} ({1})'.format(path, format_size(size)), size) for path, size in evictions)
+        for line in self._describe_summary(files, 'files', nothing='The cache is within its budget', full=full):
+            yield line
+
+    @abstractproperty
+    def directory(self):
+        """
+        the cache directory
+
+        :return: the directory path
+        :rtype: str
+        """
+        return None
+
+    @abstractproperty
+    def max_size(self):
+        """
+        the size budget of the cache (disk usage)
+
+        :return: the size in bytes or with a unit (i.e., '5 GB')
+        :rtype: int or str
+        """
+        return None
+
+    @property
+    def order_by(self):
+        """
+        the file time evictions are ordered by: *atime* (the default, least recently accessed first) or *mtime*
+        (least recently modified first). Access times are only as good as the mount options allow (i.e., *relatime*
+        updates them at most once a day)
+
+        :return: the time field
+        :rtype: str
+        """
+        return 'atime'
+
+    @property
+    def one_file_system(self):
+        """
+        if True (the default) mount points under the cache directory are not traversed
+
+        :return: True if the traversal stays on the device of the cache directory
+        :rtype: bool
+        """
+        return True
+
+
+# ----------------------------------------------------------------------------------------
+#
+# a Cap Target class that can read it's description from a yaml file
+#
+# ----------------------------------------------------------------------------------------
+class YamlCapTarget(CapTarget):
+    """
+    Class encapsulating the logic to trim a cache to a size budget. This concrete implementation allows for
+    the specification of the cache directory, the budget and the eviction order in a **YAML** configuration file.
+
+    :param config: a configuration dictionary
+    :type config: dict
+    :param update: perform the update before cleanup if True
+    :type update: bool
+    :param verbose: verbose output if True
+    :type verbose: bool
+    """
+    def __init__(self, config, update=False, verbose=False):
+        self._spec = config['spec']
+        self._debug('spec: %s', lazy(pformat, self._spec))
+        super(YamlCapTarget, self).__init__(config, update=update, verbose=verbose)
+
+    @property
+    def directory(self):
+        return self._spec['dir']
+
+    @property
+    def max_size(self):
+        return self._spec['max_size']
+
+    @property
+    def order_by(self):
+        return self._spec.get('order_by', 'atime')
+
+    @property
+    def one_file_system(self):
+        return self._spec.get('one_file_system', True)
+
+    @property
+    def update_message(self):
+        return self._spec['update_message'] if 'update_message' in self._spec else ''
+
+
+# ----------------------------------------------------------------------------------------
+#
+# the Dedupe Target class
+#
+# ----------------------------------------------------------------------------------------
+class DedupeTarget(Target):
+    """
+    Class encapsulating the logic to remove duplicate files under a set of root directories. Duplicates are
+    found in stages (size, then the hash of both ends, then the full hash), see
+    :class:`cleanmymac.scan.DuplicateFinder`. Of every group of identical files one copy is kept (the oldest or
+    the newest), the others are deleted or replaced by hard links to it (the default, every path stays
+    in place). Files changed since they were hashed are left alone. Hashing makes these targets CPU bound.
+    This is an abstract class.
+
+    :param config: a configuration dictionary
+    :type config: dict
+    :param update: perform the update before cleanup if True
+    :type update: bool
+    :param verbose: verbose output if True
+    :type verbose: bool
+    """
+    __metaclass__ = ABCMeta
+
+    _resource_class = RESOURCE_CPU
+
+    def __init__(self, config, update=False, verbose=False):
+        super(DedupeTarget, self).__init__(config, update=update, verbose=verbose)
+        self._requests = None
+
+    @property
+    def update_message(self):
+        """
+        message to be displayed during the update operation
+
+        :return: the message
+        :rtype: str
+        """
+        return 'update not supported for "dedupe" targets'
+
+    def update(self, **kwargs):
+        if self._verbose and self.update_message:
+            echo_info(self.update_message)
+
+    def scan_roots(self):
+        """
+        the directories this target scans for cleanup
+
+        :return: a list of expanded directory paths
+        :rtype: list
+        """
+        return [os.path.abspath(os.path.expanduser(root)) for root in self.roots]
+
+    def _finder(self):
+        return DuplicateFinder(min_size=parse_size(self.min_size), exclude=self.exclude, workers=self.workers,
+                               one_file_system=self.one_file_system)
+
+    def scan_requests(self):
+        """
+        the scan requests for the roots, to be run together with the requests of other targets
+        (see :func:`cleanmymac.scan.scan_coalesced`) before cleaning
+
+        :return: the scan requests
+        :rtype: list of :class:`cleanmymac.scan.ScanRequest`
+        """
+        self._requests = self._finder().requests(self.scan_roots())
+        return self._requests
+
+    def _duplicates(self):
+        finder = self._finder()
+        if self._requests is not None:
+            requests, self._requests = self._requests, None
+            groups = finder.duplicates(match for request in requests for match in request.matches)
+        else:
+            groups = finder.find(self.scan_roots())
+        # the kept copy first, ties broken by path
+        newest = self.keep == 'newest'
+        for group in groups:
+            group.sort(key=lambda record: ((-record.mtime if newest else record.mtime), record.path))
+            self._debug('\t%s duplicates of: %s', len(group) - 1, group[0].path)
+        return groups
+
+    @staticmethod
+    def _unchanged(record):
+        try:
+            st = os.lstat(record.path)
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime, st.st_dev, st.st_ino) == (record.size, record.mtime, record.device,
+                                                                   record.inode)
+
+    def removals(self):
+        """
+        the paths this target removes, duplicates replaced by hard links are not removed (plans do not
+        cover them). Each duplicate comes with its kept copy, the duplicate is removed only if the kept copy is
+        still there unchanged. Copies changed since hashed are left out
+
+        :return: a generator of (path, one_file_system, kept) triples
+        """
+        if self.action != 'delete':
+            return
+        for group in self._duplicates():
+            kept = group[0]
+            if not self._unchanged(kept):
+                warn('not planning the duplicates of "%s", changed since hashed', kept.path)
+                continue
+            for record in group[1:]:
+                if self._unchanged(record):
+                    yield record.path, self.one_file_system, kept.path
+
+    def _hardlink(self, kept, record):
+        if kept.device != record.device:
+            self._debug('not linking "%s", on another device than "%s"', record.path, kept.path)
+            return False
+        # linked next to the duplicate and renamed over it, the path never goes missing
+        temporary = '{0}.cleanmymac-{1}'.format(record.path, os.getpid())
+        os.link(kept.path, temporary)
+        try:
+            os.rename(temporary, record.path)
+        except OSError:
+            os.unlink(temporary)
+            raise
+        return True
+
+    def clean(self, **kwargs):
+        groups = self._duplicates()
+        duplicates = [(group[0], record) for group in groups for record in group[1:]]
+        progress = get_progress()
+        if self.action == 'delete':
+            plan_removal(paths=[record.path for _, record in duplicates], files=len(duplicates),
+                         size=sum(record.size for _, record in duplicates))
+        elif progress:
+            progress.plan(files=len(duplicates), size=sum(record.size for _, record in duplicates))
+        for kept, record in duplicates:
+            if not self._unchanged(kept) or not self._unchanged(record):
+                warn('not deduplicating "%s", changed since hashed', record.path)
+                continue
+            if self._verbose:
+                echo_warn('{0} duplicate: {1} (of {2})'.format(self.action, record.path, kept.path))
+            try:
+                if self.action == 'delete':
+                    remove_path(record.path)
+                elif self._hardlink(kept, record) and progress:
+                    progress.advance(files=1, size=record.size)
+            except OSError as e:
+                error('could not {0} "{1}". Reason: {2}'.format(self.action, record.path, e))
+
+    def describe(self, full=False):
+        if self._update and self.update_message:
+            yield self._describe_update(self.update_message)
+
+        files = (('{0} duplicate: {1} ({2}, of {3})'.format(self.action, record.path, format_size(record.size),
+                                                            group[0].path), record.size)
+                 for group in self._duplicates() for record in group[1:])
+        for line in self._describe_summary(files, 'duplicates', nothing='There are no duplicate files', full=full):
+            yield line
+
+    @abstractproperty
+    def roots(self):
+        """
+        the root directories to scan
+
+        :return: a list of directory paths
+        :rtype: list
+        """
+        return []
+
+    @property
+    def min_size(self):
+        """
+        the minimum size of the files considered
+
+        :return: the size in bytes or with a unit (i.e., '1 MB')
+        :rtype: int or str
+        """
+        return DEDUPE_MIN_SIZE
+
+    @property
+    def action(self):
+        """
+        what is done with duplicates: *hardlink* (the default, replaced by hard links to the kept copy, copies
+        on other devices are left alone) or *delete*
+
+        :return: the action, one of :attr:`cleanmymac.constants.VALID_DEDUPE_ACTIONS`
+        :rtype: str
+        """
+        return 'hardlink'
+
+    @property
+    def keep(self):
+        """
+        which copy of identical files is kept: the *oldest* (the default) or the *newest*
+
+        :return: the kept copy, one of :attr:`cleanmymac.constants.VALID_DEDUPE_KEEP`
+        :rtype: str
+        """
+        return 'oldest'
+
+    @property
+    def exclude(self):
+        """
+        glob patterns of directory names not to descend into
+
+        :return: a list of glob patterns
+        :rtype: list
+        """
+        return []
+
+    @property
+    def workers(self):
+        """
+        the number of processes fully hashing files
+
+        :return: the number of processes
+        :rtype: int
+        """
+        return DEDUPE_WORKERS
+
+    @property
+    def one_file_system(self):
+        """
+        if True (the default) mount points (directories on another device than their root) are not traversed
+
+        :return: True if the traversal stays on the devices of the roots
+        :rtype: bool
+        """
+        return True
+
+
+# ----------------------------------------------------------------------------------------
+#
+# a Dedupe Target class that can read it's description from a yaml file
+#
+# ----------------------------------------------------------------------------------------
+class YamlDedupeTarget(DedupeTarget):
+    """
+    Class encapsulating the logic to remove duplicate files. This concrete implementation allows for the
+    specification of roots, the minimum file size, the action and the kept copy in a **YAML** configuration file.
+
+    :param config: a configuration dictionary
+    :type config: dict
+    :param update: perform the update before cleanup if True
+    :type update: bool
+    :param verbose: verbose output if True
+    :type verbose: bool
+    """
+    def __init__(self, config, update=False, verbose=False):
+        self._spec = config['spec']
+        self._debug('spec: %s', lazy(pformat, self._spec))
+        super(YamlDedupeTarget, self).__init__(config, update=update, verbose=verbose)
+
+    @property
+    def roots(self):
+        return self._spec['roots']
+
+    @property
+    def min_size(self):
+        return self._spec.get('min_size', DEDUPE_MIN_SIZE)
+
+    @property
+    def action(self):
+        return self._spec.get('action', 'hardlink')
+
+    @property
+    def keep(self):
+        return self._spec.get('keep', 'oldest')
+
+    @property
+    def exclude(self):
+        return self._spec.get('exclude', [])
+
+    @property
+    def workers(self):
+        return self._spec.get('workers', DEDUPE_WORKERS)
+
+    @property
+    def one_file_system(self):
+        return self._spec.get('one_file_system', True)
+
+    @property
+    def update_message(self):
+        return self._spec['update_message'] if 'update_message' in self._spec else ''
@@ -0,0 +1,72 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import tempfile
+import os
+
+import pytest
+
+from cleanmymac import archive
+from cleanmymac.archive import archive_tree, verify_archive, archive_path
+from cleanmymac.constants import ARCHIVE_COMPRESSORS
+
+
+def _tree():
+    tmp_dir = tempfile.mkdtemp()
+    source = os.path.join(tmp_dir, 'jdk1.8')
+    os.makedirs(os.path.join(source, 'lib'))
+    for name, size in [('a_file', 1000), ('lib/b_file', 100000), ('lib/empty', 0)]:
+        with open(os.path.join(source, name), 'wb') as a_file:
+            a_file.write(os.urandom(size))
+    os.symlink('a_file', os.path.join(source, 'a_link'))
+    return tmp_dir, source
+
+
+@pytest.mark.parametrize('compression', sorted(ARCHIVE_COMPRESSORS))
+def test_archive_tree(compression):
+    tmp_dir, source = _tree()
+    archive_dir = os.path.join(tmp_dir, 'archives')
+    first = archive_tree(source, archive_dir, compression=compression)
+    assert first.path == os.path.join(archive_dir, 'jdk1.8' + ARCHIVE_COMPRESSORS[compression][2])
+    assert (first.members, first.size) == (6, 101000)
+    assert os.path.isdir(source)
+
+    # existing archives are never overwritten
+    second = archive_tree(source, archive_dir, compression=compression)
+    assert second.path != first.path
+    assert sorted(os.listdir(archive_dir)) == sorted([os.path.basename(first.path), os.path.basename(second.path)])
+
+    with pytest.raises(IOError):
+        verify_archive(first.path, first.members + 1, first.size, compression=compression)
+    with open(first.path, 'r+b') as a_file:
+        a_file.truncate(os.path.getsize(first.path) // 2)
+    with pytest.raises(IOError):
+        verify_archive(first.path, first.members, first.size, compression=compression)
+
+
+def test_archive_failures(monkeypatch):
+    tmp_dir, source = _tree()
+    archive_dir = os.path.join(tmp_dir, 'archives')
+    with pytest.raises(IOError):
+        archive_tree(source, os.path.join(source, 'archives'))
+
+    monkeypatch.setitem(archive.ARCHIVE_COMPRESSORS, 'zstd', (['false'], ['false'], '.tar.zst'))
+    with pytest.raises(IOError):
+        archive_tree(source, archive_dir)
+    # no partial archive is left behind
+    assert os.listdir(archive_dir) == []
+    assert archive_path(archive_dir, source) == os.path.join(archive_dir, 'jdk1.8.tar.zst')
@@ -0,0 +1,48 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import tempfile
+import os
+import subprocess
+
+from cleanmymac.capture import BoundedCapture, set_output_log
+from cleanmymac.target import YamlShellCommandTarget
+
+
+def test_bounded_capture():
+    lines = []
+    with BoundedCapture(max_lines=5, callback=lines.append) as out:
+        subprocess.check_call(['seq', '1', '10000'], stdout=out.stream)
+    assert out.tail == [str(i) for i in range(9996, 10001)]
+    assert len(lines) == 10000
+
+
+def test_shell_command_output_log():
+    log_dir = tempfile.mkdtemp()
+    log_file = set_output_log(log_dir)
+    try:
+        target = YamlShellCommandTarget({'spec': {'update_commands': [],
+                                                  'clean_commands': ['echo cleaned', 'ls /__does_not_exist__']}})
+        assert target._run_command('echo cleaned') == 0
+        assert target._run_command('ls /__does_not_exist__') != 0
+    finally:
+        set_output_log(None)
+    assert os.path.dirname(log_file) == log_dir
+    with open(log_file, 'rb') as LOG:
+        log = LOG.read().decode('utf-8')
+    assert '[out] cleaned' in log
+    assert '[err] ls' in log
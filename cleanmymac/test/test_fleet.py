@@ -0,0 +1,89 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import sys
+import tempfile
+
+from cleanmymac.fleet import HOST_OK, HOST_FAILED, HOST_SKIPPED, LocalTransport, SshTransport, load_inventory, \
+    run_fleet, summarize
+from cleanmymac.outcome import Outcome, format_report, parse_report
+
+# a fake cleanmymac: hosts named "bad*" fail, the others free 1 KB
+_FAKE_CLEANMYMAC = """
+import os
+from cleanmymac.outcome import Outcome, format_report
+host = os.environ['CLEANMYMAC_HOST']
+print('cleaning ' + host)
+if host.startswith('bad'):
+    print(format_report([Outcome('brew', False, 0, 0.1, 'boom')]))
+else:
+    print(format_report([Outcome('brew', True, 1024, 0.1, None)]))
+"""
+
+
+def test_report():
+    outcomes = [Outcome('brew', True, 1024, 1.5, None), Outcome('trash', False, 0, 0.1, 'boom')]
+    assert parse_report('some output\n' + format_report(outcomes) + '\n') == outcomes
+    assert parse_report('no report') is None
+
+
+def test_load_inventory():
+    tmp_dir = tempfile.mkdtemp()
+    with open(os.path.join(tmp_dir, 'hosts.txt'), 'w') as hosts:
+        hosts.write('host1\n# comment\nhost2  # the second\n\nhost1\n')
+    with open(os.path.join(tmp_dir, 'hosts.yaml'), 'w') as hosts:
+        hosts.write('hosts:\n  - host1\n  - admin@host2\n')
+    assert load_inventory(os.path.join(tmp_dir, 'hosts.txt')) == ['host1', 'host2']
+    assert load_inventory(os.path.join(tmp_dir, 'hosts.yaml')) == ['host1', 'admin@host2']
+
+
+def test_ssh_transport():
+    transport = SshTransport(options=['-p', '2222'])
+    assert transport.command('host1', ['-q', '--report', 'my target']) == [
+        'ssh', '-o', 'BatchMode=yes', '-p', '2222', 'host1', "cleanmymac -q --report 'my target'"]
+
+
+def test_run_fleet():
+    transport = LocalTransport([sys.executable, '-c', _FAKE_CLEANMYMAC])
+    results = list(run_fleet(['good1', 'bad1', 'good2'], transport, ['--report'], concurrency=2))
+    statuses = dict((result.host, result.status) for result in results)
+    assert statuses == {'good1': HOST_OK, 'bad1': HOST_FAILED, 'good2': HOST_OK}
+    assert summarize(results).freed == 2048
+
+    # fail fast: only the first hosts are cleaned
+    hosts = ['bad{0}'.format(i) for i in range(10)]
+    results = list(run_fleet(hosts, transport, ['--report'], concurrency=1, max_failure_rate=0.5, min_sample=2))
+    summary = summarize(results)
+    assert (summary.hosts, summary.failed, summary.skipped) == (10, 2, 8)
+    assert all(result.status == HOST_SKIPPED for result in results[2:])
+
+
+def test_run_fleet_cleanmymac():
+    # the real command line, in quiet mode the report follows the "freed ..." line
+    config = os.path.join(tempfile.mkdtemp(), 'cleanmymac.yaml')
+    with open(config, 'w') as config_file:
+        config_file.write('cleanmymac: {{state_path: {0}}}\n'.format(os.path.dirname(config)))
+    results = list(run_fleet(['host1'], LocalTransport(), ['run', '-q', '--report', '-c', config, 'no-such-target']))
+    assert [(result.status, result.outcomes, result.error) for result in results] == [(HOST_OK, [], None)]
+
+
+def test_unreachable_host():
+    transport = LocalTransport([sys.executable, '-c', 'import sys; sys.stderr.write("unreachable"); sys.exit(255)'])
+    result = list(run_fleet(['host1'], transport, []))[0]
+    assert result.status == HOST_FAILED
+    assert 'exit code 255' in result.error and 'unreachable' in result.error
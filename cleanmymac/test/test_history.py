@@ -0,0 +1,119 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import tempfile
+
+from cleanmymac.history import History, percentile, longest_first, fastest_reclaim_first, estimate_reclaim, next_run
+from cleanmymac.outcome import Outcome
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([3, 1, 2], 0.5) == 2
+    assert percentile(range(1, 101), 0.95) == 95
+    assert percentile([7], 0.95) == 7
+
+
+def test_history():
+    path = os.path.join(tempfile.mkdtemp(), 'state', 'history.sqlite')
+    for duration, freed in [(2.0, 100), (4.0, 300), (3.0, 200)]:
+        history = History(path, max_runs=2)
+        history.begin('logs')
+        history.record_command('rm -rf /logs/old', duration, 0)
+        history.record_target(Outcome('logs', True, freed, duration, None), files=10)
+        history.begin('broken')
+        history.record_target(Outcome('broken', False, 0, 1.0, 'oops'))
+        history.close()
+
+    history = History(path)
+    # only the last 2 runs are kept
+    assert history.durations() == {'logs': 3.0}
+    assert history.reclaim_rates() == {'logs': 500 / 7.0}
+    trends = history.trends()
+    assert [(trend.target, trend.runs, trend.failed, trend.p50, trend.p95, trend.files) for trend in trends] == [
+        ('broken', 2, 2, 1.0, 1.0, 0), ('logs', 2, 0, 3.0, 4.0, 10)]
+    assert [(trend.target, trend.command, trend.runs, trend.p95) for trend in history.command_trends()] == [
+        ('logs', 'rm -rf /logs/old', 2, 4.0)]
+    history.close()
+
+
+def test_history_ordering():
+    targets = [('a', None), ('b', None), ('c', None), ('d', None)]
+    durations = {'a': 1.0, 'b': 5.0, 'c': 3.0}
+    assert [name for name, _ in longest_first(targets, durations)] == ['d', 'b', 'c', 'a']
+    rates = {'a': 10.0, 'b': 1.0, 'c': 100.0}
+    assert [name for name, _ in fastest_reclaim_first(targets, rates)] == ['c', 'a', 'b', 'd']
+    # c frees 300 bytes in 3s, a 10 bytes in 1s
+    assert estimate_reclaim(250, ['c', 'a', 'b'], durations, rates) == 3.0
+    assert estimate_reclaim(305, ['c', 'a', 'b'], durations, rates) == 4.0
+    assert estimate_reclaim(10 ** 6, ['c', 'a', 'b', 'd'], durations, rates) is None
+
+
+def test_growth_and_due():
+    path = os.path.join(tempfile.mkdtemp(), 'history.sqlite')
+    history = History(path)
+    # three daily runs, each deleting what grew since the previous one
+    for day, deleted in [(0, 0), (1, 200), (2, 400)]:
+        history._targets.append(('ci_cache', day * 86400.0, 1.0, 0, 1, 1, deleted, 0))
+        history._targets.append(('jdk', day * 86400.0, 1.0, 0, 0, 1, 0, 0))
+    history._targets.append(('new', 0.0, 1.0, 0, 0, 1, 0, 0))
+    # smaller than its min_size, cleaned nothing: not zero growth
+    history._targets.append(('ci_cache', 2.5 * 86400.0, 1.0, 0, 0, 1, 0, 1))
+    # shell commands running concurrently with other targets: freed an unknown amount of space
+    for day, freed in [(0, 0), (1, None), (2, 300)]:
+        history._targets.append(('brew', day * 86400.0, 1.0, freed, 0, 1, 0, 0))
+    history.close()
+
+    history = History(path)
+    assert history.growth_rates() == {'ci_cache': 600 / (2 * 86400.0), 'jdk': 0.0, 'brew': 300 / 86400.0}
+    assert history.reclaim_rates()['brew'] == 150.0
+    assert [trend.rate for trend in history.trends() if trend.target == 'brew'] == [150.0]
+    due = history.due({'ci_cache': 300, 'jdk': 300, 'new': 300}, max_interval=7 * 86400, margin=1.0)
+    assert sorted(due) == ['ci_cache', 'jdk']
+    # reaches 300 bytes a day after the last run
+    assert due['ci_cache'].next == 3 * 86400.0
+    assert due['jdk'].next == 9 * 86400.0
+    history.close()
+
+    assert next_run(0, 10.0, 1000, max_interval=30, margin=0.5) == 30
+    assert next_run(0, 10.0, 1000, max_interval=500, margin=0.5) == 50
+    assert next_run(0, 0.0, 1000, max_interval=500) == 500
+
+
+def test_due_min_size():
+    from cleanmymac.cli import _due_schedule, _run_target
+    from cleanmymac.history import set_history
+    from cleanmymac.target import YamlDirTarget
+    target = YamlDirTarget({'min_size': '1 MB', 'spec': {'entries': [{'dir': tempfile.mkdtemp()}]}})
+    history = History(os.path.join(tempfile.mkdtemp(), 'history.sqlite'))
+    set_history(history)
+    try:
+        assert _run_target('trash', target).success
+    finally:
+        set_history(None)
+    assert target.skipped
+    assert history._targets[0][-1] == 1
+
+    for day in [1, 2]:
+        history._targets.append(('trash', day * 86400.0, 1.0, 0, 1, 1, 1024, 0))
+    history.close()
+    # due once expected to reach its min_size, not the default max_size
+    history = History(history.path)
+    due = _due_schedule(['trash'], {}, history, {'trash': target})
+    assert due['trash'].threshold == 1024 * 1024 and due['trash'].last == 2 * 86400.0
+    history.close()
@@ -0,0 +1,48 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import subprocess
+import sys
+
+import pytest
+
+import cleanmymac
+
+HEAVY_MODULES = ['sarge', 'natsort', 'tabulate', 'voluptuous', 'yaml', 'pkg_resources', 'ctypes']
+
+
+def test_cold_start_imports():
+    # a fresh interpreter, the test session already imported everything
+    check = 'import cleanmymac.client, cleanmymac.cli, sys; print(",".join(m for m in {0!r} if m in sys.modules))'
+    output = subprocess.check_output([sys.executable, '-c', check.format(HEAVY_MODULES)])
+    assert output.decode('utf-8').strip() == ''
+
+
+def test_lazy_api():
+    from cleanmymac.target import Target
+    assert cleanmymac.Target is Target
+    assert 'YamlDirTarget' in dir(cleanmymac)
+    with pytest.raises(AttributeError):
+        cleanmymac.no_such_thing
+
+
+def test_star_import():
+    namespace = {}
+    exec('from cleanmymac import *', namespace)
+    assert all(name in namespace for name in ['debug', 'echo_info', 'get_target', 'register_target', 'Target',
+                                              'DirTarget', 'Dir', 'version', 'UNIT_MB'])
+    assert not any(name in namespace for name in ['sys', 'ModuleType', 'import_module'])
@@ -0,0 +1,143 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import tempfile
+from time import sleep
+from threading import Thread
+
+import pytest
+
+from cleanmymac import util
+from cleanmymac.cli import _resume
+from cleanmymac.journal import Journal, Removal, read_journal, set_journal, get_journal_path
+from cleanmymac.state import set_state_path
+from cleanmymac.target import YamlFilesTarget
+
+
+def test_read_journal():
+    path = os.path.join(tempfile.mkdtemp(), 'journal.jsonl')
+    journal = Journal(path, sync_every=2)
+    journal.begin('trash')
+    journal.plan(paths=['/trash/a', '/trash/b'], contents=['/trash/c'])
+    journal.done('/trash/a')
+    journal.end()
+    journal.begin('logs')
+    journal.plan(paths=['/logs/a', '/logs/b'])
+    journal.done('/logs/a')
+    journal.begin('nothing_to_do')
+    journal.end()
+    journal.sync()
+    with open(path, 'a') as a_file:
+        a_file.write('["done", "/lo')  # killed while writing
+
+    unfinished = read_journal(path)
+    assert [(u.target, u.pending, u.planned) for u in unfinished] == [('logs', [Removal('/logs/b', False)], True)]
+
+    journal.close()
+    assert not os.path.exists(path)
+
+
+def test_concurrent_targets():
+    path = os.path.join(tempfile.mkdtemp(), 'journal.jsonl')
+    journal = Journal(path, sync_every=1)
+
+    def run(target):
+        journal.begin(target)
+        journal.plan(paths=['/{0}/a'.format(target), '/{0}/b'.format(target)])
+        for i in range(10):
+            sleep(0.001)
+            journal.done('/{0}/a'.format(target))
+
+    threads = [Thread(target=run, args=(target,)) for target in ['logs', 'trash', 'cache']]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    unfinished = read_journal(path)
+    assert sorted((u.target, u.pending) for u in unfinished) == [
+        (target, [Removal('/{0}/b'.format(target), False)]) for target in ['cache', 'logs', 'trash']]
+    journal.close()
+
+
+def test_resume(monkeypatch):
+    tmp_dir = tempfile.mkdtemp()
+    set_state_path(os.path.join(tmp_dir, 'state'))
+    logs = os.path.join(tmp_dir, 'logs')
+    os.mkdir(logs)
+    for i in range(5):
+        with open(os.path.join(logs, '{0}.log'.format(i)), 'w') as a_file:
+            a_file.write('x')
+
+    removed = []
+    remove_tree = util.remove_tree
+
+    def killed_remove_tree(path, **kwargs):
+        if len(removed) == 2:
+            raise KeyboardInterrupt()
+        removed.append(path)
+        remove_tree(path, **kwargs)
+
+    monkeypatch.setattr(util, 'remove_tree', killed_remove_tree)
+    journal = Journal(get_journal_path(), sync_every=1)
+    journal.begin('logs')
+    set_journal(journal)
+    try:
+        target = YamlFilesTarget({'spec': {'roots': [logs], 'rules': [{'glob': '*.log'}]}})
+        with pytest.raises(KeyboardInterrupt):
+            target.clean()
+    finally:
+        set_journal(None)
+        # the killed run releases its lock on the journal
+        journal._file.close()
+    monkeypatch.setattr(util, 'remove_tree', remove_tree)
+    assert len(os.listdir(logs)) == 3
+
+    # the target needs no new scan, the pending removals are completed
+    unfinished = read_journal(get_journal_path())
+    assert len(unfinished) == 1 and unfinished[0].planned and len(unfinished[0].pending) == 3
+    assert _resume() == set(['logs'])
+    assert os.listdir(logs) == []
+    assert not os.path.exists(get_journal_path())
+    set_state_path(None)
+
+
+def test_live_journal():
+    tmp_dir = tempfile.mkdtemp()
+    set_state_path(os.path.join(tmp_dir, 'state'))
+    try:
+        victim = os.path.join(tmp_dir, 'a_file')
+        open(victim, 'w').close()
+        live = Journal(get_journal_path(), sync_every=1)
+        live.begin('logs')
+        live.plan(paths=[victim])
+
+        # the journal of a run in progress is neither resumed nor shared
+        assert _resume() == set()
+        assert os.path.exists(victim) and os.path.exists(get_journal_path())
+        other = Journal(get_journal_path(), sync_every=1)
+        other.begin('trash')
+        other.plan(paths=['/trash/a'])
+        other.close()
+        assert [u.target for u in read_journal(get_journal_path())] == ['logs']
+
+        os.remove(get_journal_path())
+        live.close()
+        assert _resume() == set()
+    finally:
+        set_state_path(None)
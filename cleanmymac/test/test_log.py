@@ -0,0 +1,65 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import logging
+
+from cleanmymac.log import debug, lazy, LOGGER_NAME
+from cleanmymac.target import YamlDirTarget
+
+
+class _Expensive(object):
+    formatted = 0
+
+    def __repr__(self):
+        _Expensive.formatted += 1
+        return 'expensive'
+
+
+def test_lazy_logging():
+    logger = logging.getLogger(LOGGER_NAME)
+    level = logger.level
+    try:
+        logger.setLevel(logging.INFO)
+        _Expensive.formatted = 0
+        debug('%s', lazy(repr, _Expensive()))
+        YamlDirTarget({'spec': {'entries': [], 'expensive': _Expensive()}})._debug('%s', lazy(repr, _Expensive()))
+        assert _Expensive.formatted == 0
+
+        logger.setLevel(logging.DEBUG)
+        debug('%s', lazy(repr, _Expensive()))
+        assert _Expensive.formatted == 1
+    finally:
+        logger.setLevel(level)
+
+
+def test_percent_style_logging():
+    logger = logging.getLogger(LOGGER_NAME)
+    level = logger.level
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    try:
+        logger.setLevel(logging.DEBUG)
+        debug('got %s and %d', 'a value', 3)
+        debug('got {%s} (100%%)', 'a value')
+        debug('{0} (100%) as is, without arguments')
+        assert [record.getMessage() for record in records] == ['got a value and 3', 'got {a value} (100%)',
+                                                               '{0} (100%) as is, without arguments']
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
@@ -0,0 +1,100 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import tempfile
+from time import time
+
+import pytest
+
+from cleanmymac.plan import plan_target, read_plan, write_plan, PlannedTarget
+from cleanmymac.target import YamlFilesTarget, YamlDirTarget, YamlShellCommandTarget, YamlDedupeTarget
+
+
+def test_plan_apply():
+    tmp_dir = tempfile.mkdtemp()
+    logs = os.path.join(tmp_dir, 'logs')
+    os.mkdir(logs)
+    for name in ['a.log', 'b.log', 'c.log']:
+        open(os.path.join(logs, name), 'w').close()
+    os.makedirs(os.path.join(tmp_dir, 'cache', 'sub'))
+
+    plans = [
+        plan_target('logs', YamlFilesTarget({'spec': {'roots': [logs], 'rules': [{'glob': '*.log'}]}})),
+        plan_target('cache', YamlDirTarget({'spec': {'entries': [{'dir': os.path.join(tmp_dir, 'cache')}]}})),
+        plan_target('cmd', YamlShellCommandTarget({'spec': {'update_commands': ['echo update'],
+                                                            'clean_commands': ['echo clean']}}))
+    ]
+    plan_path = os.path.join(tmp_dir, 'plan.json')
+    write_plan(plan_path, plans)
+    assert read_plan(plan_path) == plans
+    assert [len(plan.victims) for plan in plans] == [3, 1, 0]
+    assert plans[2].commands == ['echo clean']
+
+    # changed since planned
+    past = time() - 60
+    os.utime(os.path.join(logs, 'b.log'), (past, past))
+    # not planned
+    open(os.path.join(logs, 'd.log'), 'w').close()
+
+    for plan in read_plan(plan_path):
+        PlannedTarget(plan)()
+    assert sorted(os.listdir(logs)) == ['b.log', 'd.log']
+    assert os.listdir(os.path.join(tmp_dir, 'cache')) == []
+
+    with open(plan_path, 'w') as plan_file:
+        plan_file.write('{"version": 0}')
+    with pytest.raises(ValueError):
+        read_plan(plan_path)
+
+
+def test_plan_archive():
+    # archiving is not planned: applying the plan must never delete the folders without their archive
+    tmp_dir = tempfile.mkdtemp()
+    archive_dir = tempfile.mkdtemp()
+    for version in ['v1', 'v2']:
+        os.mkdir(os.path.join(tmp_dir, version))
+    target = YamlDirTarget({'spec': {'entries': [{'dir': tmp_dir, 'pattern': r'v\d+', 'action': 'archive',
+                                                  'archive_dir': archive_dir}]}})
+    plan = plan_target('archive', target)
+    assert plan.victims == []
+    PlannedTarget(plan)()
+    assert sorted(os.listdir(tmp_dir)) == ['v1', 'v2']
+
+
+def test_plan_dedupe():
+    tmp_dir = tempfile.mkdtemp()
+    for name in ['a', 'b', 'c']:
+        with open(os.path.join(tmp_dir, name), 'wb') as a_file:
+            a_file.write(b'x' * 1024)
+        past = time() - (ord('d') - ord(name)) * 60
+        os.utime(os.path.join(tmp_dir, name), (past, past))
+
+    # replaced by hard links on a normal run only
+    assert plan_target('dedupe', YamlDedupeTarget({'spec': {'roots': [tmp_dir], 'min_size': 4}})).victims == []
+
+    target = YamlDedupeTarget({'spec': {'roots': [tmp_dir], 'min_size': 4, 'action': 'delete'}})
+    plan_path = os.path.join(tempfile.mkdtemp(), 'plan.json')
+    write_plan(plan_path, [plan_target('dedupe', target)])
+    plan, = read_plan(plan_path)
+    assert sorted((os.path.basename(victim.path), os.path.basename(victim.kept)) for victim in plan.victims) == \
+        [('b', 'a'), ('c', 'a')]
+
+    # the kept copy is gone: no copy is removed
+    os.unlink(os.path.join(tmp_dir, 'a'))
+    PlannedTarget(plan)()
+    assert sorted(os.listdir(tmp_dir)) == ['b', 'c']
@@ -0,0 +1,94 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import tempfile
+
+import click
+from six import StringIO
+
+from cleanmymac.progress import Progress, Snapshot, set_progress
+from cleanmymac.util import remove_tree, plan_removal
+
+
+def test_progress_tracks_removals():
+    folder = tempfile.mkdtemp()
+    os.makedirs(os.path.join(folder, 'sub'))
+    for name, size in [('a', 10), (os.path.join('sub', 'b'), 20)]:
+        with open(os.path.join(folder, name), 'wb') as a_file:
+            a_file.write(b'x' * size)
+
+    progress = Progress(stream=StringIO())
+    set_progress(progress)
+    try:
+        plan_removal(paths=[folder], files=2, size=30)
+        remove_tree(folder)
+    finally:
+        set_progress(None)
+    planned, done, _ = progress.snapshot()
+    assert (planned['files'], planned['size']) == (2, 30)
+    assert (done['files'], done['size']) == (2, 30)
+    assert not os.path.exists(folder)
+
+
+def test_progress_eta_and_render():
+    progress = Progress(label='cleaning:', width=10, stream=StringIO())
+    # bytes are the finest unit with work left
+    snapshot = Snapshot({'targets': 4, 'commands': 0, 'files': 10, 'size': 1000},
+                        {'targets': 1, 'commands': 0, 'files': 5, 'size': 250}, 5.0)
+    assert progress.eta(snapshot) == 15.0
+    # falls back to the time per target
+    snapshot = Snapshot({'targets': 4, 'commands': 0, 'files': 0, 'size': 0},
+                        {'targets': 2, 'commands': 0, 'files': 0, 'size': 0}, 10.0)
+    assert progress.eta(snapshot) == 10.0
+    assert progress.eta(Snapshot(snapshot.planned, dict(snapshot.done, targets=0), 0)) is None
+
+    line = click.unstyle(progress.render(snapshot))
+    assert line == 'cleaning:  [#####-----]  2/4 targets, ETA 00:00:10'
+
+    # the bar follows the bytes deleted, against the planned bytes
+    snapshot = Snapshot({'targets': 4, 'commands': 0, 'files': 10, 'size': 1000},
+                        {'targets': 3, 'commands': 0, 'files': 5, 'size': 250}, 5.0)
+    line = click.unstyle(progress.render(snapshot))
+    assert line == 'cleaning:  [##--------]  3/4 targets, 5/10 files, 250 B/1000 B deleted (50 B/s), ETA 00:00:15'
+
+    # nothing is drawn when not on a terminal
+    progress.start()
+    progress.advance(targets=1)
+    progress.stop()
+    assert progress._stream.getvalue() == 'cleaning:\n'
+
+
+def test_concurrent_targets_freed():
+    from cleanmymac.cli import _run_target
+    from cleanmymac.target import YamlFilesTarget, YamlShellCommandTarget
+    folder = tempfile.mkdtemp()
+    with open(os.path.join(folder, 'a.log'), 'wb') as a_file:
+        a_file.write(b'x' * 10000)
+
+    set_progress(Progress(stream=StringIO()))
+    try:
+        target = YamlFilesTarget({'spec': {'roots': [folder], 'rules': [{'glob': '*.log'}]}})
+        # not the change in free disk space, which includes what other targets (and processes) do meanwhile
+        outcome = _run_target('logs', target, concurrent=True)
+        # what shell commands delete is not tracked
+        commands = _run_target('cmd', YamlShellCommandTarget({'spec': {'clean_commands': ['true']}}), concurrent=True)
+    finally:
+        set_progress(None)
+    assert outcome.success and outcome.freed == 10000
+    assert commands.success and commands.freed is None
+    assert os.listdir(folder) == []
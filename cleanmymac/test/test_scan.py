@@ -0,0 +1,213 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import tempfile
+import os
+from time import time
+
+from cleanmymac import scan
+from cleanmymac.scan import compile_globs, file_rule, FileScanner, ScanRequest, scan_coalesced, ArtifactFinder, \
+    CacheIndex, DuplicateFinder
+from cleanmymac.target import YamlFilesTarget, YamlDirTarget, YamlArtifactsTarget, YamlCapTarget, YamlDedupeTarget
+
+
+def _touch(path, size=0, age=0):
+    with open(path, 'wb') as a_file:
+        a_file.write(b'x' * size)
+    os.utime(path, (time() - age, time() - age))
+
+
+def test_compile_globs():
+    match = compile_globs(['*.log', 'core.*'])
+    assert match('system.log')
+    assert match('core.1234')
+    assert not match('system.log.gz')
+    assert not match('a_core.1234')
+
+
+def test_file_scanner():
+    tmp_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(tmp_dir, 'logs', '.git'))
+    _touch(os.path.join(tmp_dir, 'logs', 'old.log'), age=10 * 24 * 60 * 60)
+    _touch(os.path.join(tmp_dir, 'logs', 'new.log'))
+    _touch(os.path.join(tmp_dir, 'logs', '.git', 'old.log'), age=10 * 24 * 60 * 60)
+    _touch(os.path.join(tmp_dir, 'core.1'), size=2048)
+    _touch(os.path.join(tmp_dir, 'core.2'), size=10)
+
+    scanner = FileScanner([file_rule('*.log', older_than='7d'), file_rule('core.*', min_size='1 KB')],
+                          exclude=['.git'])
+    # overlapping roots are scanned once
+    matches = list(scanner.scan([tmp_dir, os.path.join(tmp_dir, 'logs')]))
+    assert sorted(os.path.relpath(match.path, tmp_dir) for match in matches) == [
+        'core.1', os.path.join('logs', 'old.log')]
+
+    target = YamlFilesTarget({'spec': {'roots': [tmp_dir], 'exclude': ['.git'],
+                                       'rules': [{'glob': '*.log', 'older_than': '7d'}]}})
+    target.clean()
+    assert sorted(os.listdir(os.path.join(tmp_dir, 'logs'))) == ['.git', 'new.log']
+    assert os.listdir(os.path.join(tmp_dir, 'logs', '.git')) == ['old.log']
+
+
+def test_scan_coalesced(monkeypatch):
+    tmp_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(tmp_dir, 'a', 'b', 'c'))
+    os.makedirs(os.path.join(tmp_dir, 'a', 'skip'))
+    os.makedirs(os.path.join(tmp_dir, 'versions', '1.0'))
+    os.makedirs(os.path.join(tmp_dir, 'versions', '2.0'))
+    _touch(os.path.join(tmp_dir, 'a', 'skip', 'x.log'))
+    _touch(os.path.join(tmp_dir, 'a', 'b', 'c', 'y.log'))
+
+    folders = []
+    _scandir = scan.scandir
+
+    def counting_scandir(path):
+        folders.append(path)
+        return _scandir(path)
+    monkeypatch.setattr(scan, 'scandir', counting_scandir)
+
+    def logs(entry):
+        return entry.name if entry.name.endswith('.log') else None
+
+    everything = ScanRequest(tmp_dir, logs, prune=lambda entry: entry.name == 'skip')
+    shallow = ScanRequest(os.path.join(tmp_dir, 'a'), logs, max_depth=1)
+    nested = ScanRequest(os.path.join(tmp_dir, 'a', 'skip'), logs)
+    target = YamlDirTarget({'spec': {'entries': [{'dir': os.path.join(tmp_dir, 'versions'), 'pattern': r'\d+\.\d+'}]}})
+    requests = [everything, shallow, nested] + target.scan_requests()
+    scan_coalesced(requests)
+
+    assert len(folders) == len(set(folders))
+    assert everything.matches == ['y.log']
+    assert shallow.matches == ['x.log']
+    assert nested.matches == ['x.log']
+    assert all(request.scanned for request in requests)
+
+    # the pre-scanned versions are used, the newest one is kept
+    target.clean()
+    assert os.listdir(os.path.join(tmp_dir, 'versions')) == ['2.0']
+    assert os.path.join(tmp_dir, 'versions') in folders
+
+
+def test_artifacts():
+    month = 30 * 24 * 60 * 60
+    tmp_dir = tempfile.mkdtemp()
+    for project in ['old', 'new', os.path.join('group', 'old')]:
+        os.makedirs(os.path.join(tmp_dir, project, 'node_modules', 'dep', 'node_modules'))
+        os.makedirs(os.path.join(tmp_dir, project, 'src', '__pycache__'))
+        _touch(os.path.join(tmp_dir, project, 'package.json'), age=0 if project == 'new' else 2 * month)
+        os.utime(os.path.join(tmp_dir, project, 'src'), (time() - 2 * month, time() - 2 * month))
+
+    finder = ArtifactFinder(['node_modules', '__pycache__'], workers=2)
+    found = sorted(os.path.relpath(artifact.path, tmp_dir) for artifact in finder.find([tmp_dir]))
+    # artifacts are leafs, nested node_modules are not reported
+    assert found == sorted(os.path.join(project, artifact)
+                           for project in ['old', 'new', os.path.join('group', 'old')]
+                           for artifact in ['node_modules', os.path.join('src', '__pycache__')])
+
+    target = YamlArtifactsTarget({'spec': {'roots': [tmp_dir], 'older_than': '30d', 'names': ['node_modules']}})
+    assert 'delete 2 artifact folders' in '\n'.join(target.describe())
+    target.clean()
+    assert not os.path.exists(os.path.join(tmp_dir, 'old', 'node_modules'))
+    assert not os.path.exists(os.path.join(tmp_dir, 'group', 'old', 'node_modules'))
+    assert os.path.isdir(os.path.join(tmp_dir, 'new', 'node_modules'))
+    assert os.path.isdir(os.path.join(tmp_dir, 'old', 'src', '__pycache__'))
+
+
+def test_one_file_system(monkeypatch):
+    # directories named "mnt" stand for mount points
+    monkeypatch.setattr(scan, 'is_on_device', lambda entry, device: device is None or entry.name != 'mnt')
+    tmp_dir = tempfile.mkdtemp()
+    for folder in ['mnt', os.path.join('project', 'mnt'), os.path.join('project', 'mnt', 'other')]:
+        os.makedirs(os.path.join(tmp_dir, folder, 'node_modules'))
+        _touch(os.path.join(tmp_dir, folder, 'a.log'))
+
+    scanner = FileScanner([file_rule('*.log')])
+    assert list(scanner.scan([tmp_dir])) == []
+    scanner = FileScanner([file_rule('*.log')], one_file_system=False)
+    assert len(list(scanner.scan([tmp_dir]))) == 3
+
+    assert list(ArtifactFinder(['node_modules', 'mnt'], workers=2).find([tmp_dir])) == []
+    finder = ArtifactFinder(['node_modules'], workers=2, one_file_system=False)
+    assert len(list(finder.find([tmp_dir]))) == 3
+
+
+def test_cache_index():
+    cache = tempfile.mkdtemp()
+    os.makedirs(os.path.join(cache, 'wheels', 'ab'))
+    ages = {'old.whl': 300, os.path.join('wheels', 'older.whl'): 400, os.path.join('wheels', 'ab', 'new.whl'): 10,
+            'recent.whl': 100}
+    for name, age in ages.items():
+        _touch(os.path.join(cache, name), size=8192, age=age)
+    os.symlink(os.path.join(cache, 'old.whl'), os.path.join(cache, 'link.whl'))
+
+    index = CacheIndex(order_by='mtime')
+    scan_coalesced([index.request(cache)])
+    assert len(index) == 4
+    size = index.total // 4
+    assert index.evictions(index.total) == []
+    # just enough of the oldest files to fit in the budget
+    evicted = [index.path(file_id) for file_id in index.evictions(index.total - size - 1)]
+    assert evicted == [os.path.join(cache, 'wheels', 'older.whl'), os.path.join(cache, 'old.whl')]
+
+    target = YamlCapTarget({'spec': {'dir': cache, 'max_size': 2 * size, 'order_by': 'mtime'}})
+    target.clean()
+    assert sorted(os.listdir(cache)) == ['link.whl', 'recent.whl', 'wheels']
+    assert os.listdir(os.path.join(cache, 'wheels')) == ['ab']
+
+
+def _write(path, content, age=0):
+    with open(path, 'wb') as a_file:
+        a_file.write(content)
+    os.utime(path, (time() - age, time() - age))
+
+
+def _downloads():
+    root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(root, 'sub'))
+    big = os.urandom(64 * 1024)
+    _write(os.path.join(root, 'a.bin'), big, age=100)
+    _write(os.path.join(root, 'sub', 'b.bin'), big)
+    # same size and same ends, different middle
+    _write(os.path.join(root, 'c.bin'), big[:30000] + b'x' + big[30001:])
+    os.link(os.path.join(root, 'a.bin'), os.path.join(root, 'a_link.bin'))
+    _write(os.path.join(root, 'small_1.txt'), b'same')
+    _write(os.path.join(root, 'small_2.txt'), b'same', age=100)
+    _write(os.path.join(root, 'tiny'), b'same', age=50)
+    return root
+
+
+def test_duplicate_finder():
+    root = _downloads()
+    groups = DuplicateFinder(min_size=4, workers=2, edge=1024).find([root])
+    names = sorted(sorted(os.path.basename(record.path) for record in group) for group in groups)
+    assert len(names) == 2
+    assert names[1] == ['small_1.txt', 'small_2.txt', 'tiny']
+    # hard links count once
+    assert names[0] in (['a.bin', 'b.bin'], ['a_link.bin', 'b.bin'])
+
+
+def test_dedupe_target():
+    root = _downloads()
+    target = YamlDedupeTarget({'spec': {'roots': [root], 'min_size': 1024, 'workers': 1}})
+    target.clean()
+    assert os.path.samefile(os.path.join(root, 'a.bin'), os.path.join(root, 'sub', 'b.bin'))
+    assert not os.path.samefile(os.path.join(root, 'a.bin'), os.path.join(root, 'c.bin'))
+    assert len(os.listdir(root)) == 7
+
+    target = YamlDedupeTarget({'spec': {'roots': [root], 'min_size': 4, 'action': 'delete', 'keep': 'newest'}})
+    assert len(list(target.removals())) == 2
+    target.clean()
+    assert sorted(os.listdir(root)) == ['a.bin', 'a_link.bin', 'c.bin', 'small_1.txt', 'sub']
@@ -0,0 +1,102 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import tempfile
+from time import sleep
+from threading import Lock
+from collections import defaultdict
+
+from cleanmymac.schedule import Scheduler, target_resources, is_parallel_safe, RESOURCE_COMMANDS
+from cleanmymac.target import YamlDirTarget, YamlShellCommandTarget
+from cleanmymac.constants import RESOURCE_CPU, RESOURCE_NETWORK
+
+
+class _DirTarget(object):
+    def __init__(self, root):
+        self.root = root
+
+    def scan_roots(self):
+        return [self.root]
+
+
+def test_scheduler():
+    tmp_dir = tempfile.mkdtemp()
+    targets = [('dir{0}'.format(i), _DirTarget(tmp_dir)) for i in range(3)] + \
+              [('cmd{0}'.format(i), object()) for i in range(4)]
+    assert target_resources(targets[-1][1]) == [RESOURCE_COMMANDS]
+    assert target_resources(targets[0][1]) != [RESOURCE_COMMANDS]
+
+    lock = Lock()
+    running, most = defaultdict(int), defaultdict(int)
+
+    def run(name, target):
+        kind = name[:3]
+        with lock:
+            running[kind] += 1
+            most[kind] = max(most[kind], running[kind])
+        sleep(0.05)
+        with lock:
+            running[kind] -= 1
+        return name
+
+    completed = [name for name, _ in Scheduler(8, per_device=1, commands=2).run(run, targets)]
+    assert sorted(completed) == sorted(name for name, _ in targets)
+    # the directory targets share a device
+    assert most == {'dir': 1, 'cmd': 2}
+
+    completed = list(Scheduler(1).run(run, targets, stop=lambda: True))
+    assert len(completed) == 1
+
+
+class _Target(object):
+    def __init__(self, resource_class, parallel_safe=True):
+        self.resource_class = resource_class
+        self.parallel_safe = parallel_safe
+
+    def scan_roots(self):
+        return []
+
+
+def test_scheduler_capabilities():
+    assert target_resources(_Target(RESOURCE_CPU)) == [RESOURCE_CPU]
+    assert target_resources(_Target(RESOURCE_NETWORK)) == [RESOURCE_COMMANDS]
+    target = YamlDirTarget({'spec': {'entries': [{'dir': tempfile.mkdtemp()}]}})
+    assert target_resources(target) and RESOURCE_COMMANDS not in target_resources(target)
+    assert not is_parallel_safe(YamlShellCommandTarget({'parallel_safe': False, 'spec': {'clean_commands': []}}))
+
+    targets = [('cpu0', _Target(RESOURCE_CPU)), ('cpu1', _Target(RESOURCE_CPU)), ('net0', _Target(RESOURCE_NETWORK)),
+               ('one0', _Target(RESOURCE_NETWORK, parallel_safe=False)), ('net1', _Target(RESOURCE_NETWORK))]
+    lock = Lock()
+    running, most, alone = defaultdict(int), defaultdict(int), []
+
+    def run(name, target):
+        with lock:
+            running[name[:3]] += 1
+            most[name[:3]] = max(most[name[:3]], running[name[:3]])
+            if name == 'one0':
+                alone.append(sum(running.values()) == 1)
+        sleep(0.05)
+        with lock:
+            running[name[:3]] -= 1
+        return name
+
+    completed = [name for name, _ in Scheduler(8, commands=4, cpu=1).run(run, targets)]
+    assert sorted(completed) == sorted(name for name, _ in targets)
+    assert most['cpu'] == 1
+    assert alone == [True]
+    # targets after the one that is not parallel safe wait for it
+    assert completed.index('net1') > completed.index('one0')
@@ -19,7 +19,8 @@ import pytest
 from voluptuous import MultipleInvalid
 from yaml import load
 
-from cleanmymac.schema import _cmd_spec_schema, _dir_spec_schema
+from cleanmymac.schema import _cmd_spec_schema, _dir_spec_schema, _files_spec_schema, _artifacts_spec_schema, \
+    _cap_spec_schema
 
 
 def test_cmd_spec_schema():
@@ -83,3 +84,76 @@ entries: [
     obj_spec = load(spec)
     with pytest.raises(MultipleInvalid):
         _dir_spec_schema(strict=True)(obj_spec)
+
+
+def test_dir_archive_spec_schema():
+    entry = {'dir': '~', 'pattern': 'v\d+', 'action': 'archive', 'archive_dir': '~/Archives'}
+    assert _dir_spec_schema(strict=False)({'entries': [entry]})['entries'] == [entry]
+    for key, value in [('archive_dir', None), ('action', 'move'), ('compression', 'gzip')]:
+        invalid = dict(entry)
+        if value is None:
+            del invalid[key]
+        else:
+            invalid[key] = value
+        with pytest.raises(MultipleInvalid):
+            _dir_spec_schema(strict=False)({'entries': [invalid]})
+
+
+def test_files_spec_schema():
+    spec = """
+roots: ['~']
+exclude: ['.git']
+rules: [
+    {
+        glob: '*.log',
+        older_than: '7d'
+    },
+    {
+        glob: 'core.*',
+        min_size: '1 KB'
+    },
+]
+        """.strip()
+    obj_spec = load(spec)
+    validated_spec = _files_spec_schema(strict=True)(obj_spec)
+    assert validated_spec['rules'][0]['older_than'] == 7 * 24 * 60 * 60
+    assert validated_spec['rules'][1]['min_size'] == 1024
+
+    obj_spec['rules'][0]['older_than'] = 'a week'
+    with pytest.raises(MultipleInvalid):
+        _files_spec_schema(strict=False)(obj_spec)
+
+    obj_spec['rules'] = []
+    with pytest.raises(MultipleInvalid):
+        _files_spec_schema(strict=False)(obj_spec)
+
+
+def test_artifacts_spec_schema():
+    spec = """
+roots: ['~']
+names: ['node_modules']
+older_than: '30d'
+workers: 4
+        """.strip()
+    obj_spec = load(spec)
+    validated_spec = _artifacts_spec_schema(strict=True)(obj_spec)
+    assert validated_spec['older_than'] == 30 * 24 * 60 * 60
+
+    obj_spec['workers'] = 0
+    with pytest.raises(MultipleInvalid):
+        _artifacts_spec_schema(strict=False)(obj_spec)
+
+
+def test_cap_spec_schema():
+    spec = """
+dir: '~'
+max_size: '2 GB'
+order_by: 'mtime'
+        """.strip()
+    obj_spec = load(spec)
+    validated_spec = _cap_spec_schema(strict=True)(obj_spec)
+    assert validated_spec['max_size'] == 2 * 1024 * 1024 * 1024
+
+    obj_spec['order_by'] = 'ctime'
+    with pytest.raises(MultipleInvalid):
+        _cap_spec_schema(strict=False)(obj_spec)
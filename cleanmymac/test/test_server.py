@@ -0,0 +1,115 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import sys
+import tempfile
+from threading import Thread
+from collections import namedtuple
+
+from cleanmymac import client
+from cleanmymac.client import forward, is_forwardable
+from cleanmymac.registry import register_yaml_targets, refresh_yaml_targets, get_target, iter_targets
+from cleanmymac.server import Server
+
+
+def test_is_forwardable():
+    assert is_forwardable(['-d', 'brew'])
+    assert is_forwardable(['-c', '/tmp/gw.yaml'])
+    assert not is_forwardable(['fleet', '-I', 'hosts'])
+    assert not is_forwardable(['-qw'])
+    assert not is_forwardable(['--gentle', 'brew'])
+
+
+def test_server(capfd, monkeypatch):
+    # the client and the server share this process, the client writes to the streams it started with (not to
+    # the ones the server redirects while handling a request)
+    monkeypatch.setattr(client, 'sys', namedtuple('Sys', ['stdout', 'stderr'])(sys.stdout, sys.stderr))
+    socket_path = os.path.join(tempfile.mkdtemp(), 'test.sock')
+    requests = []
+
+    def handler(argv):
+        requests.append((argv, os.getcwd(), os.environ.get('CLEANMYMAC_CONFIG')))
+        sys.stdout.write(u'cleaning: {0}\n'.format(' '.join(argv)))
+        sys.stderr.write('oops\n')
+        return 3
+
+    server = Server(handler, socket_path=socket_path)
+    server.bind()
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    os.environ['CLEANMYMAC_CONFIG'] = '/etc/cleanmymac.yaml'
+    try:
+        assert forward(['-d', 'brew'], socket_path=socket_path) == 3
+    finally:
+        del os.environ['CLEANMYMAC_CONFIG']
+    out, err = capfd.readouterr()
+    assert out == 'cleaning: -d brew\n'
+    assert err == 'oops\n'
+    assert requests == [(['-d', 'brew'], os.getcwd(), '/etc/cleanmymac.yaml')]
+
+    server.close()
+    assert forward(['brew'], socket_path=socket_path) is None
+
+
+def test_refresh_yaml_targets():
+    tmp_dir = tempfile.mkdtemp()
+    yaml_file = os.path.join(tmp_dir, 'scratch_logs.yaml')
+    with open(yaml_file, 'w') as a_file:
+        a_file.write("type: 'cmd'\nspec: {clean_commands: ['echo one']}\n")
+    register_yaml_targets(tmp_dir)
+    assert get_target('scratch_logs')(None).clean_commands == ['echo one']
+
+    with open(yaml_file, 'w') as a_file:
+        a_file.write("type: 'cmd'\nspec: {clean_commands: ['echo one', 'echo two']}\n")
+    os.utime(yaml_file, (0, 0))
+    refresh_yaml_targets()
+    assert get_target('scratch_logs')(None).clean_commands == ['echo one', 'echo two']
+
+    os.remove(yaml_file)
+    refresh_yaml_targets()
+    assert 'scratch_logs' not in dict(iter_targets())
+
+
+def test_serve_other_commands(capsys):
+    from cleanmymac.cli import _serve_request
+    from cleanmymac.state import set_state_path
+    config = os.path.join(tempfile.mkdtemp(), 'cleanmymac.yaml')
+    with open(config, 'w') as config_file:
+        config_file.write('cleanmymac: {{state_path: {0}}}\n'.format(os.path.dirname(config)))
+    try:
+        # the history command itself, not "run history" (an empty cleanup)
+        assert _serve_request(['history', '-c', config]) == 0
+        out = capsys.readouterr()[0]
+        assert out.startswith('no runs recorded yet')
+    finally:
+        set_state_path(None)
+
+
+def test_serve_extra_targets():
+    from cleanmymac.cli import _serve_request
+    tmp_dir = tempfile.mkdtemp()
+    with open(os.path.join(tmp_dir, 'scratch_extra.yaml'), 'w') as a_file:
+        a_file.write("type: 'cmd'\nspec: {clean_commands: ['echo one']}\n")
+    config = os.path.join(tempfile.mkdtemp(), 'cleanmymac.yaml')
+    with open(config, 'w') as config_file:
+        config_file.write('cleanmymac: {{targets_path: [{0}]}}\n'.format(tmp_dir))
+    assert _serve_request(['-d', '-c', config, 'scratch_extra']) == 0
+    # not registered for the next clients
+    assert 'scratch_extra' not in dict(iter_targets())
@@ -0,0 +1,43 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import tempfile
+
+from cleanmymac.session import ShellSession
+from cleanmymac.target import YamlShellCommandTarget
+
+
+def test_shell_session():
+    out, err = [], []
+    with ShellSession(env={'A_VAR': 'a value'}) as session:
+        assert session.run('echo $A_VAR; printf no-new-line', out=out.append, err=err.append) == 0
+        assert out == [b'a value', b'no-new-line']
+        assert session.run('echo an error >&2; exit 3', out=out.append, err=err.append) == 3
+        assert err == [b'an error']
+        # a new shell is started once the previous one exited
+        assert session.run('cat; echo still running', out=out.append) == 0
+        assert out[-1] == b'still running'
+
+
+def test_session_target():
+    tmp_dir = tempfile.mkdtemp()
+    commands = ['cd {0}'.format(tmp_dir), 'touch a_file', 'false', 'touch another_file']
+    target = YamlShellCommandTarget({'spec': {'clean_commands': commands, 'session': True}})
+    target()
+    # the commands share the shell (i.e., the current directory), failures do not stop the target
+    assert sorted(os.listdir(tmp_dir)) == ['a_file', 'another_file']
@@ -0,0 +1,161 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import tempfile
+import os
+
+from cleanmymac.state import set_state_path, set_incremental
+from cleanmymac.cli import _run_target
+from cleanmymac.target import Target, YamlDirTarget, YamlShellCommandTarget
+from cleanmymac.util import Dir
+from cleanmymac.constants import DESCRIBE_SUMMARY_ITEMS, RESOURCE_IO, RESOURCE_NETWORK
+
+
+def _dir_target(tmp_dir):
+    return YamlDirTarget({'spec': {'entries': [{'dir': tmp_dir}]}})
+
+
+def test_dir_target_incremental():
+    set_state_path(tempfile.mkdtemp())
+    set_incremental(True)
+    try:
+        tmp_dir = tempfile.mkdtemp()
+        open(os.path.join(tmp_dir, 'a_file'), 'w').close()
+
+        target = _dir_target(tmp_dir)
+        assert [to_remove for _, to_remove, _ in target._to_remove()] == [Dir(tmp_dir)]
+        target.clean()
+        assert os.listdir(tmp_dir) == []
+        assert [to_remove for _, to_remove, _ in target._to_remove()] == [None]
+
+        os.mkdir(os.path.join(tmp_dir, 'a_dir'))
+        assert [to_remove for _, to_remove, _ in _dir_target(tmp_dir)._to_remove()] == [Dir(tmp_dir)]
+    finally:
+        set_incremental(False)
+        set_state_path(None)
+
+
+def test_dir_target_min_size():
+    tmp_dir = tempfile.mkdtemp()
+    with open(os.path.join(tmp_dir, 'a_file'), 'wb') as a_file:
+        a_file.write(b'x' * 1024 * 1024)
+
+    target = YamlDirTarget({'spec': {'entries': [{'dir': tmp_dir, 'min_size': 100 * 1024 * 1024}]}})
+    assert [to_remove for _, to_remove, _ in target._to_remove()] == [None]
+    target = YamlDirTarget({'spec': {'entries': [{'dir': tmp_dir, 'min_size': 1024}]}})
+    assert [to_remove for _, to_remove, _ in target._to_remove()] == [Dir(tmp_dir)]
+
+    target = YamlDirTarget({'spec': {'min_size': '100 MB', 'entries': [{'dir': tmp_dir}]}})
+    assert 'skipping' in '\n'.join(target.describe())
+    target.clean()
+    assert os.listdir(tmp_dir) == ['a_file']
+
+    target = YamlDirTarget({'min_size': '1 KB', 'spec': {'min_size': '100 MB', 'entries': [{'dir': tmp_dir}]}})
+    target.clean()
+    assert os.listdir(tmp_dir) == []
+
+
+def test_describe_summary():
+    tmp_dir = tempfile.mkdtemp()
+    for i in range(100):
+        os.mkdir(os.path.join(tmp_dir, 'v{0:03d}'.format(i)))
+
+    target = YamlDirTarget({'spec': {'entries': [{'dir': tmp_dir, 'pattern': r'v\d+'}]}})
+    description = target.describe()
+    assert not isinstance(description, str)
+    lines = list(description)
+    assert len(lines) == 1 + 2 * DESCRIBE_SUMMARY_ITEMS + 2
+    assert '... {0} more folders'.format(99 - 2 * DESCRIBE_SUMMARY_ITEMS) in lines[1 + DESCRIBE_SUMMARY_ITEMS]
+    assert 'v098' in lines[1] and 'v000' in lines[-2]
+    assert 'delete 99 folders' in lines[-1]
+
+    lines = list(target.describe(full=True))
+    assert len(lines) == 1 + 99 + 1
+
+
+def test_dir_target_archive():
+    tmp_dir = tempfile.mkdtemp()
+    archive_dir = tempfile.mkdtemp()
+    for version in ['v1', 'v2', 'v3']:
+        os.mkdir(os.path.join(tmp_dir, version))
+        with open(os.path.join(tmp_dir, version, 'a_file'), 'wb') as a_file:
+            a_file.write(b'x' * 1024)
+
+    target = YamlDirTarget({'spec': {'entries': [{'dir': tmp_dir, 'pattern': r'v\d+', 'action': 'archive',
+                                                  'archive_dir': archive_dir, 'compression': 'xz'}]}})
+    assert 'archive and delete folder: {0}'.format(os.path.join(tmp_dir, 'v1')) in '\n'.join(target.describe())
+    target.clean()
+    assert os.listdir(tmp_dir) == ['v3']
+    assert sorted(os.listdir(archive_dir)) == ['v1.tar.xz', 'v2.tar.xz']
+
+
+def test_target_capabilities():
+    tmp_dir = tempfile.mkdtemp()
+    for version in ['v1', 'v2']:
+        os.mkdir(os.path.join(tmp_dir, version))
+        with open(os.path.join(tmp_dir, version, 'a_file'), 'wb') as a_file:
+            a_file.write(b'x' * 100000)
+
+    target = YamlDirTarget({'spec': {'entries': [{'dir': tmp_dir, 'pattern': r'v\d+'}]}})
+    assert target.scan_roots() == [tmp_dir]
+    assert target.resource_class == RESOURCE_IO
+    assert target.parallel_safe
+    estimate = target.estimate_size()
+    assert estimate.exact and 100000 <= estimate.size < 200000
+    assert not target.estimate_size(limit=1).exact
+
+    target = YamlShellCommandTarget({'resource_class': 'gpu', 'parallel_safe': False, 'spec': {'clean_commands': []}})
+    assert target.scan_roots() == [] and target.scan_requests() == []
+    assert target.estimate_size() is None
+    assert target.resource_class == RESOURCE_NETWORK
+    assert not target.parallel_safe
+
+
+def test_dir_estimate_size():
+    # the folder itself is kept, only its content counts
+    tmp_dir = tempfile.mkdtemp()
+    estimate = _dir_target(tmp_dir).estimate_size()
+    assert estimate.exact and estimate.size == 0
+
+    with open(os.path.join(tmp_dir, 'a_file'), 'wb') as a_file:
+        a_file.write(b'x' * 100000)
+    estimate = _dir_target(tmp_dir).estimate_size()
+    assert 100000 <= estimate.size < 100000 + os.lstat(tmp_dir).st_size
+
+    # right after describe, its plan is reused
+    target = _dir_target(tmp_dir)
+    list(target.describe())
+    target._to_remove = None
+    assert target.estimate_size().size == estimate.size
+
+
+class _OldStyleTarget(Target):
+    # an installed target written against older versions: describe takes no arguments and returns a string
+    def update(self, **kwargs):
+        pass
+
+    def clean(self, **kwargs):
+        pass
+
+    def describe(self):
+        return 'remove the old stuff'
+
+
+def test_old_style_describe(capsys):
+    outcome = _run_target('old', _OldStyleTarget({}), dry_run=True, full=True)
+    assert outcome.success, outcome.reason
+    assert 'remove the old stuff' in capsys.readouterr()[0]
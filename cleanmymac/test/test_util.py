@@ -18,8 +18,13 @@
 import tempfile
 import pytest
 import os
+from time import time
 
-from cleanmymac.util import yaml_files, delete_dir_content, Dir
+from cleanmymac import util
+
+from cleanmymac.util import yaml_files, delete_dir_content, get_signature, parse_size, probe_size, remove_tree, Dir
+from cleanmymac.gentle import set_throttle, Throttle, TokenBucket
+from cleanmymac.constants import UNIT_KB, UNIT_GB
 
 
 def test_yaml_files():
@@ -39,3 +44,92 @@ def test_delete_dir_content():
     assert len(os.listdir(tmp_dir)) == 0
     with pytest.raises(AssertionError):
         delete_dir_content(tmp_dir)
+
+
+def test_get_signature():
+    tmp_dir = tempfile.mkdtemp()
+    signature = get_signature(tmp_dir)
+    assert signature == get_signature(tmp_dir)
+    os.utime(tmp_dir, (0, 0))
+    assert signature != get_signature(tmp_dir)
+    assert get_signature(tmp_dir).ino == os.stat(tmp_dir).st_ino
+
+
+def test_parse_size():
+    assert parse_size(10) == 10
+    assert parse_size('10') == 10
+    assert parse_size('1 KB') == UNIT_KB
+    assert parse_size('1.5gb') == int(1.5 * UNIT_GB)
+    with pytest.raises(ValueError):
+        parse_size('1 parsec')
+
+
+def test_probe_size():
+    tmp_dir = tempfile.mkdtemp()
+    for i in range(10):
+        sub_dir = os.path.join(tmp_dir, str(i))
+        os.mkdir(sub_dir)
+        with open(os.path.join(sub_dir, 'a_file'), 'wb') as a_file:
+            a_file.write(b'x' * 64 * UNIT_KB)
+
+    probe = probe_size([tmp_dir])
+    assert probe.exact
+    assert probe.size >= 10 * 64 * UNIT_KB
+
+    probe = probe_size([tmp_dir], limit=64 * UNIT_KB)
+    assert not probe.exact
+    assert 64 * UNIT_KB <= probe.size < 10 * 64 * UNIT_KB
+
+
+def test_remove_tree():
+    tmp_dir = tempfile.mkdtemp()
+    outside_dir = tempfile.mkdtemp()
+    open(os.path.join(outside_dir, 'keep'), 'w').close()
+    os.makedirs(os.path.join(tmp_dir, 'a', 'b', 'c'))
+    for folder in ['a', os.path.join('a', 'b'), os.path.join('a', 'b', 'c')]:
+        open(os.path.join(tmp_dir, folder, 'a_file'), 'w').close()
+    os.symlink(outside_dir, os.path.join(tmp_dir, 'a', 'link'))
+
+    remove_tree(tmp_dir)
+    assert not os.path.exists(tmp_dir)
+    assert os.listdir(outside_dir) == ['keep']
+
+
+def test_one_file_system(monkeypatch):
+    # directories named "mnt" stand for mount points
+    monkeypatch.setattr(util, 'is_on_device', lambda entry, device: device is None or entry.name != 'mnt')
+    tmp_dir = tempfile.mkdtemp()
+    for folder in [os.path.join('a', 'mnt'), 'b']:
+        os.makedirs(os.path.join(tmp_dir, folder))
+        open(os.path.join(tmp_dir, folder, 'a_file'), 'w').close()
+    os.makedirs(os.path.join(tmp_dir, 'mnt'))
+
+    remove_tree(tmp_dir)
+    assert sorted(os.listdir(tmp_dir)) == ['a', 'mnt']
+    assert os.listdir(os.path.join(tmp_dir, 'a', 'mnt')) == ['a_file']
+
+    delete_dir_content(Dir(tmp_dir))
+    assert sorted(os.listdir(tmp_dir)) == ['a', 'mnt']
+
+    delete_dir_content(Dir(tmp_dir), one_file_system=False)
+    assert os.listdir(tmp_dir) == []
+
+
+def test_throttle():
+    bucket = TokenBucket(100)
+    start = time()
+    for i in range(150):
+        bucket.consume()
+    assert time() - start >= 0.4
+
+    tmp_dir = tempfile.mkdtemp()
+    for i in range(30):
+        open(os.path.join(tmp_dir, str(i)), 'w').close()
+    set_throttle(Throttle(files_per_second=20))
+    try:
+        start = time()
+        delete_dir_content(Dir(tmp_dir))
+        assert time() - start >= 0.4
+        assert os.listdir(tmp_dir) == []
+    finally:
+        set_throttle(None)
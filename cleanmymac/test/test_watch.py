@@ -0,0 +1,58 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import tempfile
+import os
+from threading import Event
+
+from cleanmymac.watch import PollingWatcher, get_watcher, watch
+
+
+def test_watchers():
+    tmp_dir = tempfile.mkdtemp()
+    for watcher_factory in [PollingWatcher, get_watcher]:
+        watcher = watcher_factory([tmp_dir])
+        assert watcher.poll(0.01) == set()
+        os.mkdir(os.path.join(tmp_dir, 'a_dir_{0}'.format(id(watcher))))
+        os.utime(tmp_dir, (0, 0))  # file system timestamps may be coarser than the test
+        assert watcher.poll(0.01) == {tmp_dir}
+        watcher.close()
+
+
+def test_watch_debounce():
+    tmp_dir = tempfile.mkdtemp()
+    runs = []
+    stop = Event()
+
+    class Watcher(PollingWatcher):
+        def poll(self, timeout):
+            if len(self.polls) < 3:
+                # a burst of changes
+                os.mkdir(os.path.join(tmp_dir, str(len(self.polls))))
+                os.utime(tmp_dir, (len(self.polls), len(self.polls)))
+            self.polls.append(timeout)
+            return super(Watcher, self).poll(0)
+
+    watcher = Watcher([tmp_dir])
+    watcher.polls = []
+
+    def run(names):
+        runs.append(names)
+        stop.set()
+
+    watch({'a_target': [tmp_dir], 'other_target': []}, run, debounce=0, stop=stop, watcher=watcher)
+    assert runs == [{'a_target'}]
@@ -16,13 +16,19 @@
 # limitations under the License.
 #
 import os
-import shutil
+import re
+import stat
 import click
+from six import integer_types
 from contextlib import contextmanager
 from collections import namedtuple
 
-from cleanmymac.log import error
-from cleanmymac.constants import UNIT_KB, UNIT_MB, UNIT_GB
+#: :func:`os.scandir` or the *scandir* backport, None if neither is available. Looked up on first use (False
+#: until then): the backport loads ctypes, which slows the cold start down
+_scandir = False
+
+from cleanmymac.log import debug, error, warn
+from cleanmymac.constants import UNIT_KB, UNIT_MB, UNIT_GB, UNIT_TB, SIZE_UNITS, DURATION_UNITS
 
 
 def yaml_files(path):
@@ -40,6 +46,58 @@ def yaml_files(path):
             yield os.path.splitext(_file)[0], os.path.join(path, _file)
 
 
+_SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*$')
+
+
+def parse_size(value):
+    """
+    parse a size given either as a number of bytes or as a string with a unit, i.e. '500 MB'.
+    The supported units are defined in :attr:`cleanmymac.constants.SIZE_UNITS`
+
+    :param value: the size
+    :type value: int or str
+    :return: the size in bytes
+    :rtype: int
+    :raise: :class:`ValueError` if the size cannot be parsed
+    """
+    if isinstance(value, integer_types + (float,)):
+        return int(value)
+    match = _SIZE_RE.match(str(value))
+    if not match:
+        raise ValueError('invalid size: {0}'.format(value))
+    number, unit = match.groups()
+    unit = unit.lower() if unit else 'b'
+    if unit not in SIZE_UNITS:
+        raise ValueError('invalid size unit: "{0}", valid options are: {1}'.format(unit, sorted(SIZE_UNITS)))
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+_DURATION_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]?)\s*$')
+
+
+def parse_duration(value):
+    """
+    parse a duration given either as a number of seconds or as a string with a unit, i.e. '7d'.
+    The supported units are defined in :attr:`cleanmymac.constants.DURATION_UNITS`
+
+    :param value: the duration
+    :type value: int or str
+    :return: the duration in seconds
+    :rtype: float
+    :raise: :class:`ValueError` if the duration cannot be parsed
+    """
+    if isinstance(value, integer_types + (float,)):
+        return float(value)
+    match = _DURATION_RE.match(str(value))
+    if not match:
+        raise ValueError('invalid duration: {0}'.format(value))
+    number, unit = match.groups()
+    unit = unit.lower() if unit else 's'
+    if unit not in DURATION_UNITS:
+        raise ValueError('invalid duration unit: "{0}", valid options are: {1}'.format(unit, sorted(DURATION_UNITS)))
+    return float(number) * DURATION_UNITS[unit]
+
+
 #: a :func:`collections.namedtuple` holding disk usage statistics
 DiskUsage = namedtuple('DiskUsage', ['total', 'used', 'free'])
 
@@ -62,6 +120,189 @@ def get_disk_usage(path='/', unit=UNIT_KB):
     return DiskUsage(float(total) / unit, float(used) / unit, float(free) / unit)
 
 
+#: a :func:`collections.namedtuple` identifying the state of a path: device, inode and modification time
+Signature = namedtuple('Signature', ['dev', 'ino', 'mtime_ns'])
+
+
+def get_signature(path, follow_symlinks=True):
+    """
+    retrieve the signature of a path. For directories the modification time changes whenever
+    entries are added, removed or renamed, which makes the signature a cheap (single **stat**)
+    way of detecting changes
+
+    :param str path: the path
+    :param bool follow_symlinks: if False the path is not dereferenced (**lstat**)
+    :return: the signature
+    :rtype: Signature
+    :raise: :class:`OSError` if the path cannot be accessed
+    """
+    st = os.stat(path) if follow_symlinks else os.lstat(path)
+    mtime_ns = getattr(st, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(st.st_mtime * 1e9)
+    return Signature(st.st_dev, st.st_ino, mtime_ns)
+
+
+class _DirEntry(object):
+    """
+    minimal stand-in for :class:`os.DirEntry` when :func:`os.scandir` is not available
+    """
+    __slots__ = ('name', 'path', '_lstat')
+
+    def __init__(self, folder, name):
+        self.name = name
+        self.path = os.path.join(folder, name)
+        self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        if follow_symlinks:
+            return os.stat(self.path)
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        return self._lstat
+
+    def inode(self):
+        return self.stat(follow_symlinks=False).st_ino
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self.stat(follow_symlinks=False).st_mode)
+
+    def is_dir(self, follow_symlinks=True):
+        try:
+            return stat.S_ISDIR(self.stat(follow_symlinks=follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def is_file(self, follow_symlinks=True):
+        try:
+            return stat.S_ISREG(self.stat(follow_symlinks=follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+
+def scandir(path):
+    """
+    iterate over the entries of a directory, relies on :func:`os.scandir` (or the *scandir* backport)
+    if available, the entries cache their **lstat** results either way
+
+    :param str path: the directory
+    :return: an iterator of :class:`os.DirEntry` like objects
+    :raise: :class:`OSError` if the directory cannot be listed
+    """
+    global _scandir
+    if _scandir is False:
+        try:
+            from os import scandir as _scandir
+        except ImportError:
+            try:
+                from scandir import scandir as _scandir
+            except ImportError:
+                _scandir = None
+    if _scandir is not None:
+        return _scandir(path)
+    return (_DirEntry(path, name) for name in os.listdir(path))
+
+
+def is_on_device(entry, device):
+    """
+    test if a directory entry is on the given device, entries on other devices are mount points (or below)
+
+    :param entry: the directory entry
+    :type entry: :class:`os.DirEntry`
+    :param int device: the device (**st_dev**), any device matches if None
+    :return: True if the entry is on `device`, False if on another device or if it cannot be accessed
+    :rtype: bool
+    """
+    if device is None:
+        return True
+    try:
+        return entry.stat(follow_symlinks=False).st_dev == device
+    except OSError:
+        return False
+
+
+def disk_size(st):
+    """
+    the space actually allocated on disk for a file, given its **stat** result
+
+    :param st: the stat result
+    :return: the size in bytes
+    :rtype: int
+    """
+    blocks = getattr(st, 'st_blocks', None)
+    return blocks * 512 if blocks is not None else st.st_size
+
+
+#: a :func:`collections.namedtuple` holding the result of a size probe, `exact` is False if the probe stopped early
+SizeProbe = namedtuple('SizeProbe', ['size', 'exact'])
+
+
+def probe_size(paths, limit=None, one_file_system=True):
+    """
+    sum up the disk space used by the given files and directory trees. The probe stops as soon as
+    `limit` is reached, making it cheap to check whether a tree exceeds a size threshold.
+    Hard linked files are counted once.
+
+    :param list paths: the paths to probe
+    :param int limit: stop once the size reaches this value (in bytes), never stop if None
+    :param bool one_file_system: if True mount points (directories on another device than their tree)
+        are not descended into
+    :return: the probe result
+    :rtype: SizeProbe
+    """
+    total = 0
+    seen = set()
+    stack = []
+    for path in paths:
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue
+        total += disk_size(st)
+        if stat.S_ISDIR(st.st_mode):
+            stack.append((path, st.st_dev if one_file_system else None))
+
+    while stack:
+        if limit is not None and total >= limit:
+            return SizeProbe(total, False)
+        folder, device = stack.pop()
+        try:
+            entries = scandir(folder)
+        except OSError as e:
+            debug('cannot probe "%s". Reason: %s', folder, e)
+            continue
+        for entry in entries:
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if device is not None and st.st_dev != device:
+                debug('not probing "%s", on another device', entry.path)
+                continue
+            if st.st_nlink > 1 and not stat.S_ISDIR(st.st_mode):
+                if (st.st_dev, st.st_ino) in seen:
+                    continue
+                seen.add((st.st_dev, st.st_ino))
+            total += disk_size(st)
+            if stat.S_ISDIR(st.st_mode):
+                stack.append((entry.path, device))
+    return SizeProbe(total, True)
+
+
+def format_size(size):
+    """
+    human readable representation of a size
+
+    :param int size: the size in bytes
+    :return: the formatted size (i.e., '1.500 GB')
+    :rtype: str
+    """
+    for unit, name in [(UNIT_TB, 'TB'), (UNIT_GB, 'GB'), (UNIT_MB, 'MB'), (UNIT_KB, 'KB')]:
+        if size >= unit:
+            return '{0:.3f} {1}'.format(float(size) / unit, name)
+    return '{0} B'.format(size)
+
+
 #: a list of directories
 DirList = namedtuple('DirList', ['dirs'])
 
@@ -69,34 +310,150 @@ DirList = namedtuple('DirList', ['dirs'])
 Dir = namedtuple('Dir', ['path'])
 
 
-def delete_dir_content(folder):
+def _unlink(path, st, throttle, progress):
+    # st is a stat result or a scandir entry (stat-ed only when needed)
+    if throttle or progress:
+        st = st if isinstance(st, os.stat_result) else st.stat(follow_symlinks=False)
+    if throttle:
+        throttle(files=1, size=disk_size(st))
+    os.unlink(path)
+    if progress:
+        progress.advance(files=1, size=st.st_size)
+
+
+def remove_tree(path, one_file_system=True, device=None):
+    """
+    remove a file or a directory tree. Unlike :func:`shutil.rmtree` files are unlinked one by one
+    through the global throttle (see :func:`cleanmymac.gentle.set_throttle`) and counted by the global
+    progress tracker (see :func:`cleanmymac.progress.set_progress`), symbolic links are
+    removed, never followed. By default the removal does not cross into other devices: mount points
+    (and the directories holding them) are left in place.
+
+    :param str path: the path to remove
+    :param bool one_file_system: if True nothing on another device than `device` is removed
+    :param int device: the device (**st_dev**) of the tree, defaults to the device of `path`
+    :raise: :class:`OSError` if a file or directory cannot be removed
+    """
+    # imported on use, keeping the cold start light (gentle loads ctypes)
+    from cleanmymac.gentle import get_throttle
+    from cleanmymac.progress import get_progress
+    throttle = get_throttle()
+    progress = get_progress()
+    st = os.lstat(path)
+    if not one_file_system:
+        device = None
+    elif device is None:
+        device = st.st_dev
+    elif st.st_dev != device:
+        warn('not removing "%s", on another device (mount point)', path)
+        return
+    if not stat.S_ISDIR(st.st_mode):
+        _unlink(path, st, throttle, progress)
+        return
+
+    # folders holding mount points (at any depth) are kept
+    kept = set()
+    stack = [(path, False)]
+    while stack:
+        folder, visited = stack.pop()
+        if visited:
+            if folder in kept:
+                kept.add(os.path.dirname(folder))
+            else:
+                os.rmdir(folder)
+            continue
+        stack.append((folder, True))
+        for entry in scandir(folder):
+            if entry.is_dir(follow_symlinks=False):
+                if not is_on_device(entry, device):
+                    warn('not removing "%s", on another device (mount point)', entry.path)
+                    kept.add(folder)
+                    continue
+                stack.append((entry.path, False))
+                continue
+            _unlink(entry.path, entry, throttle, progress)
+
+
+def plan_removal(paths=(), contents=(), files=0, size=0):
+    """
+    record all the removals of a target in the journal (if set, see :func:`cleanmymac.journal.set_journal`)
+    before removing anything, an interrupted run is resumed without scanning the target again. The totals,
+    when known, are added to the planned work of the progress tracker (see :func:`cleanmymac.progress.set_progress`)
+
+    :param list paths: the files and directory trees to remove
+    :param list contents: the directories to remove the content of (see :func:`delete_dir_content`)
+    :param int files: the number of files removed (0 if unknown)
+    :param int size: the number of bytes removed, the apparent file sizes (0 if unknown)
+    """
+    from cleanmymac.journal import get_journal
+    from cleanmymac.progress import get_progress
+    journal = get_journal()
+    if journal:
+        journal.plan(paths=paths, contents=contents)
+    progress = get_progress()
+    if progress and (files or size):
+        progress.plan(files=files, size=size)
+
+
+def _removed(path):
+    from cleanmymac.journal import get_journal
+    journal = get_journal()
+    if journal:
+        journal.done(path)
+
+
+def remove_path(path, one_file_system=True):
+    """
+    remove a file or a directory tree (see :func:`remove_tree`) and record the removal in the journal
+
+    :param str path: the path to remove
+    :param bool one_file_system: if True mount points are not removed
+    :raise: :class:`OSError` if a file or directory cannot be removed
+    """
+    remove_tree(path, one_file_system=one_file_system)
+    _removed(path)
+
+
+def delete_dir_content(folder, one_file_system=True):
     """
     delete all the files and directories in path
 
     :param Dir folder: a valid directory path
+    :param bool one_file_system: if True mount points (on another device than `folder`) are not removed
     """
     assert isinstance(folder, Dir)
     if not os.path.isdir(folder.path):
         error('{0} not a directory'.format(folder.path))
         return
 
-    for root, dirs, files in os.walk(folder.path):
-        for f in files:
-            os.unlink(os.path.join(root, f))
-        for d in dirs:
-            shutil.rmtree(os.path.join(root, d))
+    device = os.stat(folder.path).st_dev if one_file_system else None
+    for entry in scandir(folder.path):
+        if not is_on_device(entry, device):
+            warn('not removing "%s", on another device (mount point)', entry.path)
+            continue
+        remove_tree(entry.path, one_file_system=one_file_system, device=device)
+    _removed(folder.path)
 
 
-def delete_dirs(dir_list):
+def delete_dirs(dir_list, one_file_system=True):
     """
     delete all directories in list
 
     :param DirList dir_list: the list of directories
+    :param bool one_file_system: if True mount points (on another device than their parent) are not removed
     """
     assert isinstance(dir_list, DirList)
+    devices = {}
     for d in dir_list.dirs:
         if os.path.isdir(d):
-            shutil.rmtree(d)
+            device = None
+            if one_file_system:
+                parent = os.path.dirname(os.path.abspath(d))
+                if parent not in devices:
+                    devices[parent] = os.stat(parent).st_dev
+                device = devices[parent]
+            remove_tree(d, one_file_system=one_file_system, device=device)
+        _removed(d)
 
 
 @contextmanager
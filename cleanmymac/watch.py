@@ -0,0 +1,269 @@
+#
+# author: Cosmin Basca
+#
+# Copyright 2015 Cosmin Basca
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from threading import Event
+from time import time, sleep
+from collections import defaultdict
+
+from cleanmymac.log import debug, info, warn
+from cleanmymac.util import get_disk_usage, get_signature
+from cleanmymac.constants import WATCH_DEBOUNCE, WATCH_SPACE_INTERVAL, UNIT_MB
+
+_IN_CLOEXEC = 0o2000000
+_IN_NONBLOCK = 0o4000
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+
+#: the events watched: same as what changes the modification time of a directory
+_IN_MASK = _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class PollingWatcher(object):
+    """
+    watch directories for changes by polling their signatures (see :func:`cleanmymac.util.get_signature`).
+    Works on any platform, costs a single **stat** per directory and poll.
+
+    :param list paths: the directories to watch
+    """
+    def __init__(self, paths):
+        self._paths = list(paths)
+        self._signatures = {}
+        self.rearm()
+
+    @staticmethod
+    def _signature(path):
+        try:
+            return get_signature(path)
+        except OSError:
+            return None
+
+    def rearm(self):
+        """
+        forget all changes seen so far
+        """
+        self._signatures = dict((path, self._signature(path)) for path in self._paths)
+
+    def poll(self, timeout):
+        """
+        wait for changes
+
+        :param float timeout: the maximum time to wait (in seconds)
+        :return: the changed directories
+        :rtype: set
+        """
+        sleep(timeout)
+        changed = set()
+        for path in self._paths:
+            signature = self._signature(path)
+            if signature != self._signatures[path]:
+                self._signatures[path] = signature
+                changed.add(path)
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    watch directories for changes using the Linux **inotify** API (via :mod:`ctypes`). Only the
+    directories themselves are watched (not recursively), matching the semantics of
+    :class:`PollingWatcher`.
+
+    :param list paths: the directories to watch
+    :raise: :class:`OSError` if **inotify** is not available
+    """
+    def __init__(self, paths):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError(errno.ENOSYS, 'libc not found')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify not supported')
+        self._libc = libc
+        self._fd = libc.inotify_init1(_IN_CLOEXEC | _IN_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._paths = list(paths)
+        self._watches = {}
+        self._add_watches()
+
+    def _add_watches(self):
+        for path in self._paths:
+            if path in self._watches.values():
+                continue
+            c_path = path if isinstance(path, bytes) else path.encode('utf-8')
+            wd = self._libc.inotify_add_watch(self._fd, c_path, _IN_MASK)
+            if wd < 0:
+                debug('cannot watch "%s" (errno %s)', path, ctypes.get_errno())
+                continue
+            self._watches[wd] = path
+
+    def _read(self):
+        try:
+            return os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return b''
+            raise
+
+    def rearm(self):
+        """
+        forget all changes seen so far
+        """
+        while self._read():
+            pass
+        self._add_watches()
+
+    def poll(self, timeout):
+        """
+        wait for changes
+
+        :param float timeout: the maximum time to wait (in seconds)
+        :return: the changed directories
+        :rtype: set
+        """
+        changed = set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return changed
+        data = self._read()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size + length
+            if mask & _IN_Q_OVERFLOW:
+                return set(self._paths)
+            if wd in self._watches:
+                changed.add(self._watches[wd])
+            if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                self._watches.pop(wd, None)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def get_watcher(paths):
+    """
+    create the best watcher available on this platform: :class:`InotifyWatcher` if possible,
+    :class:`PollingWatcher` otherwise
+
+    :param list paths: the directories to watch
+    :return: the watcher
+    """
+    try:
+        return InotifyWatcher(paths)
+    except OSError as e:
+        debug('inotify not available (%s), falling back to polling', e)
+        return PollingWatcher(paths)
+
+
+def _device(path):
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+
+def watch(roots, run, min_free=None, debounce=WATCH_DEBOUNCE, space_interval=WATCH_SPACE_INTERVAL, stop=None,
+          watcher=None):
+    """
+    the watch loop: targets are cleaned when the directories they touch change or when the free space on the
+    mount they live on drops below `min_free`. Changes are debounced: a run starts only after no new changes
+    were seen for `debounce` seconds, so bursts of changes cause a single run.
+
+    :param dict roots: target names mapped to the directories they touch, targets without directories are
+        associated with the root volume (**/**)
+    :param callable run: called with the set of target names to clean
+    :param int min_free: the free space watermark in bytes (disabled if None)
+    :param float debounce: the debounce delay in seconds
+    :param float space_interval: the interval between free space checks in seconds
+    :param stop: the loop runs until this event is set (forever if None)
+    :type stop: :class:`threading.Event`
+    :param watcher: the directory watcher, see :func:`get_watcher`
+    """
+    if stop is None:
+        stop = Event()
+
+    targets_by_path = defaultdict(set)
+    for name, paths in roots.items():
+        for path in paths:
+            targets_by_path[os.path.abspath(os.path.expanduser(path))].add(name)
+
+    targets_by_device = defaultdict(set)
+    device_paths = {}
+    for name, paths in roots.items():
+        for path in (paths or ['/']):
+            path = os.path.abspath(os.path.expanduser(path))
+            device = _device(path)
+            if device is not None:
+                targets_by_device[device].add(name)
+                device_paths.setdefault(device, path)
+
+    if watcher is None:
+        watcher = get_watcher([path for path in targets_by_path if os.path.isdir(path)])
+
+    pending = set()
+    last_change = None
+    next_space_check = 0
+    free_after_run = {}
+    try:
+        while not stop.is_set():
+            for path in watcher.poll(min(debounce, space_interval)):
+                debug('changed: %s', path)
+                pending |= targets_by_path.get(path, set())
+                last_change = time()
+
+            now = time()
+            if min_free is not None and now >= next_space_check:
+                next_space_check = now + space_interval
+                for device, path in device_paths.items():
+                    free = get_disk_usage(path, unit=1).free
+                    # do not trigger again if the previous run could not free anything more
+                    if free < min_free and free < free_after_run.get(device, free + 1):
+                        info('free space on "{0}" is {1:.3f} MB, below the watermark'.format(path, free / UNIT_MB))
+                        pending |= targets_by_device[device]
+                        last_change = last_change or now - debounce
+
+            if pending and now - last_change >= debounce:
+                info('triggered cleanup of: {0}'.format(', '.join(sorted(pending))))
+                try:
+                    run(set(pending))
+                except Exception as e:
+                    warn('watch run failed. Reason: {0}'.format(e))
+                pending.clear()
+                last_change = None
+                # ignore the changes caused by the cleanup itself
+                watcher.rearm()
+                for device, path in device_paths.items():
+                    free_after_run[device] = get_disk_usage(path, unit=1).free
+    finally:
+        watcher.close()
@@ -87,7 +87,7 @@ setup(
     tests_require=deps,
     entry_points={
         'console_scripts': [
-            'cleanmymac = cleanmymac.cli:cli'
+            'cleanmymac = cleanmymac.client:main'
         ]
     }
 )